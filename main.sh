@@ -1,4 +1,3 @@
 #!/bin/sh
 
-python3 src/main.py
-cd docs && python3 -m http.server 9999
+exec python3 src/main.py serve --port 9999
@@ -0,0 +1,224 @@
+# python imports
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, reflinks fall back to a plain copy
+    fcntl = None
+
+# application imports
+from log_config import setup_logging
+from discover import scan_files
+from manifest import hash_file
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# ioctl request to clone a file's extents on Linux (btrfs, xfs, ...), from <linux/fs.h>
+FICLONE = 0x40049409
+# Threads used to copy files, copying is I/O bound so this can exceed the CPU count
+COPY_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+class SyncReport:
+    """What a static sync did: the files it copied, how many it skipped and the files it removed."""
+
+    def __init__(self):
+        self.copied = []
+        self.skipped = 0
+        self.removed = []
+
+    def __repr__(self):
+        return f"SyncReport(copied={len(self.copied)}, skipped={self.skipped}, removed={len(self.removed)})"
+
+
+def walk_files(root) -> list[Path]:
+    """
+    List every file below root, sorted so builds always visit files in the same order.
+    Unlike the content and static trees no .ssgignore applies, see scan_files.
+    """
+    return scan_files(root, use_ignore=False)
+
+
+def file_is_unchanged(src_path, dest_path, checksum=False) -> bool:
+    """
+    Decide whether dest_path already holds the same file as src_path.
+    Files of a different size always differ. Otherwise an equal modification time
+    means unchanged, and with checksum=True differing times fall back to comparing hashes.
+    When the hashes match the copy takes the modification time of the source, so the next
+    sync does not hash either file again.
+    Args:
+        src_path (Path): The source file.
+        dest_path (Path): The copy in the output directory.
+        checksum (bool): Compare contents when the sizes match but the times do not.
+    Returns:
+        bool: True when the copy can be left alone.
+    """
+    try:
+        dest_stat = os.stat(dest_path)
+    except FileNotFoundError:
+        return False
+    src_stat = os.stat(src_path)
+    if src_stat.st_size != dest_stat.st_size:
+        return False
+    if src_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return True
+    if not checksum or hash_file(src_path) != hash_file(dest_path):
+        return False
+    os.utime(dest_path, ns=(dest_stat.st_atime_ns, src_stat.st_mtime_ns))
+    return True
+
+
+def _copy_hardlink(src_path, dest_path) -> None:
+    # The output shares the inode with the source, so there is nothing to copy at all
+    os.link(src_path, dest_path)
+
+
+def _copy_reflink(src_path, dest_path) -> None:
+    # Copy-on-write clone, the filesystem shares the data blocks until one side is modified
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+        fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+    shutil.copystat(src_path, dest_path)
+
+
+def _copy_kernel(src_path, dest_path) -> None:
+    # Let the kernel move the bytes with copy_file_range (or sendfile), no copy through Python
+    with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+        remaining = os.fstat(src.fileno()).st_size
+        offset = 0
+        while remaining > 0:
+            if hasattr(os, "copy_file_range"):
+                copied = os.copy_file_range(src.fileno(), dest.fileno(), remaining)
+            else:
+                copied = os.sendfile(dest.fileno(), src.fileno(), offset, remaining)
+            if copied == 0:
+                break
+            offset += copied
+            remaining -= copied
+    shutil.copystat(src_path, dest_path)
+
+
+def _copy_plain(src_path, dest_path) -> None:
+    shutil.copy2(src_path, dest_path)
+
+
+COPY_STRATEGIES = {
+    "copy": _copy_plain,
+    "hardlink": _copy_hardlink,
+    "reflink": _copy_reflink,
+    "kernel": _copy_kernel,
+}
+
+
+def copy_file(src_path, dest_path, strategy="copy") -> str:
+    """
+    Copy a single file with the given strategy, falling back to a plain copy when the
+    strategy is not supported here (different filesystems for a hardlink, no reflink
+    support, an old kernel without copy_file_range, ...).
+    The modification time of the source is kept so a later sync can compare it.
+    Args:
+        src_path (Path): The file to copy.
+        dest_path (Path): Where to copy it to, an existing file is replaced.
+        strategy (str): One of COPY_STRATEGIES.
+    Returns:
+        str: The strategy that was actually used.
+    Raises:
+        ValueError: If the strategy is unknown.
+    """
+    if strategy not in COPY_STRATEGIES:
+        raise ValueError(f"Unknown copy strategy: {strategy}")
+    # Never write through an existing output, it may be a hardlink to the source
+    _remove_file(dest_path)
+    if strategy != "copy":
+        try:
+            COPY_STRATEGIES[strategy](src_path, dest_path)
+            return strategy
+        except OSError as e:
+            logger.debug(f"{strategy} failed for {src_path} ({e}), falling back to a plain copy")
+            _remove_file(dest_path)
+    _copy_plain(src_path, dest_path)
+    return "copy"
+
+
+def _remove_file(path) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def copy_files(pairs, strategy="copy", workers=COPY_WORKERS) -> list[str]:
+    """
+    Copy many files on a thread pool so large trees finish in I/O bound time.
+    Args:
+        pairs (list[tuple[Path, Path]]): (source, destination) files to copy.
+        strategy (str): One of COPY_STRATEGIES, see copy_file.
+        workers (int): Number of copy threads, 1 copies in the calling thread.
+    Returns:
+        list[str]: The strategy used for each pair, in the same order.
+    """
+    # Create the directories up front, once each, instead of racing in every thread
+    for parent in sorted({Path(dest_path).parent for _, dest_path in pairs}):
+        parent.mkdir(parents=True, exist_ok=True)
+    if workers <= 1 or len(pairs) <= 1:
+        return [copy_file(src_path, dest_path, strategy) for src_path, dest_path in pairs]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda pair: copy_file(pair[0], pair[1], strategy), pairs))
+
+
+def sync_static(
+    static_dir, output, manifest, checksum=False, strategy="copy", workers=COPY_WORKERS, shard=None, index=None
+) -> SyncReport:
+    """
+    Bring the static files in the output in line with static_dir without recopying everything.
+    New or changed files are copied (keeping their modification time so the next sync can
+    compare it), unchanged files are never touched, and files that were synced before but
+    whose source is gone are deleted. Anything in the output that did not come from
+    static_dir, like generated pages, is left alone.
+    Args:
+        static_dir (Path): The source directory of static assets.
+        output (OutputSink): Where the files go, DirectorySink(public_dir) for the output directory.
+        manifest (BuildManifest): Tracks the synced assets between builds, updated in place.
+        checksum (bool): Also compare file hashes, see file_is_unchanged.
+        strategy (str): How to copy files, see copy_file.
+        workers (int): Number of copy threads, see copy_files.
+        shard (Shard): Only sync the files of this shard, see Shard.owns.
+        index (DirectoryIndex): Skip listing the directories that did not change, see scan_files.
+    Returns:
+        SyncReport: The copied, skipped and removed files.
+    """
+    static_dir = Path(static_dir)
+    public_dir = output.root
+    report = SyncReport()
+
+    live = []
+    to_copy = []
+    for src_path in scan_files(static_dir, index):
+        if shard is not None and not shard.owns(src_path.relative_to(static_dir)):
+            continue
+        dest_path = public_dir / src_path.relative_to(static_dir)
+        live.append(dest_path)
+        manifest.assets[str(dest_path)] = str(src_path)
+        if output.is_copy_of(src_path, dest_path, checksum):
+            report.skipped += 1
+        else:
+            to_copy.append((src_path, dest_path))
+
+    output.copy(to_copy, strategy, workers)
+    for src_path, dest_path in to_copy:
+        logger.info(f"Copied file {src_path} to {dest_path}")
+        report.copied.append(dest_path)
+
+    report.removed = manifest.remove_stale_assets(live, output)
+    logger.info(
+        f"Synced {static_dir} to {public_dir}: copied {len(report.copied)}, "
+        f"skipped {report.skipped}, removed {len(report.removed)}"
+    )
+    return report
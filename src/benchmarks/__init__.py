@@ -0,0 +1 @@
+# Performance benchmarks, run from src/ with: python3 -m benchmarks.<name>
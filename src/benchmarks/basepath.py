@@ -0,0 +1,82 @@
+"""
+Compare applying the basepath while rendering (only href and src attributes) with the old
+str.replace passes over every rendered chunk, on a large page full of links, images and code.
+
+    cd src && python3 -m benchmarks.basepath --blocks 20000
+"""
+
+# python imports
+import argparse
+import io
+import random
+import time
+
+# application imports
+from benchmarks.corpus import TEMPLATE, WORDS
+from splitblocks import markdown_to_html_node
+from template import Template
+
+
+def replace_passes(template, values, basepath):
+    """The basepath rewrite before rendering did it: two str.replace calls per chunk of output."""
+    href = f'href="{basepath}'
+    src = f'src="{basepath}'
+    sink = io.StringIO()
+    for chunk in template.iter_render(values):
+        sink.write(chunk.replace('href="/', href).replace('src="/', src))
+    return sink.getvalue()
+
+
+def render_time_rewrite(template, values, basepath):
+    sink = io.StringIO()
+    template.write(sink, values, basepath)
+    return sink.getvalue()
+
+
+def link_heavy_markdown(rng, blocks):
+    parts = ["# Links everywhere"]
+    for i in range(blocks):
+        word = rng.choice(WORDS)
+        if i % 4 == 3:
+            parts.append(f'```\n<a href="/{word}">{word}</a>\n<img src="/images/{word}.png">\n```')
+        else:
+            parts.append(
+                f"See [{word}](/blog/{word}/{i}) and ![{word}](/images/{word}-{i}.png) "
+                f"or [the {word}](https://example.com/{word}) for more."
+            )
+    return "\n\n".join(parts)
+
+
+def best_time(render, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        html = render(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, html
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark basepath rewriting on large pages.")
+    parser.add_argument("--blocks", type=int, default=20000, help="Blocks in the page. Default is 20000")
+    parser.add_argument("--basepath", default="/static_site_generator/")
+    parser.add_argument("--repeat", type=int, default=7, help="Best of this many runs. Default is 7")
+    args = parser.parse_args()
+
+    markdown = link_heavy_markdown(random.Random(0), args.blocks)
+    values = {"Title": "Links everywhere", "Content": markdown_to_html_node(markdown)}
+    template = Template.from_string(TEMPLATE)
+    # Each code sample has an <img src="/..."> on its own line, links and images in text do not
+    code_samples = markdown.count('\n<img src="/')
+
+    baseline, _ = best_time(render_time_rewrite, template, values, None, repeat=args.repeat)
+    print(f"Render without a basepath: {baseline * 1000:.1f} ms")
+    print(f"{'version':>16} {'ms':>8} {'overhead ms':>12} {'code samples corrupted':>23}")
+    for name, render in (("replace passes", replace_passes), ("during render", render_time_rewrite)):
+        seconds, html = best_time(render, template, values, args.basepath, repeat=args.repeat)
+        corrupted = code_samples - html.count('\n<img src="/images/')
+        print(f"{name:>16} {seconds * 1000:>8.1f} {(seconds - baseline) * 1000:>12.1f} {corrupted:>17}/{code_samples}")
+
+
+if __name__ == "__main__":
+    main()
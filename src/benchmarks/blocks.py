@@ -0,0 +1,87 @@
+"""
+Measure block splitting and classification throughput in blocks/sec on a large mixed corpus,
+for the fused line scanner and for the split-then-match-five-regexes version it replaced.
+
+    cd src && python3 -m benchmarks.blocks --pages 2000
+"""
+
+# python imports
+import argparse
+import random
+import re
+import time
+
+# application imports
+from splitblocks import BlockType, scan_blocks
+from benchmarks.corpus import WORDS, generate_page_markdown
+
+
+def split_then_classify(markdown):
+    """The block pass before the scanner: split on blank lines, strip, filter, then up to five regexes."""
+    blocks = [block.strip() for block in markdown.split("\n\n")]
+    blocks = [block for block in blocks if block]
+    classified = []
+    for block in blocks:
+        block = block.strip()
+        if re.match(re.compile(r"^#{1,6}\s+?"), block):
+            block_type = BlockType.HEADING
+        elif re.match(re.compile(r"```\n(.*?)\n```", re.DOTALL), block):
+            block_type = BlockType.CODE
+        elif re.match(re.compile(r"^>\s+?"), block):
+            block_type = BlockType.QUOTE
+        elif re.match(re.compile(r"^-\s+"), block):
+            block_type = BlockType.UNORDERED_LIST
+        elif re.match(re.compile(r"^\d+\.\s+"), block):
+            block_type = BlockType.ORDERED_LIST
+        else:
+            block_type = BlockType.PARAGRAPH
+        classified.append((block, block_type))
+    return classified
+
+
+def fused_scan(markdown):
+    return list(scan_blocks(markdown.split("\n")))
+
+
+def mixed_corpus(pages, seed=0):
+    """The synthetic pages plus a fenced code block (without blank lines, so both versions agree) on each."""
+    rng = random.Random(seed)
+    documents = []
+    for index in range(pages):
+        code = "\n".join(f"    {rng.choice(WORDS)} = {rng.choice(WORDS)}({index})" for _ in range(5))
+        documents.append(generate_page_markdown(rng, index) + f"\n```\n{code}\n```\n")
+    return "\n".join(documents)
+
+
+def best_time(scan, markdown, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scan(markdown)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark block splitting and classification.")
+    parser.add_argument("--pages", type=int, default=2000, help="Pages in the corpus. Default is 2000")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    markdown = mixed_corpus(args.pages, args.seed)
+    blocks = fused_scan(markdown)
+    if blocks != split_then_classify(markdown):
+        raise SystemExit("The scanner and the old splitter disagree on this corpus")
+    counts = {}
+    for _, block_type in blocks:
+        counts[block_type.value] = counts.get(block_type.value, 0) + 1
+    print(f"{len(markdown) / 2**20:.1f} MiB, {len(blocks)} blocks: {counts}")
+
+    print(f"{'version':>18} {'ms':>9} {'blocks/sec':>12}")
+    for name, scan in (("split + regexes", split_then_classify), ("fused scanner", fused_scan)):
+        seconds = best_time(scan, markdown)
+        print(f"{name:>18} {seconds * 1000:>9.1f} {len(blocks) / seconds:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
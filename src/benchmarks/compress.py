@@ -0,0 +1,63 @@
+"""
+Benchmark precompressing a generated site: a cold pass on 1..N processes, then a second pass
+where every variant is reused.
+
+    cd src && python3 -m benchmarks.compress --pages 2000 --jobs 1 2 4 8
+"""
+
+# python imports
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+# application imports
+from benchmarks.corpus import generate_corpus
+from compress import ENCODINGS, SIBLING_SUFFIXES, precompress_tree
+from extractor import find_markdown_pages, render_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark output precompression.")
+    parser.add_argument("--pages", type=int, default=2000, help="Number of synthetic pages. Default is 2000")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+        help="Process counts to compare",
+    )
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate_corpus(root, pages=args.pages, paragraphs=24)
+        out_dir = root / "docs"
+        render_pages(find_markdown_pages(root / "content", out_dir), root / "template.html", "/", jobs=0)
+        size = sum(path.stat().st_size for path in out_dir.rglob("*.html"))
+        print(f"{args.pages} pages, {size / 2**20:.1f} MiB of HTML, variants {', '.join(ENCODINGS)}")
+
+        print(f"{'jobs':>6} {'cold s':>8} {'MiB/s':>8} {'reuse s':>8}")
+        for jobs in args.jobs:
+            for path in out_dir.rglob("*"):
+                if path.suffix in SIBLING_SUFFIXES:
+                    path.unlink()
+            start = time.perf_counter()
+            report = precompress_tree(out_dir, jobs)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            reused = precompress_tree(out_dir, jobs)
+            warm = time.perf_counter() - start
+            if reused.written:
+                raise SystemExit("The second pass compressed files again")
+            print(f"{jobs:>6} {cold:>8.2f} {size / 2**20 / cold:>8.1f} {warm:>8.2f}")
+        print(f"Saved {report.bytes_saved / 2**20:.1f} MiB in {len(report.written)} variants")
+        shutil.rmtree(out_dir)
+
+
+if __name__ == "__main__":
+    main()
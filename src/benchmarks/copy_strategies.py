@@ -0,0 +1,78 @@
+"""
+Benchmark the static file copy strategies on a generated tree of small and large files.
+
+    cd src && python3 -m benchmarks.copy_strategies --small 5000 --large 20 --large-size-mb 32
+"""
+
+# python imports
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+# application imports
+from assets import COPY_STRATEGIES, COPY_WORKERS, copy_files, walk_files
+
+
+def generate_tree(root: Path, small: int, large: int, large_size: int) -> None:
+    """Write small files spread over nested directories plus a few large ones."""
+    chunk = os.urandom(1 << 20)
+    for i in range(small):
+        path = root / f"dir{i % 50:02d}" / f"sub{i % 7}" / f"file{i:06d}.css"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(chunk[(i * 97) % 4096 : (i * 97) % 4096 + 1024 + i % 4096])
+    for i in range(large):
+        path = root / "images" / f"large{i:03d}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            for _ in range(large_size >> 20):
+                f.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark static file copy strategies.")
+    parser.add_argument("--small", type=int, default=5000, help="Number of small files. Default is 5000")
+    parser.add_argument("--large", type=int, default=20, help="Number of large files. Default is 20")
+    parser.add_argument("--large-size-mb", type=int, default=32, help="Size of each large file. Default is 32")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, COPY_WORKERS],
+        help="Copy thread counts to compare",
+    )
+    parser.add_argument("--dir", type=Path, default=None, help="Where to build the tree, pick the filesystem to test")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        root = Path(tmp)
+        src_root = root / "static"
+        generate_tree(src_root, args.small, args.large, args.large_size_mb << 20)
+        files = walk_files(src_root)
+        total_bytes = sum(path.stat().st_size for path in files)
+        print(f"{len(files)} files, {total_bytes / (1 << 20):.0f} MiB in {src_root}")
+
+        print(f"{'strategy':>10} {'workers':>8} {'seconds':>9} {'MiB/s':>9} {'files/s':>9}  used")
+        for strategy in sorted(COPY_STRATEGIES):
+            for workers in args.workers:
+                dest_root = root / "docs"
+                pairs = [(path, dest_root / path.relative_to(src_root)) for path in files]
+                start = time.perf_counter()
+                used = copy_files(pairs, strategy, workers)
+                elapsed = time.perf_counter() - start
+                # Show when a strategy fell back to a plain copy on this filesystem
+                summary = ", ".join(f"{name}={count}" for name, count in sorted(Counter(used).items()))
+                print(
+                    f"{strategy:>10} {workers:>8} {elapsed:>9.2f} "
+                    f"{total_bytes / (1 << 20) / elapsed:>9.0f} {len(files) / elapsed:>9.0f}  {summary}"
+                )
+                shutil.rmtree(dest_root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# python imports
+import random
+from pathlib import Path
+
+# application imports
+
+
+WORDS = (
+    "the ring hobbit shire wizard elf dwarf mountain river forest road journey tale song "
+    "king steward tower shadow light star ancient realm council fellowship quest ale pipe"
+).split()
+
+TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>"""
+
+
+# Block kinds generate_page_markdown can emit, see its mix argument
+BLOCK_KINDS = ("paragraph", "heading", "unordered_list", "ordered_list", "quote", "code")
+# Fraction of sentences with a link, and with an image, by default
+LINK_DENSITY = 0.1
+IMAGE_DENSITY = 0.0
+
+
+def _sentence(rng: random.Random, words: int = 12, link_density=LINK_DENSITY, image_density=IMAGE_DENSITY) -> str:
+    parts = [rng.choice(WORDS) for _ in range(words)]
+    # Sprinkle in the inline markdown the parser has to deal with
+    roll = rng.random()
+    if roll < 0.2:
+        parts[1] = f"**{parts[1]}**"
+    elif roll < 0.4:
+        parts[2] = f"_{parts[2]}_"
+    elif roll < 0.5:
+        parts[3] = f"`{parts[3]}`"
+    elif link_density == LINK_DENSITY and roll < 0.5 + LINK_DENSITY and words > 5:
+        # The default density takes its link from the same roll, so the default corpus (and the
+        # results measured on it) stays the same as before the density could be set
+        parts[4] = f"[{parts[4]}](/blog/{parts[5]})"
+    if link_density != LINK_DENSITY and words > 5 and rng.random() < link_density:
+        parts[4] = f"[{parts[4]}](/blog/{parts[5]})"
+    # Only drawn when asked for, so corpora without images do not change with it
+    if image_density and words > 7 and rng.random() < image_density:
+        parts[6] = f"![{parts[6]}](/images/{parts[7]}.png)"
+    return " ".join(parts).capitalize() + "."
+
+
+def _block(rng: random.Random, kind: str, link_density, image_density) -> str:
+    def sentence(words=12):
+        return _sentence(rng, words, link_density, image_density)
+
+    if kind == "heading":
+        return f"## {sentence(4)}"
+    if kind == "unordered_list":
+        return "\n".join(f"- {sentence(6)}" for _ in range(4))
+    if kind == "ordered_list":
+        return "\n".join(f"{n}. {sentence(6)}" for n in range(1, 4))
+    if kind == "quote":
+        return "\n".join(f"> {sentence()}" for _ in range(2))
+    if kind == "code":
+        lines = (f"    {rng.choice(WORDS)} = {rng.choice(WORDS)}({n})" for n in range(5))
+        return "```\n" + "\n".join(lines) + "\n```"
+    return " ".join(sentence() for _ in range(4))
+
+
+def generate_page_markdown(
+    rng: random.Random,
+    index: int,
+    paragraphs: int = 6,
+    mix: dict | None = None,
+    link_density: float = LINK_DENSITY,
+    image_density: float = IMAGE_DENSITY,
+) -> str:
+    """
+    Build the markdown for a single synthetic page with a title and a mix of block types.
+    Args:
+        rng (random.Random): The source of randomness, the same state gives the same page.
+        index (int): Number of the page, used in its title.
+        paragraphs (int): Number of blocks after the title.
+        mix (dict): Relative weight of every block kind (see BLOCK_KINDS) to draw blocks from,
+            e.g. {"paragraph": 3, "code": 1}. By default the kinds take turns, two paragraphs
+            in every six blocks and no code.
+        link_density (float): Fraction of sentences with a link.
+        image_density (float): Fraction of sentences with an image.
+    """
+    blocks = [f"# Page {index} about the {rng.choice(WORDS)}"]
+    if mix:
+        kinds = rng.choices(list(mix), weights=list(mix.values()), k=paragraphs)
+    else:
+        cycle = ("paragraph", "heading", "unordered_list", "ordered_list", "quote", "paragraph")
+        kinds = [cycle[i % 6] for i in range(paragraphs)]
+    for kind in kinds:
+        blocks.append(_block(rng, kind, link_density, image_density))
+    return "\n\n".join(blocks) + "\n"
+
+
+def generate_corpus(
+    dest_dir,
+    pages: int = 10_000,
+    paragraphs: int = 6,
+    seed: int = 0,
+    mix: dict | None = None,
+    link_density: float = LINK_DENSITY,
+    image_density: float = IMAGE_DENSITY,
+) -> list[Path]:
+    """
+    Write a deterministic tree of synthetic markdown pages plus a template.
+    The same arguments always produce the same files.
+    Args:
+        dest_dir (Path): Directory to create content/ and template.html in.
+        pages (int): Number of markdown pages to generate.
+        paragraphs (int): Number of blocks after the title on each page.
+        seed (int): Seed for the random generator.
+        mix, link_density, image_density: The shape of every page, see generate_page_markdown.
+    Returns:
+        list[Path]: The generated markdown files.
+    """
+    rng = random.Random(seed)
+    dest_dir = Path(dest_dir)
+    content_dir = dest_dir / "content"
+    files = []
+    for index in range(pages):
+        page_path = content_dir / "blog" / f"{index // 100:04d}" / f"post-{index:06d}" / "index.md"
+        page_path.parent.mkdir(parents=True, exist_ok=True)
+        page_path.write_text(
+            generate_page_markdown(rng, index, paragraphs, mix, link_density, image_density), encoding="utf-8"
+        )
+        files.append(page_path)
+    (dest_dir / "template.html").write_text(TEMPLATE, encoding="utf-8")
+    return files
@@ -0,0 +1,70 @@
+"""
+Show that rendering HTMLNode trees scales linearly with the number of nodes, for wide trees
+and for deep ones (far past the recursion limit), and compare with the old recursive renderer.
+
+    cd src && python3 -m benchmarks.deep_trees
+"""
+
+# python imports
+import argparse
+import sys
+import time
+
+# application imports
+from htmlnode import LeafNode, ParentNode
+
+
+def recursive_to_html(node):
+    """The renderer before the explicit stack: a string per level, one Python frame per level."""
+    if isinstance(node, ParentNode):
+        child_html = "".join(recursive_to_html(child) for child in node.children)
+        return f"<{node.tag}{node.props_to_html()}>{child_html}</{node.tag}>"
+    return node.to_html()
+
+
+def deep_tree(depth):
+    node = LeafNode("b", "leaf")
+    for _ in range(depth):
+        node = ParentNode("span", [node])
+    return node
+
+
+def wide_tree(width):
+    return ParentNode("div", [ParentNode("p", [LeafNode("a", f"link {i}", {"href": f"/{i}"})]) for i in range(width)])
+
+
+def best_time(render, node, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render(node)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rendering of wide and deep HTMLNode trees.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 3_000, 30_000, 200_000])
+    args = parser.parse_args()
+    print(f"Recursion limit: {sys.getrecursionlimit()}")
+
+    print(f"{'shape':>6} {'nodes':>8} {'to_html ms':>11} {'ns/node':>8} {'repr ms':>9} {'recursive ms':>13}")
+    for shape, build in (("wide", wide_tree), ("deep", deep_tree)):
+        for size in args.sizes:
+            node = build(size)
+            nodes = size * 3 + 1 if shape == "wide" else size + 1
+            html_time = best_time(lambda n: n.to_html(), node)
+            repr_time = best_time(repr, node)
+            try:
+                recursive = f"{best_time(recursive_to_html, node) * 1000:.1f}"
+            except RecursionError:
+                # Each level costs a few frames in the recursive version
+                recursive = "RecursionError"
+            print(
+                f"{shape:>6} {nodes:>8} {html_time * 1000:>11.1f} {html_time / nodes * 1e9:>8.0f} "
+                f"{repr_time * 1000:>9.1f} {recursive:>13}"
+            )
+
+
+if __name__ == "__main__":
+    main()
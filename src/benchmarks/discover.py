@@ -0,0 +1,78 @@
+"""
+Benchmark content discovery: the old rglob walk, scandir and scandir with a warm directory index.
+
+    cd src && python3 -m benchmarks.discover --pages 20000 --per-dir 20
+"""
+
+# python imports
+import argparse
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# application imports
+from discover import DirectoryIndex, scan_files
+
+
+def generate_tree(root: Path, pages: int, per_dir: int) -> None:
+    """Empty pages and an image each, per_dir pages to a directory, two levels deep."""
+    for i in range(pages):
+        directory = root / f"section{i // (per_dir * 50):03d}" / f"post{i // per_dir:05d}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"page{i:06d}.md").touch()
+        (directory / f"image{i:06d}.png").touch()
+    # The index does not trust directories changed in the last seconds, these are old
+    past = time.time() - 60
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, (past, past))
+
+
+def rglob_pages(root: Path) -> list[Path]:
+    # How pages were found before scan_files
+    return sorted(path for path in root.rglob("*.md") if path.is_file())
+
+
+def timed(function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark content discovery.")
+    parser.add_argument("--pages", type=int, default=20000, help="Number of pages. Default is 20000")
+    parser.add_argument("--per-dir", type=int, default=20, help="Pages per directory. Default is 20")
+    parser.add_argument("--repeat", type=int, default=5, help="Best of this many runs. Default is 5")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "content"
+        generate_tree(root, args.pages, args.per_dir)
+        index = DirectoryIndex(Path(tmp) / "files.json")
+        scan_files(root, index)
+        index.save()
+        expected = rglob_pages(root)
+        assert scan_files(root, suffixes=(".md",)) == expected
+
+        def indexed():
+            # Loading the index is part of the cost of a build using it
+            scan_files(root, DirectoryIndex.load(index.path), suffixes=(".md",))
+
+        print(f"{len(expected)} pages in {sum(1 for _ in os.walk(root))} directories")
+        print(f"{'method':>16} {'ms':>9}")
+        for name, function in (
+            ("rglob + is_file", lambda: rglob_pages(root)),
+            ("scandir", lambda: scan_files(root, suffixes=(".md",))),
+            ("scandir + index", indexed),
+        ):
+            print(f"{name:>16} {timed(function, args.repeat) * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
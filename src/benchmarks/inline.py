@@ -0,0 +1,77 @@
+"""
+Compare the single pass inline tokenizer (text_to_textnodes) with the five split passes it
+replaced, on paragraphs packed with thousands of links, images and emphasis markers.
+
+    cd src && python3 -m benchmarks.inline
+"""
+
+# python imports
+import argparse
+import random
+import time
+
+# application imports
+from splitnode import split_nodes_delimiter, split_nodes_image, split_nodes_link, text_to_textnodes
+from textnode import TextNode, TextType
+from benchmarks.corpus import WORDS
+
+
+def five_pass_text_to_textnodes(text):
+    """The inline parser before the tokenizer: one split pass per construct."""
+    nodes = [TextNode(text, TextType.NORMAL)]
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    return nodes
+
+
+def dense_paragraph(rng, constructs):
+    """A single paragraph with the given number of inline constructs between short runs of words."""
+    parts = []
+    for i in range(constructs):
+        parts.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))))
+        kind = i % 5
+        word = rng.choice(WORDS)
+        if kind == 0:
+            parts.append(f"[{word}](/{word}/{i})")
+        elif kind == 1:
+            parts.append(f"![{word}](/images/{word}-{i}.png)")
+        elif kind == 2:
+            parts.append(f"**{word}**")
+        elif kind == 3:
+            parts.append(f"_{word}_")
+        else:
+            parts.append(f"`{word}`")
+    return " ".join(parts)
+
+
+def best_time(parse, text, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inline markdown parsing on dense paragraphs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 5_000, 20_000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"{'constructs':>10} {'chars':>9} {'five pass ms':>13} {'single pass ms':>15} {'speedup':>8}")
+    for size in args.sizes:
+        text = dense_paragraph(rng, size)
+        if five_pass_text_to_textnodes(text) != text_to_textnodes(text):
+            raise SystemExit(f"Output differs for {size} constructs")
+        old = best_time(five_pass_text_to_textnodes, text)
+        new = best_time(text_to_textnodes, text)
+        print(f"{size:>10} {len(text):>9} {old * 1000:>13.1f} {new * 1000:>15.1f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
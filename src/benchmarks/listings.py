@@ -0,0 +1,78 @@
+"""
+Benchmark generating the listing pages of a large blog from the metadata index: the first
+generation, a build where nothing changed, a new post and an edited post title.
+
+    cd src && python3 -m benchmarks.listings --posts 100000 --tags 200
+"""
+
+# python imports
+import argparse
+import datetime
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+# application imports
+from listings import LISTING_PAGE_SIZE, generate_listings
+from manifest import BuildManifest
+from metadata import SiteMetadata
+from output import MemorySink
+
+# Posts are an hour apart from here on, a new post is the newest
+START = datetime.datetime(2000, 1, 1)
+
+
+def fake_post(index, i, tags) -> None:
+    # Only the index is read for listings, the posts need not exist
+    page = {
+        "title": f"Post {i}",
+        "date": (START + datetime.timedelta(hours=i)).isoformat(),
+        "tags": [f"tag{i % tags}", f"tag{i * 7 % tags}"],
+        "draft": False,
+        "layout": None,
+    }
+    index.pages[f"content/blog/post{i}.md"] = [1, 1, page]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generating listing pages.")
+    parser.add_argument("--posts", type=int, default=100_000, help="Number of posts. Default is 100000")
+    parser.add_argument("--tags", type=int, default=200, help="Number of tags. Default is 200")
+    parser.add_argument("--page-size", type=int, default=LISTING_PAGE_SIZE, help="Posts per listing page")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = Path(tmp) / "template.html"
+        template_path.write_text("<title>{{ Title }}</title>{{ Content }}", encoding="utf-8")
+        index = SiteMetadata(None)
+        for i in range(args.posts):
+            fake_post(index, i, args.tags)
+        manifest = BuildManifest(None)
+        sink = MemorySink(Path("docs"))
+
+        def generate():
+            start = time.perf_counter()
+            written = generate_listings(
+                Path("content"), template_path, sink.root, "/", manifest, index, sink, args.page_size
+            )
+            return time.perf_counter() - start, len(written)
+
+        def new_post():
+            fake_post(index, args.posts, args.tags)
+
+        def edit_title():
+            index.pages["content/blog/post0.md"][2]["title"] = "Renamed"
+
+        print(f"{args.posts} posts, {args.tags} tags, {args.page_size} per page")
+        print(f"{'step':>10} {'ms':>9} {'written':>9}")
+        for name, change in (("first", None), ("unchanged", None), ("new post", new_post), ("edit", edit_title)):
+            if change:
+                change()
+            elapsed, written = generate()
+            print(f"{name:>10} {elapsed * 1000:>9.1f} {written:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Measure the memory footprint of TextNode and HTMLNode trees for a markdown corpus with tracemalloc,
+with the slotted node classes ("slotted") and with a plain __dict__ layout like before ("plain").
+
+    cd src && python3 -m benchmarks.memory --megabytes 5
+"""
+
+# python imports
+import argparse
+import contextlib
+import random
+import tracemalloc
+
+# application imports
+import splitblocks
+import splitnode
+import textnode
+from benchmarks.corpus import generate_page_markdown
+from htmlnode import HTMLNode, LeafNode, ParentNode
+from splitblocks import markdown_to_blocks, markdown_to_html_node
+from splitnode import text_to_textnodes
+
+
+# Subclasses without __slots__ get a per-instance __dict__ again, like the classes before
+class PlainTextNode(textnode.TextNode):
+    pass
+
+
+class PlainLeafNode(LeafNode):
+    pass
+
+
+class PlainParentNode(ParentNode):
+    pass
+
+
+@contextlib.contextmanager
+def plain_layout():
+    """Make the parser create dict based nodes for the duration of the block."""
+    patches = [
+        (textnode, "LeafNode", PlainLeafNode),
+        (splitblocks, "ParentNode", PlainParentNode),
+        (splitblocks, "TextNode", PlainTextNode),
+        (splitnode, "TextNode", PlainTextNode),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, replacement in patches:
+        setattr(module, name, replacement)
+    try:
+        yield
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+
+
+def count_nodes(root) -> int:
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, HTMLNode) and node.children:
+            stack.extend(node.children)
+    return count
+
+
+def measure(build):
+    """Return (result, bytes still held by the result, peak bytes while building)."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = build()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, after - before, peak - before
+
+
+def build_corpus(megabytes: float) -> str:
+    rng = random.Random(0)
+    pages = []
+    size = 0
+    while size < megabytes * (1 << 20):
+        page = generate_page_markdown(rng, len(pages), paragraphs=12)
+        pages.append(page)
+        size += len(page)
+    return "\n".join(pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure node memory with tracemalloc.")
+    parser.add_argument("--megabytes", type=float, default=5, help="Size of the markdown corpus. Default is 5")
+    args = parser.parse_args()
+
+    markdown = build_corpus(args.megabytes)
+    paragraphs = [block for block in markdown_to_blocks(markdown) if block[0] not in "#-1>"]
+    print(f"Corpus: {len(markdown) / (1 << 20):.1f} MiB of markdown, {len(paragraphs)} paragraphs")
+
+    print(f"{'layout':>8} {'stage':>10} {'nodes':>9} {'held MiB':>9} {'bytes/node':>11} {'peak MiB':>9}")
+    for layout, context in (("plain", plain_layout), ("slotted", contextlib.nullcontext)):
+        with context():
+            text_nodes, held, peak = measure(lambda: [text_to_textnodes(p) for p in paragraphs])
+            count = sum(len(nodes) for nodes in text_nodes)
+            del text_nodes
+            print(
+                f"{layout:>8} {'TextNode':>10} {count:>9} "
+                f"{held / (1 << 20):>9.1f} {held / count:>11.0f} {peak / (1 << 20):>9.1f}"
+            )
+
+            root, held, peak = measure(lambda: markdown_to_html_node(markdown))
+            count = count_nodes(root)
+            del root
+            print(
+                f"{layout:>8} {'HTMLNode':>10} {count:>9} "
+                f"{held / (1 << 20):>9.1f} {held / count:>11.0f} {peak / (1 << 20):>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark reading the metadata of every page: parsing each page, reading only its header, and
+the metadata index of the last build.
+
+    cd src && python3 -m benchmarks.metadata --pages 2000 --paragraphs 60
+"""
+
+# python imports
+import argparse
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# application imports
+from benchmarks.corpus import generate_corpus
+from metadata import SiteMetadata, read_metadata
+from splitblocks import markdown_to_html_node
+
+
+def timed(function, paths) -> float:
+    start = time.perf_counter()
+    function(paths)
+    return time.perf_counter() - start
+
+
+def parse_every_page(paths) -> None:
+    # What finding a page's title and date took without front matter: the whole page
+    for path in paths:
+        markdown_to_html_node(path.read_text(encoding="utf-8"))
+
+
+def read_headers(paths) -> None:
+    for path in paths:
+        read_metadata(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reading page metadata.")
+    parser.add_argument("--pages", type=int, default=2000, help="Number of pages. Default is 2000")
+    parser.add_argument("--paragraphs", type=int, default=60, help="Blocks per page. Default is 60")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = generate_corpus(Path(tmp), args.pages, args.paragraphs)
+        past = time.time() - 60
+        for i, path in enumerate(paths):
+            front_matter = f"---\ndate: 2024-{i % 12 + 1:02d}-01\ntags: [lotr, tag{i % 50}]\n---\n"
+            path.write_text(front_matter + path.read_text(encoding="utf-8"), encoding="utf-8")
+            # The index does not trust pages changed in the last seconds
+            os.utime(path, (past, past))
+        index_path = Path(tmp) / "metadata.json"
+        index = SiteMetadata(index_path)
+        for path in paths:
+            index.get(path)
+        index.save()
+
+        def indexed(paths):
+            # Loading the index is part of the cost of a build using it
+            index = SiteMetadata.load(index_path)
+            for path in paths:
+                index.get(path)
+
+        size = sum(path.stat().st_size for path in paths)
+        print(f"{len(paths)} pages, {size / len(paths) / 1024:.1f} KiB each")
+        print(f"{'method':>14} {'ms':>9} {'us/page':>9}")
+        for name, function in (("parse", parse_every_page), ("header", read_headers), ("index", indexed)):
+            elapsed = timed(function, paths)
+            print(f"{name:>14} {elapsed * 1000:>9.1f} {elapsed / len(paths) * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
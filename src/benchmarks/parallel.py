@@ -0,0 +1,71 @@
+"""
+Benchmark process-pool page rendering against worker count.
+
+    cd src && python3 -m benchmarks.parallel --pages 10000 --jobs 1 2 4 8
+"""
+
+# python imports
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+# application imports
+from benchmarks.corpus import generate_corpus
+from extractor import find_markdown_pages, render_pages
+
+
+def _digest_tree(root: Path) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(root.rglob("*.html")):
+        digest.update(str(path.relative_to(root)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel page rendering.")
+    parser.add_argument("--pages", type=int, default=10_000, help="Number of synthetic pages. Default is 10000")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+        help="Worker counts to compare",
+    )
+    args = parser.parse_args()
+    # Per page log lines would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        print(f"Generating {args.pages} synthetic pages in {root}")
+        generate_corpus(root, pages=args.pages)
+        template_path = root / "template.html"
+
+        baseline_time = None
+        baseline_digest = None
+        print(f"{'jobs':>6} {'seconds':>10} {'pages/s':>10} {'speedup':>8}")
+        for jobs in args.jobs:
+            out_dir = root / f"docs-{jobs}"
+            pages = find_markdown_pages(root / "content", out_dir)
+            start = time.perf_counter()
+            render_pages(pages, template_path, "/", jobs)
+            elapsed = time.perf_counter() - start
+
+            digest = _digest_tree(out_dir)
+            if baseline_digest is None:
+                baseline_time, baseline_digest = elapsed, digest
+            elif digest != baseline_digest:
+                raise SystemExit(f"Output with --jobs {jobs} differs from --jobs {args.jobs[0]}")
+            shutil.rmtree(out_dir)
+            print(f"{jobs:>6} {elapsed:>10.2f} {len(pages) / elapsed:>10.0f} {baseline_time / elapsed:>7.2f}x")
+        print("Output identical across all worker counts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Measure what the parse cache saves: rendering pages from markdown against rendering them from
+cached nodes, and the flat marshal encoding against pickling the node trees.
+
+    cd src && python3 -m benchmarks.parse_cache --pages 500
+"""
+
+# python imports
+import argparse
+import io
+import logging
+import marshal
+import pickle
+import random
+import tempfile
+import time
+
+# application imports
+from benchmarks.corpus import generate_page_markdown
+from parsecache import ParseCache, decode_node, encode_node
+from splitblocks import MarkdownStream, markdown_to_html_node, read_markdown_lines
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def render_all(documents, basepath="/base/"):
+    return ["".join(document.iter_html(basepath)) for document in documents]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parse cache.")
+    parser.add_argument("--pages", type=int, default=500, help="Pages to render. Default is 500")
+    parser.add_argument("--paragraphs", type=int, default=60, help="Blocks per page. Default is 60")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rng = random.Random(0)
+    pages = [generate_page_markdown(rng, index, args.paragraphs) for index in range(args.pages)]
+
+    def streams():
+        return [MarkdownStream(read_markdown_lines(io.StringIO(markdown))) for markdown in pages]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ParseCache(tmp)
+        keys = [f"{index:064x}" for index in range(len(pages))]
+        parse_time, parsed = timed(render_all, streams())
+        miss_time, missed = timed(render_all, [cache.document(key, s) for key, s in zip(keys, streams())])
+        hit_time, hits = timed(render_all, [cache.document(key, s) for key, s in zip(keys, streams())])
+        if not parsed == missed == hits:
+            raise SystemExit("Cached pages render differently")
+        stats = cache.stats()
+    print(f"{args.pages} pages, cache {stats['bytes'] / 2**20:.1f} MiB in {stats['entries']} entries")
+    print(f"{'render':>24} {'ms':>9} {'pages/sec':>10}")
+    for name, seconds in (("parse", parse_time), ("parse + record (miss)", miss_time), ("from cache (hit)", hit_time)):
+        print(f"{name:>24} {seconds * 1000:>9.1f} {args.pages / seconds:>10,.0f}")
+
+    trees = [markdown_to_html_node(markdown) for markdown in pages]
+    flat_dump, flat = timed(lambda: [marshal.dumps(encode_node(tree)) for tree in trees])
+    flat_load, _ = timed(lambda: [decode_node(marshal.loads(data)) for data in flat])
+    pickle_dump, pickled = timed(lambda: [pickle.dumps(tree, pickle.HIGHEST_PROTOCOL) for tree in trees])
+    pickle_load, _ = timed(lambda: [pickle.loads(data) for data in pickled])
+    print(f"{'encoding':>24} {'dump ms':>9} {'load ms':>10} {'MiB':>7}")
+    for name, dump, load, blobs in (
+        ("flat marshal", flat_dump, flat_load, flat),
+        ("pickle", pickle_dump, pickle_load, pickled),
+    ):
+        size = sum(len(blob) for blob in blobs) / 2**20
+        print(f"{name:>24} {dump * 1000:>9.1f} {load * 1000:>10.1f} {size:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare peak memory of rendering a large page into one string, of building the whole node tree
+and streaming only the output, and of streaming the markdown in and the HTML out block by block.
+
+    cd src && python3 -m benchmarks.streaming --paragraphs 20000
+"""
+
+# python imports
+import argparse
+import logging
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# application imports
+from benchmarks.corpus import TEMPLATE, generate_page_markdown
+from extractor import extract_title, generate_page
+from splitblocks import markdown_to_html_node
+from template import load_template
+
+
+def render_as_string(from_path, template_path, dest_path, basepath):
+    """The page pipeline before streaming: every stage builds the full document."""
+    markdown = Path(from_path).read_text(encoding="utf-8")
+    html = markdown_to_html_node(markdown).to_html()
+    html = load_template(template_path).render({"Title": extract_title(markdown), "Content": html})
+    html = html.replace('href="/', f'href="{basepath}').replace('src="/', f'src="{basepath}')
+    Path(dest_path).write_text(html, encoding="utf-8")
+
+
+def render_tree(from_path, template_path, dest_path, basepath):
+    """The page pipeline before streaming ingestion: the whole file and node tree, then streamed out."""
+    markdown = Path(from_path).read_text(encoding="utf-8")
+    root = markdown_to_html_node(markdown)
+    chunks = load_template(template_path).iter_render({"Title": extract_title(markdown), "Content": root})
+    with open(dest_path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(chunk.replace('href="/', f'href="{basepath}').replace('src="/', f'src="{basepath}'))
+
+
+def measure(render, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    render(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming page output.")
+    parser.add_argument("--paragraphs", type=int, default=20000, help="Blocks in the page. Default is 20000")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        source = root / "page.md"
+        source.write_text(generate_page_markdown(random.Random(0), 0, args.paragraphs), encoding="utf-8")
+        template_path = root / "template.html"
+        template_path.write_text(TEMPLATE, encoding="utf-8")
+        # Compile the template outside the measurement
+        load_template(template_path)
+        print(f"Markdown: {source.stat().st_size / (1 << 20):.1f} MiB")
+
+        results = {}
+        for name, render in (("string", render_as_string), ("tree", render_tree), ("streaming", generate_page)):
+            dest = root / f"{name}.html"
+            elapsed, peak = measure(render, source, template_path, dest, "/base/")
+            results[name] = dest.read_bytes()
+            print(
+                f"{name:>10}: {elapsed:6.2f}s  peak {peak / (1 << 20):7.1f} MiB  output {dest.stat().st_size >> 20} MiB"
+            )
+        if not results["string"] == results["tree"] == results["streaming"]:
+            raise SystemExit("Streaming output differs from string output")
+        print("Output identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Time every stage of the build on a deterministic synthetic corpus, plus main() end to end, and
+keep the results as JSON so a later run can be compared against them.
+
+    cd src && python3 -m benchmarks.suite run --pages 500 --output baseline.json
+    cd src && python3 -m benchmarks.suite run --pages 500 --mix paragraph=3,code=1 --image-density 0.05
+    cd src && python3 -m benchmarks.suite compare baseline.json current.json --threshold 0.1
+
+Stages are timed on their own, each one fed with the output of the stage before it computed
+up front, and the best of --repeat runs is kept. compare exits with 1 when a stage got slower
+than the baseline by more than the threshold.
+"""
+
+# python imports
+import argparse
+import contextlib
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# application imports
+import splitblocks
+from benchmarks.corpus import BLOCK_KINDS, IMAGE_DENSITY, LINK_DENSITY, TEMPLATE, generate_corpus
+from extractor import extract_title
+from main import main as build_main
+from output import write_if_changed
+from splitblocks import block_to_block_type, block_to_html_node, markdown_to_blocks
+from splitnode import text_to_textnodes
+from template import Template
+
+# Bumped when the stages or the corpus change in a way that makes older results incomparable
+RESULTS_VERSION = 1
+BASEPATH = "/static_site_generator/"
+
+
+def parse_mix(text: str) -> dict:
+    """paragraph=3,code=1 to {"paragraph": 3.0, "code": 1.0}"""
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in BLOCK_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown block kind {kind!r}, expected one of {', '.join(BLOCK_KINDS)}")
+        try:
+            mix[kind] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight {weight!r} for {kind}") from None
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the block mix needs at least one positive weight")
+    return mix
+
+
+def best_of(repeat, function, *args) -> list[float]:
+    """Run function repeat times, returning the seconds of every run."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def record_inline_texts(blocks) -> list[str]:
+    """The exact strings the block converters hand to text_to_textnodes for these blocks."""
+    texts = []
+
+    def recording(text):
+        texts.append(text)
+        return text_to_textnodes(text)
+
+    # splitblocks looks text_to_textnodes up by name on every call
+    splitblocks.text_to_textnodes = recording
+    try:
+        for block, block_type in blocks:
+            block_to_html_node(block, block_type)
+    finally:
+        splitblocks.text_to_textnodes = text_to_textnodes
+    return texts
+
+
+def run_stages(root: Path, args) -> dict:
+    """
+    Time each stage on the corpus under root. Returns {stage: {"runs", "best", "items", "unit"}}.
+    """
+    sources = sorted((root / "content").rglob("*.md"))
+    documents = [path.read_text(encoding="utf-8") for path in sources]
+    blocks = [(block, block_to_block_type(block)) for document in documents for block in markdown_to_blocks(document)]
+    texts = record_inline_texts(blocks)
+    nodes = [splitblocks.markdown_to_html_node(document) for document in documents]
+    contents = [node.to_html(BASEPATH) for node in nodes]
+    titles = [extract_title(document) for document in documents]
+    template = Template.from_string(TEMPLATE)
+    pages = [template.render({"Title": t, "Content": c}, BASEPATH) for t, c in zip(titles, contents)]
+    encoded = [page.encode("utf-8") for page in pages]
+    relative_paths = [path.relative_to(root / "content").with_suffix(".html") for path in sources]
+    out_dirs = (root / f"out-{run}" for run in itertools.count())
+
+    def split_all():
+        for document in documents:
+            markdown_to_blocks(document)
+
+    def classify_all():
+        for block, _ in blocks:
+            block_to_block_type(block)
+
+    def tokenize_all():
+        for text in texts:
+            text_to_textnodes(text)
+
+    def to_html_all():
+        for node in nodes:
+            node.to_html(BASEPATH)
+
+    def template_all():
+        for title, content in zip(titles, contents):
+            template.render({"Title": title, "Content": content}, BASEPATH)
+
+    def write_all():
+        # The way generate_page writes, into a new directory every run so every page is written
+        out_dir = next(out_dirs)
+        for data, path in zip(encoded, relative_paths):
+            (out_dir / path).parent.mkdir(parents=True, exist_ok=True)
+            write_if_changed(out_dir / path, data)
+
+    def rewrite_all():
+        # Over the pages the write stage left, all of them unchanged
+        for data, path in zip(encoded, relative_paths):
+            (root / "out-0" / path).parent.mkdir(parents=True, exist_ok=True)
+            write_if_changed(root / "out-0" / path, data)
+
+    def main_all():
+        # A full build without the parse cache, so every run does the same work
+        with contextlib.chdir(root):
+            build_main(["--full", "--no-cache", "--jobs", str(args.jobs), BASEPATH])
+
+    stages = (
+        ("markdown_to_blocks", split_all, len(documents), "pages"),
+        ("block_to_block_type", classify_all, len(blocks), "blocks"),
+        ("text_to_textnodes", tokenize_all, len(texts), "texts"),
+        ("to_html", to_html_all, len(nodes), "pages"),
+        ("template", template_all, len(pages), "pages"),
+        ("write", write_all, len(pages), "pages"),
+        ("rewrite_unchanged", rewrite_all, len(pages), "pages"),
+        ("main", main_all, len(documents), "pages"),
+    )
+    results = {}
+    for name, function, items, unit in stages:
+        if args.stages and name not in args.stages:
+            continue
+        runs = best_of(args.repeat, function)
+        results[name] = {"runs": runs, "best": min(runs), "items": items, "unit": unit}
+        best = min(runs)
+        print(f"{name:>20} {best * 1000:>10.1f} {items / best:>12,.0f} {unit}/sec", file=sys.stderr)
+    return results
+
+
+def run_command(args) -> None:
+    corpus = {
+        "pages": args.pages,
+        "blocks": args.blocks,
+        "mix": args.mix,
+        "link_density": args.link_density,
+        "image_density": args.image_density,
+        "seed": args.seed,
+    }
+    # Per page log lines would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate_corpus(root, args.pages, args.blocks, args.seed, args.mix, args.link_density, args.image_density)
+        (root / "static").mkdir()
+        (root / "static" / "index.css").write_text("body { margin: 0 }\n", encoding="utf-8")
+        print(f"{args.pages} pages of {args.blocks} blocks, best of {args.repeat} runs", file=sys.stderr)
+        print(f"{'stage':>20} {'ms':>10} {'per sec':>12}", file=sys.stderr)
+        stages = run_stages(root, args)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.datetime.now(datetime.UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "corpus": corpus,
+        "repeat": args.repeat,
+        "jobs": args.jobs,
+        "stages": stages,
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> tuple[list[tuple], list[str]]:
+    """
+    Compare the best time of every stage.
+    Returns:
+        tuple: ([(stage, baseline seconds, current seconds, change, status)], [warnings]) where
+            change is current / baseline - 1 and status is "regression", "faster", "ok",
+            "new" or "missing".
+    """
+    warnings = []
+    for key in ("version", "corpus", "repeat", "jobs", "python"):
+        if baseline.get(key) != current.get(key):
+            warnings.append(f"{key} differs: {baseline.get(key)} in the baseline, {current.get(key)} now")
+    rows = []
+    base_stages, stages = baseline.get("stages", {}), current.get("stages", {})
+    for name in list(base_stages) + [name for name in stages if name not in base_stages]:
+        if name not in stages:
+            rows.append((name, base_stages[name]["best"], None, None, "missing"))
+            continue
+        if name not in base_stages:
+            rows.append((name, None, stages[name]["best"], None, "new"))
+            continue
+        before, after = base_stages[name]["best"], stages[name]["best"]
+        change = after / before - 1
+        if change > threshold:
+            status = "regression"
+        elif change < -threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, before, after, change, status))
+    return rows, warnings
+
+
+def compare_command(args) -> int:
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    rows, warnings = compare_results(baseline, current, args.threshold)
+    for warning in warnings:
+        print(f"warning: {warning}")
+
+    def ms(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+    print(f"{'stage':>20} {'baseline ms':>12} {'current ms':>12} {'change':>8}  status")
+    for name, before, after, change, status in rows:
+        change_text = "-" if change is None else f"{change:+.1%}"
+        print(f"{name:>20} {ms(before):>12} {ms(after):>12} {change_text:>8}  {status}")
+    regressions = [row[0] for row in rows if row[4] == "regression"]
+    if regressions:
+        print(
+            f"{len(regressions)} stage(s) slower than the baseline by more than {args.threshold:.0%}: "
+            f"{', '.join(regressions)}"
+        )
+        return 1
+    print(f"No stage slower than the baseline by more than {args.threshold:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the build stage by stage.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Time every stage on a synthetic corpus")
+    run.add_argument("--pages", type=int, default=500, help="Number of synthetic pages. Default is 500")
+    run.add_argument("--blocks", type=int, default=12, help="Blocks per page after the title. Default is 12")
+    run.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=None,
+        help=f"Weights of the block kinds, e.g. paragraph=3,code=1. Kinds: {', '.join(BLOCK_KINDS)}. "
+        "By default the kinds other than code take turns",
+    )
+    run.add_argument(
+        "--link-density", type=float, default=LINK_DENSITY, help=f"Sentences with a link. Default is {LINK_DENSITY}"
+    )
+    run.add_argument(
+        "--image-density",
+        type=float,
+        default=IMAGE_DENSITY,
+        help=f"Sentences with an image. Default is {IMAGE_DENSITY}",
+    )
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--repeat", type=int, default=3, help="Runs per stage, the best is kept. Default is 3")
+    run.add_argument("--jobs", type=int, default=1, help="--jobs of the end to end build. Default is 1")
+    run.add_argument("--stages", nargs="+", metavar="STAGE", help="Only time these stages")
+    run.add_argument("--output", "-o", help="Write the JSON results here instead of to stdout")
+
+    compare = commands.add_parser("compare", help="Flag stages that got slower than a baseline")
+    compare.add_argument("baseline", help="JSON results of the baseline run")
+    compare.add_argument("current", help="JSON results to check")
+    compare.add_argument(
+        "--threshold", type=float, default=0.1, help="Allowed slowdown before a stage is flagged. Default is 0.1"
+    )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run_command(args)
+    else:
+        raise SystemExit(compare_command(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+# python imports
+import logging
+import time
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+from assets import sync_static, COPY_WORKERS
+from discover import IgnoreRules, IGNORE_FILE
+from extractor import PageGenerationError, generate_pages_incrementally, plan_page, build_pages
+from compress import precompress_tree
+from listings import generate_listings, LISTING_PAGE_SIZE
+from manifest import BuildManifest, MANIFEST_PATH
+from metadata import FrontMatterError, SiteMetadata
+from output import DirectorySink, OutputSink
+import tracing
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Rebuilds of a few paths (watch mode, the daemon) prune the parse cache at most this often, as
+# listing the whole cache costs more than rebuilding a page
+CACHE_PRUNE_INTERVAL_SECONDS = 60
+
+
+def check_basepath(basepath) -> str:
+    """
+    A basepath to build with, it must start with / like /blog/.
+    Raises:
+        ValueError: If it does not.
+    """
+    if not isinstance(basepath, str) or not basepath.startswith("/"):
+        raise ValueError(f"{basepath!r} is not a base path, expecting one starting with / like /blog/")
+    return basepath
+
+
+class SiteBuild:
+    """
+    The inputs, outputs and options of a site build in one place, so the same build can be run
+    in full from main() or partially from watch mode for the handful of files that changed.
+    output_dir can also be an OutputSink, MemorySink() builds the site without writing it to disk.
+    With a file_index (DirectoryIndex) the content and static directories that did not change
+    since the last build are not listed again, the index is saved along with the manifest, and so
+    is the metadata (SiteMetadata) of the pages. Pages marked draft: true are only built with drafts.
+    With listings the blog index, tag and archive pages are generated from that metadata too.
+    """
+
+    def __init__(
+        self,
+        content_dir=Path("content"),
+        static_dir=Path("static"),
+        template_path=Path("template.html"),
+        output_dir=Path("docs"),
+        basepath="/",
+        manifest=None,
+        jobs=1,
+        checksum=False,
+        copy_strategy="copy",
+        copy_workers=COPY_WORKERS,
+        parse_cache=None,
+        precompress=False,
+        compress_jobs=0,
+        shard=None,
+        file_index=None,
+        metadata=None,
+        drafts=False,
+        listings=False,
+        listing_page_size=LISTING_PAGE_SIZE,
+    ):
+        self.content_dir = Path(content_dir)
+        self.static_dir = Path(static_dir)
+        self.template_path = Path(template_path)
+        # Every output is written and removed through the sink, self.output_dir is its root
+        self.output = output_dir if isinstance(output_dir, OutputSink) else DirectorySink(output_dir)
+        self.output_dir = self.output.root
+        self.basepath = basepath
+        self.manifest = manifest if manifest is not None else BuildManifest.load(MANIFEST_PATH)
+        self.jobs = jobs
+        self.checksum = checksum
+        self.copy_strategy = copy_strategy
+        self.copy_workers = copy_workers
+        self.parse_cache = parse_cache
+        self.precompress = precompress
+        self.compress_jobs = compress_jobs
+        # Only the pages and static files of this shard are built, see Shard
+        self.shard = shard
+        self.file_index = file_index
+        self.metadata = metadata if metadata is not None else SiteMetadata(None)
+        self.drafts = drafts
+        self.listings = listings
+        self.listing_page_size = listing_page_size
+        # The .ssgignore rules of the content and static trees, by root: (mtime of the file, rules)
+        self._ignore_rules = {}
+        self._pruned_at = None
+        if precompress and not isinstance(self.output, DirectorySink):
+            raise ValueError("Precompressing needs an output directory")
+
+    @property
+    def layouts_dir(self) -> Path:
+        return self.template_path.parent / "layouts"
+
+    def watch_paths(self) -> list[Path]:
+        """Everything a change to which can affect the output."""
+        paths = [self.content_dir, self.static_dir, self.template_path]
+        if self.layouts_dir.is_dir():
+            paths.append(self.layouts_dir)
+        return paths
+
+    def sync_static(self):
+        with tracing.span("static"):
+            return sync_static(
+                self.static_dir,
+                self.output,
+                self.manifest,
+                checksum=self.checksum,
+                strategy=self.copy_strategy,
+                workers=self.copy_workers,
+                shard=self.shard,
+                index=self.file_index,
+            )
+
+    def generate_pages(self, full=False, cancel=None) -> list[Path]:
+        return generate_pages_incrementally(
+            self.content_dir,
+            self.template_path,
+            self.output_dir,
+            self.basepath,
+            self.manifest,
+            full=full,
+            jobs=self.jobs,
+            cancel=cancel,
+            cache=self.parse_cache,
+            sink=self.output,
+            shard=self.shard,
+            index=self.file_index,
+            metadata=self.metadata,
+            drafts=self.drafts,
+        )
+
+    def generate_listings(self, full=False) -> list[Path]:
+        """Write the listing pages whose posts changed, or remove them all when listings are off."""
+        if not self.listings:
+            # Listings turned off since the last build
+            self.manifest.remove_stale_listings([], self.output)
+            return []
+        return generate_listings(
+            self.content_dir,
+            self.template_path,
+            self.output_dir,
+            self.basepath,
+            self.manifest,
+            self.metadata,
+            self.output,
+            page_size=self.listing_page_size,
+            drafts=self.drafts,
+            full=full,
+        )
+
+    def precompress_output(self):
+        """Write the .gz (and .zst) variants of the outputs that changed, with precompress on."""
+        if not self.precompress:
+            return None
+        with tracing.span("compress"):
+            # A .gz shipped in static/ is an asset of its own, not a variant to replace
+            return precompress_tree(
+                self.output_dir,
+                self.compress_jobs,
+                keep=self.manifest.assets.keys(),
+                incompressible=self.manifest.incompressible,
+            )
+
+    def run(self, full=False, cancel=None, save=True) -> list[Path]:
+        """
+        Sync the static files, generate every page whose inputs changed, then the listings, and
+        precompress the outputs if asked to.
+        The manifest is saved even when some pages fail, so the next run only retries those.
+        With save=False the caller saves it later, see save.
+        Returns:
+            list[Path]: The pages and listing pages that were generated.
+        """
+        self.output.make_dirs([self.output_dir])
+        try:
+            self.sync_static()
+            try:
+                generated = self.generate_pages(full=full, cancel=cancel)
+            except PageGenerationError as e:
+                # The failed pages keep their last listing, the other posts are listed as usual
+                e.generated.extend(self.generate_listings(full))
+                raise
+            generated.extend(self.generate_listings(full))
+            self.precompress_output()
+            return generated
+        finally:
+            if save:
+                self.save()
+
+    def save(self, prune_interval=0) -> None:
+        """
+        Save the manifest, the file index and the page metadata and prune the parse cache, once a
+        build is done.
+        Args:
+            prune_interval (float): Skip pruning when the cache was pruned less than this many seconds ago.
+        """
+        with tracing.span("save"):
+            self.manifest.save()
+            if self.file_index is not None:
+                self.file_index.save()
+            self.metadata.save()
+            self._prune_cache(prune_interval)
+
+    def is_ignored(self, path) -> bool:
+        """Whether a path below content/ or static/ is left out of the site by the .ssgignore of its tree."""
+        path = Path(path)
+        for root in (self.content_dir, self.static_dir):
+            if path != root and _is_within(path, root):
+                relative = path.relative_to(root)
+                return relative == Path(IGNORE_FILE) or self._ignore_rules_of(root).ignores_path(relative)
+        return False
+
+    def _ignore_rules_of(self, root: Path) -> IgnoreRules:
+        # One stat per call instead of reading and compiling the patterns again
+        try:
+            mtime = (root / IGNORE_FILE).stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        cached = self._ignore_rules.get(root)
+        if cached is None or cached[0] != mtime:
+            cached = self._ignore_rules[root] = (mtime, IgnoreRules.load(root))
+        return cached[1]
+
+    def rebuild_paths(self, changed_paths, cancel=None, save=True) -> list[Path]:
+        """
+        Update the output for a set of changed input paths, doing as little work as possible:
+
+            - a changed or deleted markdown file re-renders or removes just that page
+            - a changed or deleted static file copies or removes just that file
+            - a template or layout change re-renders the pages using it (via the manifest)
+            - anything else under content/ or static/ (a directory moved, an .ssgignore
+              changed, ...) falls back to the incremental pass over that tree
+            - files left out by an .ssgignore are skipped
+            - with listings, the listing pages showing a changed or deleted post are written again
+
+        Args:
+            changed_paths (iterable[Path]): Files or directories that changed.
+            cancel (threading.Event): Stop as soon as possible once set, see render_pages.
+            save (bool): Save the manifest when done, see run.
+        Returns:
+            list[Path]: The outputs that were written.
+        Raises:
+            BuildCancelled: If cancel was set part way. Pages that were not finished stay stale
+                in the manifest and are picked up by the next rebuild.
+        """
+        pages, assets = [], []
+        rescan_content = rescan_static = False
+        for path in sorted({Path(path) for path in changed_paths}):
+            if path.name == IGNORE_FILE and path.parent in (self.content_dir, self.static_dir):
+                rescan_content = rescan_content or path.parent == self.content_dir
+                rescan_static = rescan_static or path.parent == self.static_dir
+                continue
+            if self.is_ignored(path):
+                continue
+            if _is_within(path, self.content_dir):
+                if path.suffix == ".md" and not path.is_dir():
+                    pages.append(path)
+                else:
+                    rescan_content = True
+            elif _is_within(path, self.static_dir):
+                if path.is_file() or (not path.exists() and str(self._asset_output(path)) in self.manifest.assets):
+                    assets.append(path)
+                else:
+                    rescan_static = True
+            else:
+                # The template, a layout or a partial: the manifest knows which pages used it
+                rescan_content = True
+
+        written = []
+        try:
+            if rescan_static:
+                written.extend(self.sync_static().copied)
+            else:
+                written.extend(self._rebuild_assets(assets))
+            try:
+                if rescan_content:
+                    written.extend(self.generate_pages(cancel=cancel))
+                elif pages:
+                    written.extend(self._rebuild_pages(pages, cancel))
+            except PageGenerationError as e:
+                e.generated.extend(self.generate_listings())
+                raise
+            if rescan_content or pages:
+                # Only the listing pages showing one of the changed pages are written
+                written.extend(self.generate_listings())
+            self.precompress_output()
+        finally:
+            if save:
+                self.save(CACHE_PRUNE_INTERVAL_SECONDS)
+        return written
+
+    def _prune_cache(self, min_interval=0) -> None:
+        # Eviction happens here, once per build, never in the workers reading the cache
+        if self.parse_cache is None:
+            return
+        now = time.monotonic()
+        if self._pruned_at is not None and now - self._pruned_at < min_interval:
+            return
+        self.parse_cache.prune()
+        self._pruned_at = now
+
+    def _asset_output(self, src_path: Path) -> Path:
+        return self.output_dir / src_path.relative_to(self.static_dir)
+
+    def _rebuild_assets(self, src_paths) -> list[Path]:
+        copied, gone = [], []
+        for src_path in src_paths:
+            dest_path = self._asset_output(src_path)
+            if not src_path.exists():
+                gone.append(dest_path)
+                continue
+            self.manifest.assets[str(dest_path)] = str(src_path)
+            if self.output.is_copy_of(src_path, dest_path, self.checksum):
+                continue
+            self.output.copy([(src_path, dest_path)], self.copy_strategy, workers=1)
+            logger.info(f"Copied file {src_path} to {dest_path}")
+            copied.append(dest_path)
+        self.manifest.remove_outputs(gone, self.output)
+        return copied
+
+    def _rebuild_pages(self, src_paths, cancel=None) -> list[Path]:
+        planned, gone, failures = [], [], []
+        for src_path in src_paths:
+            dest_path = self.output_dir / src_path.relative_to(self.content_dir).with_suffix(".html")
+            try:
+                page_metadata = self.metadata.get(src_path)
+                if page_metadata["draft"] and not self.drafts:
+                    gone.append(dest_path)
+                    continue
+                page = plan_page(
+                    src_path, dest_path, self.content_dir, self.template_path, self.basepath, page_metadata["layout"]
+                )
+            except FileNotFoundError as e:
+                if src_path.exists():
+                    # The page asks for a layout that does not exist
+                    failures.append((src_path, f"{type(e).__name__}: {e}"))
+                else:
+                    self.metadata.forget(src_path)
+                    gone.append(dest_path)
+                continue
+            except FrontMatterError as e:
+                failures.append((src_path, f"{type(e).__name__}: {e}"))
+                continue
+            if not self.manifest.is_current(dest_path, page[3], self.output):
+                planned.append(page)
+        self.manifest.remove_outputs(gone, self.output)
+        try:
+            generated = build_pages(
+                planned,
+                self.template_path,
+                self.basepath,
+                self.manifest,
+                self.jobs,
+                cancel,
+                self.parse_cache,
+                self.output,
+            )
+        except PageGenerationError as e:
+            raise PageGenerationError(failures + e.failures, e.generated) from None
+        if failures:
+            raise PageGenerationError(failures, generated)
+        return generated
+
+
+def _is_within(path: Path, root: Path) -> bool:
+    return path == root or root in path.parents
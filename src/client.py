@@ -0,0 +1,75 @@
+"""
+Thin client of the build daemon (main.py daemon). It only uses the standard library so it starts
+in a few milliseconds, the daemon does the work with everything already loaded:
+
+    python3 src/client.py build content/blog/tom/index.md
+    python3 src/client.py build --full
+    python3 src/client.py status|stop
+"""
+
+# python imports
+import argparse
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+
+# Where the daemon listens, next to the build manifest
+DAEMON_SOCKET = Path(".ssg") / "daemon.sock"
+
+
+def send_request(request: dict, socket_path=DAEMON_SOCKET, timeout=None) -> dict:
+    """
+    Send one request to the daemon and wait for its response, both are a line of JSON.
+    Raises:
+        OSError: If no daemon listens on socket_path (FileNotFoundError, ConnectionRefusedError).
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("The build daemon closed the connection without answering")
+    return json.loads(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="client.py", description="Send a request to the build daemon.")
+    parser.add_argument("action", choices=["build", "status", "stop"])
+    parser.add_argument("paths", nargs="*", help="Changed files to rebuild, default is an incremental build")
+    parser.add_argument("--full", action="store_true", help="Render every page again")
+    parser.add_argument("--basepath", help="Build with this base path from now on")
+    parser.add_argument("--socket", type=Path, default=DAEMON_SOCKET, help=f"Default is {DAEMON_SOCKET}")
+    args = parser.parse_args(argv)
+
+    request = {"action": args.action}
+    if args.action == "build":
+        # The daemon may run in another directory, it makes them relative to its own
+        request.update(paths=[os.path.abspath(path) for path in args.paths], full=args.full, basepath=args.basepath)
+    try:
+        response = send_request(request, args.socket)
+    except OSError as e:
+        print(f"No build daemon on {args.socket} ({e}), start one with: python3 src/main.py daemon", file=sys.stderr)
+        return 2
+
+    if args.action != "build":
+        print(json.dumps(response, indent=2))
+        return 0 if response.get("ok") else 1
+    for path in response.get("written", []):
+        print(path)
+    for source, error in response.get("failures", []):
+        print(f"{source}: {error}", file=sys.stderr)
+    if response.get("error"):
+        print(response["error"], file=sys.stderr)
+    print(
+        f"Wrote {len(response.get('written', []))} outputs in {response.get('elapsed_ms', 0):.1f} ms", file=sys.stderr
+    )
+    return 0 if response.get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
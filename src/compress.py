@@ -0,0 +1,236 @@
+# python imports
+import gzip
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:  # older Pythons only get .gz
+    zstd = None
+
+# application imports
+from log_config import setup_logging
+from assets import walk_files
+from output import write_if_changed
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Outputs worth precompressing, images and fonts are compressed already
+COMPRESSIBLE_SUFFIXES = frozenset(
+    (".html", ".htm", ".css", ".js", ".mjs", ".json", ".xml", ".svg", ".txt", ".map", ".md", ".csv", ".ico")
+)
+# Smaller files do not get smaller once the headers are added
+COMPRESS_MIN_SIZE = 256
+# Files handed to a worker process in one go
+COMPRESS_CHUNK_SIZE = 16
+
+
+def _gzip(data: bytes) -> bytes:
+    # mtime=0 keeps the output identical from one build to the next
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _zstd(data: bytes) -> bytes:
+    return zstd.compress(data, level=zstd.CompressionParameter.compression_level.bounds()[1])
+
+
+# Sibling suffix to compressor, at maximum level. nginx serves page.html.gz for page.html with
+# gzip_static on, and page.html.zst with the zstd module
+ENCODINGS = {".gz": _gzip}
+if zstd is not None:
+    ENCODINGS[".zst"] = _zstd
+# Every suffix a variant can have, also the ones this Python cannot write (for clean up)
+SIBLING_SUFFIXES = frozenset((".gz", ".zst"))
+
+
+class CompressReport:
+    """What a precompress pass did, counted per compressed variant."""
+
+    def __init__(self):
+        self.written = []
+        self.reused = 0
+        self.not_smaller = 0
+        self.removed = []
+        self.bytes_saved = 0
+        # Path to [size, change time, suffixes] of the files with variants that were not smaller
+        self.incompressible = {}
+
+    def merge(self, other) -> None:
+        self.written.extend(other.written)
+        self.reused += other.reused
+        self.not_smaller += other.not_smaller
+        self.removed.extend(other.removed)
+        self.bytes_saved += other.bytes_saved
+        self.incompressible.update(other.incompressible)
+
+    def __repr__(self):
+        return (
+            f"CompressReport(written={len(self.written)}, reused={self.reused}, "
+            f"not_smaller={self.not_smaller}, removed={len(self.removed)})"
+        )
+
+
+def is_compressible(path) -> bool:
+    return Path(path).suffix.lower() in COMPRESSIBLE_SUFFIXES
+
+
+def precompress_file(path, encodings=None, keep=frozenset(), incompressible=None) -> CompressReport:
+    """
+    Write the compressed siblings of a file (page.html.gz, page.html.zst, ...).
+    A sibling newer than the file is reused without reading either. The file counts as changed
+    when it was modified or replaced (its ctime), a static file copied with an older mtime than
+    the sibling is still compressed again. A variant that is not
+    smaller than the file is not written, and an older sibling of it is removed so it is
+    never served instead of the newer file. That outcome is recorded in the report, so the
+    file is not read again while it stays the same.
+    Args:
+        path (Path): The file to compress.
+        encodings (iterable[str]): Sibling suffixes to write, default every one in ENCODINGS.
+        keep (set[str]): Paths that are not ours to write or remove, like a .gz shipped in static/.
+        incompressible (dict): The variants found not smaller before, see CompressReport.
+    Returns:
+        CompressReport: What was done for this file.
+    """
+    path = Path(path)
+    report = CompressReport()
+    data = None
+    stat = os.stat(path)
+    not_smaller = []
+    for suffix, fresh, known_not_smaller in _variants(path, encodings or ENCODINGS, keep, incompressible, stat):
+        if fresh:
+            if known_not_smaller:
+                not_smaller.append(suffix)
+                report.not_smaller += 1
+            else:
+                report.reused += 1
+            continue
+        sibling = path.with_name(path.name + suffix)
+        if data is None:
+            data = path.read_bytes()
+        compressed = ENCODINGS[suffix](data) if len(data) >= COMPRESS_MIN_SIZE else data
+        if len(compressed) >= len(data):
+            not_smaller.append(suffix)
+            report.not_smaller += 1
+            if sibling.exists():
+                sibling.unlink()
+                report.removed.append(sibling)
+            continue
+        if not write_if_changed(sibling, compressed):
+            # Same bytes as before, only mark it as up to date with the file
+            os.utime(sibling)
+        report.written.append(sibling)
+        report.bytes_saved += len(data) - len(compressed)
+    if not_smaller and stat.st_size >= COMPRESS_MIN_SIZE:
+        report.incompressible[str(path)] = [stat.st_size, _changed_ns(stat), not_smaller]
+    return report
+
+
+def _changed_ns(stat) -> int:
+    return max(stat.st_mtime_ns, stat.st_ctime_ns)
+
+
+def _variants(path: Path, encodings, keep, incompressible=None, stat=None):
+    """
+    Yield (suffix, fresh, not smaller) for the variants of path to handle. A variant is fresh when
+    its sibling is newer than the file, or when there is no sibling because the variant is known
+    not to be smaller: the file is under COMPRESS_MIN_SIZE, or incompressible says so for the
+    same size and change time.
+    """
+    stat = stat or os.stat(path)
+    changed_ns = _changed_ns(stat)
+    if stat.st_size < COMPRESS_MIN_SIZE:
+        not_smaller = encodings
+    else:
+        known = (incompressible or {}).get(str(path))
+        not_smaller = known[2] if known and known[:2] == [stat.st_size, changed_ns] else ()
+    for suffix in encodings:
+        sibling = f"{path}{suffix}"
+        if sibling in keep:
+            continue
+        try:
+            yield suffix, os.stat(sibling).st_mtime_ns > changed_ns, False
+        except FileNotFoundError:
+            yield suffix, suffix in not_smaller, suffix in not_smaller
+
+
+def _precompress_chunk(paths, encodings, keep) -> CompressReport:
+    report = CompressReport()
+    for path in paths:
+        report.merge(precompress_file(path, encodings, keep))
+    return report
+
+
+def precompress_tree(root, jobs=0, encodings=None, keep=frozenset(), incompressible=None) -> CompressReport:
+    """
+    Precompress every compressible file below root, see precompress_file, and remove the
+    compressed siblings whose file is gone.
+    Args:
+        root (Path): The output directory.
+        jobs (int): Number of worker processes, 0 means one per CPU, 1 compresses in this process.
+        encodings (iterable[str]): Sibling suffixes to write, default every one in ENCODINGS.
+        keep (set[str]): Paths that are not ours to write or remove, see precompress_file.
+        incompressible (dict): The files whose variants were not smaller, by size and change time,
+            see CompressReport. Updated in place, so those files are not read again next time.
+    Returns:
+        CompressReport: The written, reused, skipped and removed variants.
+    """
+    root = Path(root)
+    encodings = tuple(encodings or ENCODINGS)
+    # Only the compressed files matter to the workers
+    keep = frozenset(path for path in keep if Path(path).suffix in SIBLING_SUFFIXES)
+    files, siblings = [], []
+    for path in walk_files(root):
+        if path.suffix in SIBLING_SUFFIXES:
+            siblings.append(path)
+        elif is_compressible(path):
+            files.append(path)
+
+    report = CompressReport()
+    # Variants of pages and files deleted since, so they are never served stale. An archive.tar.gz
+    # is not a variant (.tar is not compressible) and neither is anything in keep
+    for sibling in siblings:
+        source = sibling.with_suffix("")
+        if is_compressible(source) and str(sibling) not in keep and not source.is_file():
+            sibling.unlink()
+            report.removed.append(sibling)
+
+    # Checked here first, so a build where nothing changed does not start any worker
+    incompressible = {} if incompressible is None else incompressible
+    known = {str(path): incompressible[str(path)] for path in files if str(path) in incompressible}
+    stale = []
+    for path in files:
+        variants = list(_variants(path, encodings, keep, known))
+        if all(fresh for _, fresh, _ in variants):
+            not_smaller = sum(known_not_smaller for _, _, known_not_smaller in variants)
+            report.not_smaller += not_smaller
+            report.reused += len(variants) - not_smaller
+        else:
+            stale.append(path)
+            known.pop(str(path), None)
+    files = stale
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    chunks = [files[i : i + COMPRESS_CHUNK_SIZE] for i in range(0, len(files), COMPRESS_CHUNK_SIZE)]
+    if jobs == 1 or len(chunks) <= 1:
+        results = [_precompress_chunk(chunk, encodings, keep) for chunk in chunks]
+    else:
+        # Compressing at maximum level is CPU bound, so it runs on processes like rendering
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_precompress_chunk, chunks, [encodings] * len(chunks), [keep] * len(chunks)))
+    for result in results:
+        report.merge(result)
+    # Files that are gone or were compressed again are forgotten
+    incompressible.clear()
+    incompressible.update(known)
+    incompressible.update(report.incompressible)
+
+    logger.info(
+        f"Precompressed {root} ({', '.join(encodings)}): wrote {len(report.written)}, reused {report.reused}, "
+        f"not smaller {report.not_smaller}, removed {len(report.removed)}, saved {report.bytes_saved >> 10} KiB"
+    )
+    return report
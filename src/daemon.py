@@ -0,0 +1,218 @@
+# python imports
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+from build import CACHE_PRUNE_INTERVAL_SECONDS, check_basepath
+from client import DAEMON_SOCKET
+from extractor import PageGenerationError
+from template import load_template
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Longest request line accepted, a rebuild of many paths is still far below it
+MAX_REQUEST_BYTES = 16 << 20
+
+
+class BuildDaemon:
+    """
+    Keeps a SiteBuild loaded between builds: the interpreter, the imported modules and their
+    compiled regexes, the compiled templates, the build manifest and the parse cache are paid
+    for once instead of on every run of main.py. Requests come in over a Unix socket, one line
+    of JSON each, and get one line of JSON back (see client.py):
+
+        {"action": "build", "paths": ["/site/content/blog/tom/index.md"], "basepath": "/"}
+        {"ok": true, "written": ["docs/blog/tom/index.html"], "failures": [], "elapsed_ms": 1.9}
+
+    A build without paths is an incremental build of the whole site ("full" renders every page).
+    Builds run one at a time on a thread, so status requests are answered while one runs. The
+    manifest is saved once the response is sent, saving it takes longer than rebuilding a page
+    on a big site.
+    """
+
+    def __init__(self, builder, socket_path=DAEMON_SOCKET):
+        self.builder = builder
+        self.socket_path = Path(socket_path)
+        self.builds = 0
+        self._server = None
+        self._lock = asyncio.Lock()
+        self._stopped = asyncio.Event()
+        self._connections = set()
+        self._saving = None
+
+    async def start(self) -> None:
+        _claim_socket(self.socket_path)
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=str(self.socket_path), limit=MAX_REQUEST_BYTES
+        )
+        # Compiled now so the first request is as fast as the next ones
+        load_template(self.builder.template_path)
+        logger.info(f"Build daemon {os.getpid()} listening on {self.socket_path}")
+
+    async def wait_stopped(self) -> None:
+        await self._stopped.wait()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def close(self) -> None:
+        self._stopped.set()
+        if self._saving is not None:
+            await self._saving
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self.socket_path.unlink(missing_ok=True)
+            self._server = None
+
+    async def _handle(self, reader, writer) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Past MAX_REQUEST_BYTES, the rest of the line cannot be told from the next request
+                    await self._respond(writer, {"ok": False, "error": "Request too long"})
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    response = {"ok": False, "error": f"Invalid request: {e}"}
+                else:
+                    response = await self.handle_request(request)
+                await self._respond(writer, response)
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, response: dict) -> None:
+        writer.write(json.dumps(response).encode("utf-8") + b"\n")
+        await writer.drain()
+
+    async def handle_request(self, request: dict) -> dict:
+        action = request.get("action", "build") if isinstance(request, dict) else None
+        if action == "build":
+            async with self._lock:
+                response = await asyncio.to_thread(self.build, request)
+            # Runs after the response is written, the next build waits for it on the lock
+            self._saving = asyncio.create_task(self._save())
+            return response
+        if action == "status":
+            return {
+                "ok": True,
+                "pid": os.getpid(),
+                "building": self._lock.locked(),
+                "builds": self.builds,
+                "basepath": self.builder.basepath,
+                "pages": len(self.builder.manifest.pages),
+            }
+        if action == "stop":
+            logger.info("Stopping the build daemon")
+            self.stop()
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown action {action!r}"}
+
+    async def _save(self) -> None:
+        async with self._lock:
+            try:
+                await asyncio.to_thread(self.builder.save, CACHE_PRUNE_INTERVAL_SECONDS)
+            except Exception:
+                logger.exception("Saving the build manifest failed")
+
+    def build(self, request: dict) -> dict:
+        """
+        Run one build request with the warm SiteBuild, see the class docstring.
+        Returns:
+            dict: ok, the written outputs, the failed pages as (source, error) and the time taken.
+        """
+        start = time.perf_counter()
+        builder = self.builder
+        basepath = request.get("basepath")
+        if basepath is not None:
+            try:
+                check_basepath(basepath)
+            except ValueError as e:
+                # Nothing is built, the pages keep the basepath they have
+                return {"ok": False, "written": [], "failures": [], "error": str(e)}
+        paths = [self._relative(path) for path in request.get("paths") or []]
+        if basepath is not None and basepath != builder.basepath:
+            logger.info(f"Basepath changed from {builder.basepath} to {basepath}")
+            builder.basepath = basepath
+            # Every page is rendered with the basepath, so none of them is current any more
+            paths = []
+        response = {"ok": True, "written": [], "failures": []}
+        try:
+            if paths:
+                written = builder.rebuild_paths(paths, save=False)
+            else:
+                written = builder.run(full=bool(request.get("full")), save=False)
+        except PageGenerationError as e:
+            failures = [(str(source), error) for source, error in e.failures]
+            response.update(ok=False, written=[str(path) for path in e.generated], failures=failures)
+        except Exception as e:
+            logger.exception("Build request failed")
+            response.update(ok=False, error=f"{type(e).__name__}: {e}")
+        else:
+            response["written"] = [str(path) for path in written]
+        self.builds += 1
+        response["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        logger.info(f"Build request done in {response['elapsed_ms']} ms, wrote {len(response['written'])}")
+        return response
+
+    @staticmethod
+    def _relative(path) -> Path:
+        # The client sends absolute paths, the build works with paths relative to where it runs
+        path = Path(path)
+        if path.is_absolute():
+            try:
+                return path.relative_to(Path.cwd())
+            except ValueError:
+                pass
+        return path
+
+
+def _claim_socket(path: Path) -> None:
+    """Remove the socket a daemon that died left behind, refuse to start next to a live one."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path))
+        except OSError:
+            path.unlink(missing_ok=True)
+            return
+    raise RuntimeError(f"A build daemon is already listening on {path}")
+
+
+async def run_daemon(builder, socket_path=DAEMON_SOCKET) -> None:
+    """Run a BuildDaemon until it is asked to stop, cancelled (Ctrl-C) or terminated."""
+    daemon = BuildDaemon(builder, socket_path)
+    await daemon.start()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, daemon.stop)
+    except (NotImplementedError, RuntimeError, ValueError):
+        # Windows has no Unix signals, and only the main thread can handle them
+        pass
+    try:
+        await daemon.wait_stopped()
+    finally:
+        await daemon.close()
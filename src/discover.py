@@ -0,0 +1,234 @@
+# python imports
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Glob patterns of files and directories to leave out, read from the root of content/ and static/
+IGNORE_FILE = ".ssgignore"
+# Where the directory index of the last build is kept, see DirectoryIndex
+INDEX_PATH = Path(".ssg") / "files.json"
+# Bump when the layout of the index changes so old indexes are ignored
+INDEX_VERSION = 2
+# Directories modified this recently are listed again next time: a change in the same tick of
+# the filesystem clock would not change their mtime (2 s covers FAT, ext4 and APFS use ns)
+RACY_NS = 2_000_000_000
+
+
+class IgnoreRules:
+    """
+    The patterns of an .ssgignore file, one per line, matched with fnmatch like .gitignore:
+
+        # comment
+        drafts/         a directory named drafts anywhere, with everything below it
+        *.tmp           a file or directory name anywhere
+        /notes.md       anchored to the root, as is any pattern with a / in it
+        !keep.tmp       re-include what an earlier pattern left out
+
+    The last matching pattern wins. An ignored directory is never entered, so nothing below it
+    can be re-included.
+    """
+
+    def __init__(self, patterns=()):
+        self.patterns = [pattern for pattern in patterns if pattern.strip() and not pattern.startswith("#")]
+        # (compiled pattern, matched against the relative path (else the name), directories only, negated)
+        self._rules = []
+        for pattern in self.patterns:
+            pattern = pattern.rstrip()
+            negate = pattern.startswith("!")
+            pattern = pattern[1:] if negate else pattern
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            match_path = "/" in pattern
+            regex = re.compile(fnmatch.translate(pattern.lstrip("/")))
+            self._rules.append((regex, match_path, dir_only, negate))
+        self.digest = hashlib.sha256("\n".join(self.patterns).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls, root):
+        """The rules of root/.ssgignore, none when there is no such file."""
+        try:
+            with open(Path(root) / IGNORE_FILE, "r", encoding="utf-8") as f:
+                return cls(f.read().splitlines())
+        except FileNotFoundError:
+            return cls()
+
+    def ignores(self, relative: str, name: str, is_dir: bool) -> bool:
+        """Whether the entry at relative (a POSIX path below the root) with this name is left out."""
+        ignored = False
+        for regex, match_path, dir_only, negate in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative if match_path else name):
+                ignored = not negate
+        return ignored
+
+    def ignores_path(self, relative) -> bool:
+        """Whether a file below the root is left out, by its own name or one of its directories."""
+        parts = Path(relative).parts
+        for i in range(1, len(parts) + 1):
+            if self.ignores("/".join(parts[:i]), parts[i - 1], i < len(parts)):
+                return True
+        return False
+
+
+class DirectoryIndex:
+    """
+    The listing of every directory scanned by the last build with its modification time, so a
+    directory whose mtime did not change is not listed again. Adding, removing or renaming an
+    entry changes the mtime of its directory, so one stat per directory tells whether its
+    listing is still right, instead of reading every entry of the tree:
+
+        {"content": {"ignore": "<sha256 of the .ssgignore>", "dirs": {"blog": [mtime_ns, [[name, is_dir], ...]]}}}
+
+    The listings of a tree are dropped when its .ssgignore changes.
+    """
+
+    def __init__(self, path=INDEX_PATH, trees=None):
+        self.path = Path(path) if path is not None else None
+        self.trees = trees if trees is not None else {}
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        """Load the index of the last build, a missing or unreadable one lists everything again."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable directory index {path}: {e}")
+            return cls(path)
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return cls(path)
+        return cls(path, data.get("trees", {}))
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One temp file per process, so builds saving side by side never move each other's away
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"version": INDEX_VERSION, "trees": self.trees}, separators=(",", ":")))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def listings(self, root, ignore_digest: str) -> dict:
+        """The directory listings of the tree at root, empty when they were made with other ignore rules."""
+        tree = self.trees.get(str(root))
+        if tree is None or tree.get("ignore") != ignore_digest:
+            return {}
+        return tree["dirs"]
+
+    def update(self, root, ignore_digest: str, dirs: dict) -> None:
+        self.trees[str(root)] = {"ignore": ignore_digest, "dirs": dirs}
+
+
+def scan_files(root, index=None, use_ignore=True, suffixes=None) -> list[Path]:
+    """
+    List every file below root with os.scandir, in the order of sorted(paths) so builds always
+    visit files in the same order. The type of every entry comes from the directory listing
+    itself, files are never stat'ed. Symlinks to directories are followed like copytree does,
+    except into a directory that is already one of their own parents, which would never end.
+    Args:
+        root (Path): The tree to list, a missing root has no files.
+        index (DirectoryIndex): Reuse the listings of directories whose mtime did not change
+            since the index was made, and record the new ones.
+        use_ignore (bool): Leave out what root/.ssgignore lists, and the .ssgignore itself.
+        suffixes (tuple[str]): Only list the files ending with one of these, like (".md",).
+    Returns:
+        list[Path]: The files, below root like root / "blog" / "tom.md".
+    """
+    root = Path(root)
+    rules = IgnoreRules.load(root) if use_ignore else IgnoreRules()
+    known = index.listings(root, rules.digest) if index is not None else {}
+    # Only listings older than this are trusted next time, see RACY_NS
+    trusted_before = time.time_ns() - RACY_NS
+    listings = {}
+    listed = 0
+
+    def entries_of(relative: str, directory: Path) -> tuple:
+        # The entries of a directory and its (device, inode), None when it is one of its parents
+        nonlocal listed
+        try:
+            stat = os.stat(directory)
+            identity = (stat.st_dev, stat.st_ino)
+            if identity in parents:
+                logger.warning(f"Not following {directory}, it links back to one of its parents")
+                return [], None
+            mtime = stat.st_mtime_ns
+            cached = known.get(relative)
+            if cached is not None and cached[0] == mtime:
+                entries = cached[1]
+            else:
+                entries = _list_directory(directory, relative, rules, use_ignore)
+                listed += 1
+        except (FileNotFoundError, NotADirectoryError):
+            # A missing root, or a directory removed while it was being listed
+            return [], None
+        if index is not None and mtime < trusted_before:
+            listings[relative] = [mtime, entries]
+        return entries, identity
+
+    files = []
+    # The directories being walked, a symlink back to one of them is not followed
+    parents = set()
+
+    def enter(relative: str, directory: Path) -> None:
+        entries, identity = entries_of(relative, directory)
+        if identity is not None:
+            parents.add(identity)
+        stack.append((relative, directory, iter(entries), identity))
+
+    # Depth first over the entries of every directory sorted by name, which is the order of
+    # sorted(paths) without comparing Paths: a file and a directory next to it compare by name
+    stack = []
+    enter("", root)
+    while stack:
+        relative, directory, entries, identity = stack[-1]
+        for name, is_dir in entries:
+            if is_dir:
+                enter(f"{relative}/{name}" if relative else name, directory / name)
+                break
+            if suffixes is None or name.endswith(suffixes):
+                files.append(directory / name)
+        else:
+            stack.pop()
+            parents.discard(identity)
+    if index is not None:
+        index.update(root, rules.digest, listings)
+        logger.debug(f"Scanned {root}: listed {listed} directories, reused {len(listings) - listed}")
+    return files
+
+
+def _list_directory(directory: Path, relative: str, rules: IgnoreRules, use_ignore: bool) -> list:
+    # (name, is a directory) of the entries that are not ignored, sorted by name
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+            if entry.is_dir():
+                if not rules.ignores(entry_relative, entry.name, True):
+                    entries.append((entry.name, True))
+            elif entry.is_file():
+                if use_ignore and not relative and entry.name == IGNORE_FILE:
+                    continue
+                if not rules.ignores(entry_relative, entry.name, False):
+                    entries.append((entry.name, False))
+    entries.sort()
+    return entries
@@ -1,14 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import contextlib
+import hashlib
+import io
+import itertools
 import logging
+import os
 
 # application imports
 from log_config import setup_logging
-from splitblocks import markdown_to_html_node
+from discover import scan_files
+from metadata import FrontMatterError, SiteMetadata, read_header
+from splitblocks import MarkdownStream, read_markdown_lines
+from manifest import hash_file
+from output import DirectorySink, OutputWriter, SPOOL_LIMIT
+import tracing
+from template import load_template, select_layout
 
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Pages handed to a worker process in one go, keeps pickling overhead per page small
+RENDER_BATCH_SIZE = 32
+
+
+class PageGenerationError(Exception):
+    """
+    Raised after a build when one or more pages failed to render.
+    Carries every failure as a (source path, error message) pair so a single
+    broken page does not hide the others.
+    """
+
+    def __init__(self, failures, generated=None):
+        self.failures = failures
+        # Pages that did build alongside the failures
+        self.generated = generated if generated is not None else []
+        lines = "\n".join(f"  {source}: {error}" for source, error in failures)
+        super().__init__(f"Failed to generate {len(failures)} page(s):\n{lines}")
+
+
+class BuildCancelled(Exception):
+    """Raised when a build is cancelled part way, e.g. because a newer change came in while watching."""
+
 
 def extract_title(markdown: str) -> str:
     """
@@ -28,10 +62,8 @@ def extract_title(markdown: str) -> str:
     """
     if len(markdown) == 0:
         raise ValueError("Markdown is empty. Expecting a title '# Title'")
-    # Split the markdown string into lines
-    lines = markdown.splitlines()
-    # Get the first line and strip any leading/trailing whitespace
-    title = lines[0].strip()
+    # Only the first line matters, the rest of the document is not split
+    title = markdown.partition("\n")[0].strip()
     # Check if the first line starts with a '#' character
     if not title.startswith("#"):
         raise ValueError("Title symbol not found in markdown string.")
@@ -44,53 +76,410 @@ def extract_title(markdown: str) -> str:
     return title
 
 
-def generate_pages_recursively(from_path, template_path, dest_root_path, basepath):
-    logger.info(f"Generating from {from_path} to {dest_root_path} using {template_path}")
+def find_markdown_pages(content_dir, dest_root_path, index=None) -> list[tuple[Path, Path]]:
+    """
+    Walk the content directory and pair every markdown file with its HTML output path.
+    Files left out by content/.ssgignore are not pages, see scan_files.
+    Args:
+        content_dir (Path): The root of the markdown content tree.
+        dest_root_path (Path): The root of the generated site.
+        index (DirectoryIndex): Skip listing the directories that did not change, see scan_files.
+    Returns:
+        list[tuple[Path, Path]]: (markdown source, html destination) pairs sorted by source path.
+    """
+    content_dir = Path(content_dir)
+    dest_root_path = Path(dest_root_path)
+    pages = []
+    # Already sorted by source path
+    for from_path in scan_files(content_dir, index, suffixes=(".md",)):
+        relative_path = from_path.relative_to(content_dir).with_suffix(".html")
+        pages.append((from_path, dest_root_path / relative_path))
+    return pages
+
+
+def generate_pages_incrementally(
+    content_dir,
+    template_path,
+    dest_root_path,
+    basepath,
+    manifest,
+    full=False,
+    jobs=1,
+    cancel=None,
+    cache=None,
+    sink=None,
+    shard=None,
+    index=None,
+    metadata=None,
+    drafts=False,
+):
+    """
+    Generate only the pages whose inputs changed since the last build.
+    A page is rebuilt when its markdown, its layout (or a partial it includes) or the basepath
+    changed, or when its output is missing. Outputs whose markdown source was deleted (or that
+    became a draft) are removed.
+    Args:
+        content_dir (Path): The root of the markdown content tree.
+        template_path (Path): The default HTML template, see select_layout for per-page layouts.
+        dest_root_path (Path): The root of the generated site.
+        basepath (str): The base path for the webpage.
+        manifest (BuildManifest): The manifest of the previous build, updated in place.
+        full (bool): Rebuild every page regardless of the manifest.
+        jobs (int): Number of worker processes used to render, see render_pages.
+        cancel (threading.Event): Stop rendering as soon as possible once set.
+        cache (ParseCache): Reuse the parsed markdown of unchanged sources, see generate_page.
+        sink (OutputSink): Where the pages go, by default the directory dest_root_path.
+        shard (Shard): Only build the pages of this shard, see Shard.owns.
+        index (DirectoryIndex): Skip listing the content directories that did not change, see scan_files.
+        metadata (SiteMetadata): The front matter of the pages, read again only for changed pages.
+        drafts (bool): Also build the pages marked draft: true, by default their outputs are removed.
+    Returns:
+        list[Path]: The pages that were (re)generated.
+    Raises:
+        PageGenerationError: If any page failed. The manifest still records the pages that succeeded.
+        BuildCancelled: If cancel was set before all pages were rendered.
+    """
+    content_dir = Path(content_dir)
+    if sink is None:
+        sink = DirectorySink(dest_root_path)
+    with tracing.span("discover"):
+        pages = find_markdown_pages(content_dir, dest_root_path, index)
+        if shard is not None:
+            # The other pages are built by the other shards
+            pages = [page for page in pages if shard.owns(page[0].relative_to(content_dir))]
+
+    if metadata is None:
+        metadata = SiteMetadata(None)
+
+    stale, live, failures = [], [], []
+    drafts_skipped = 0
+    with tracing.span("plan", pages=len(pages)):
+        for from_path, dest_path in pages:
+            try:
+                page_metadata = metadata.get(from_path)
+                if page_metadata["draft"] and not drafts:
+                    # Its output, if any, is removed with the stale pages below
+                    drafts_skipped += 1
+                    continue
+                live.append(dest_path)
+                page = plan_page(from_path, dest_path, content_dir, template_path, basepath, page_metadata["layout"])
+            except (FrontMatterError, FileNotFoundError) as e:
+                # Leaves the last good output in place until the page is fixed
+                if not live or live[-1] != dest_path:
+                    live.append(dest_path)
+                failures.append((from_path, f"{type(e).__name__}: {e}"))
+                continue
+            if full or not manifest.is_current(dest_path, page[3], sink):
+                stale.append(page)
+        # Forget deleted pages, the other shards keep their own index (see main)
+        metadata.retain(from_path for from_path, _ in pages)
+
+    try:
+        generated = build_pages(stale, template_path, basepath, manifest, jobs, cancel, cache, sink)
+    except PageGenerationError as e:
+        generated = e.generated
+        failures.extend(e.failures)
+
+    removed = manifest.remove_stale(live, sink)
+    skipped = len(live) - len(stale)
+    logger.info(
+        f"Generated {len(generated)} pages, skipped {skipped} unchanged and {drafts_skipped} drafts, "
+        f"removed {len(removed)} stale"
+    )
+    if failures:
+        raise PageGenerationError(failures, generated)
+    return generated
+
+
+def plan_page(from_path, dest_path, content_dir, template_path, basepath, layout=None) -> tuple[Path, Path, Path, dict]:
+    """
+    Work out how a page would be built: its layout and the manifest entry describing its inputs.
+    layout is the name of the layout the page asks for in its front matter, see select_layout.
+    Returns:
+        tuple: (markdown source, html destination, layout, manifest entry)
+    Raises:
+        FileNotFoundError: If the page or the layout it asks for does not exist.
+    """
+    layout_path = select_layout(Path(from_path).relative_to(content_dir), template_path, name=layout)
+    entry = {
+        "source": str(from_path),
+        "source_hash": hash_file(from_path),
+        # Covers the layout and every partial it includes
+        "template_hash": load_template(layout_path).digest,
+        "basepath": basepath,
+    }
+    return from_path, dest_path, layout_path, entry
+
+
+def build_pages(planned, template_path, basepath, manifest, jobs=1, cancel=None, cache=None, sink=None) -> list[Path]:
+    """
+    Render planned pages (see plan_page) and record the ones that succeeded in the manifest.
+    Failed pages are dropped from the manifest so they are retried on the next build.
+    Returns:
+        list[Path]: The pages that were generated.
+    Raises:
+        PageGenerationError: If any page failed, after recording the successful ones.
+        BuildCancelled: If cancel was set, nothing is recorded as the pages are still stale.
+    """
+    failures = []
+    try:
+        with tracing.span("render", pages=len(planned), jobs=jobs):
+            # The hash of the markdown keys the parse cache, so no page is hashed twice
+            pages = [
+                (from_path, dest_path, layout, entry["source_hash"]) for from_path, dest_path, layout, entry in planned
+            ]
+            render_pages(pages, template_path, basepath, jobs, cancel, cache, sink)
+    except PageGenerationError as e:
+        failures = e.failures
+
+    failed_sources = {str(source) for source, _ in failures}
+    generated = []
+    for from_path, dest_path, _, entry in planned:
+        if str(from_path) in failed_sources:
+            manifest.pages.pop(str(dest_path), None)
+            continue
+        manifest.record(dest_path, entry)
+        generated.append(dest_path)
+    if failures:
+        raise PageGenerationError(failures, generated)
+    return generated
+
+
+def render_pages(pages, template_path, basepath, jobs=1, cancel=None, cache=None, sink=None) -> None:
+    """
+    Render a list of pages, either one after the other or on a pool of worker processes.
+    Every page is rendered by the same generate_page call in both modes, so the output is
+    identical no matter how many jobs are used.
+    Args:
+        pages (list[tuple]): (markdown source, html destination) pairs, optionally with a third
+            item giving the layout for that page and a fourth with the hash of its markdown.
+        template_path (Path): The HTML template for pages without their own layout.
+        basepath (str): The base path for the webpage.
+        jobs (int): Number of worker processes, 0 means one per CPU, 1 renders in this process.
+        cancel (threading.Event): Checked between pages (between batches with a pool), once set
+            the remaining pages are skipped.
+        cache (ParseCache): Parse cache shared by every worker, see generate_page.
+        sink (OutputSink): Where the pages are written, by default to disk. Pages going to a
+            sink that is not shared across processes (in memory) are rendered in this process.
+    Raises:
+        PageGenerationError: If any page failed, listing every failed source path.
+        BuildCancelled: If cancel was set before all pages were rendered.
+    """
+    if sink is None:
+        sink = DirectorySink()
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if not sink.shared_across_processes:
+        jobs = 1
+    sink.make_dirs(dest_path.parent for _, dest_path, *_ in pages)
 
-    if from_path.is_file() and from_path.suffix == ".md":
-        # Get relative path and change suffix
-        relative_path = from_path.relative_to(Path("content")).with_suffix(".html")
-        dest_path = dest_root_path / relative_path
+    if jobs == 1 or len(pages) <= 1:
+        results = _render_batch(pages, template_path, basepath, cancel, cache, sink)
+    else:
+        batches = [pages[i : i + RENDER_BATCH_SIZE] for i in range(0, len(pages), RENDER_BATCH_SIZE)]
+        logger.info(f"Rendering {len(pages)} pages in {len(batches)} batches on {jobs} processes")
+        tracer = tracing.current_tracer()
+        # Traced workers spool their events for the tracer of this process to collect
+        spool_dir = tracer.worker_spool() if tracer is not None else None
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker, initargs=(logging.getLogger().level, spool_dir)
+        ) as executor:
+            futures = [
+                executor.submit(_render_batch, batch, template_path, basepath, None, cache, sink) for batch in batches
+            ]
+            # Collect in submission order so errors are always reported in the same order
+            results = []
+            for future in futures:
+                if cancel is not None and cancel.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    raise BuildCancelled("Rendering cancelled")
+                results.extend(future.result())
 
-        logger.info(f"Generating file {dest_path} from markdown {from_path}")
-        dest_path.parent.mkdir(parents=True, exist_ok=True)
+    failures = [(source, error) for source, error in results if error is not None]
+    if failures:
+        raise PageGenerationError(failures)
 
-        generate_page(from_path, template_path, dest_path, basepath)
 
-    elif from_path.is_dir():
-        for item in from_path.iterdir():
-            generate_pages_recursively(item, template_path, dest_root_path, basepath)
+def _init_worker(log_level, trace_spool_dir=None) -> None:
+    # Worker processes follow the log level of the parent instead of the module default
+    logging.getLogger().setLevel(log_level)
+    if trace_spool_dir is not None:
+        tracing.start_tracing(trace_spool_dir, process_name=f"worker {os.getpid()}")
 
 
-def generate_page(from_file_path, template_path, dest_file_path, basepath):
+def _render_batch(batch, template_path, basepath, cancel=None, cache=None, sink=None) -> list[tuple[Path, str | None]]:
+    """
+    Render a batch of pages, catching errors per page so one bad file does not abort the rest.
+    Returns (source, error message or None) for every page in the batch.
+    """
+    results = []
+    # (index in results, pending write) of the rendered pages
+    writes = []
+    # Pages are written on the writer threads while the next ones render, leaving the block
+    # waits for every write
+    with OutputWriter(sink) as writer:
+        for from_path, dest_path, *extra in batch:
+            if cancel is not None and cancel.is_set():
+                raise BuildCancelled("Rendering cancelled")
+            layout_path = extra[0] if extra else template_path
+            source_hash = extra[1] if len(extra) > 1 else None
+            try:
+                write = generate_page(
+                    from_path, layout_path, dest_path, basepath, cache, writer, source_hash=source_hash
+                )
+            except Exception as e:
+                logger.error(f"Failed to generate page from {from_path}: {e}")
+                results.append((from_path, f"{type(e).__name__}: {e}"))
+            else:
+                results.append((from_path, None))
+                if write is not None:
+                    writes.append((len(results) - 1, write))
+    for index, write in writes:
+        # A page that could not be written failed like one that could not be rendered
+        e = write.exception()
+        if e is not None:
+            from_path = results[index][0]
+            logger.error(f"Failed to write page from {from_path}: {e}")
+            results[index] = (from_path, f"{type(e).__name__}: {e}")
+    # The events of a traced worker go to the main process with every batch
+    tracing.flush()
+    return results
+
+
+class _HashingReader(io.RawIOBase):
+    """
+    A binary file hashing its bytes as they are first read, for the hash of what was parsed.
+    Bytes read again after seeking back (see read_header) are not hashed twice.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._hashed = 0
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+    def readinto(self, buffer):
+        start = self._f.tell()
+        count = self._f.readinto(buffer)
+        # Bytes skipped by seeking forward are never hashed, the digest then matches nothing
+        if start <= self._hashed < start + count:
+            self.digest.update(memoryview(buffer)[self._hashed - start : count])
+            self._hashed = start + count
+        return count
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def iter_page(from_file_path, template_path, basepath, cache=None, clock=None, source_hash=None):
+    """
+    Yield the HTML of a page in chunks, the markdown is read and parsed as they are consumed.
+    Args:
+        from_file_path (str): The source markdown file.
+        template_path (str): The path to the HTML template file.
+        basepath (str): The base path for the webpage.
+        cache (ParseCache): Read the nodes of unchanged markdown from the parse cache, see generate_page.
+        clock (PageClock): Split the time of the page between stages when tracing.
+        source_hash (str): The hash of the markdown when already known (see plan_page), else it
+            is hashed here for the cache.
+    """
+    # Compiled once and reused until the template file changes
+    template = load_template(template_path)
+    # The markdown is streamed a block at a time, so only the front matter and the title line
+    # are read up front
+    if cache is None:
+        f = open(from_file_path, "r", encoding="utf-8")
+    else:
+        # What is recorded in the cache is what was read, even if the page changed since it was hashed
+        raw = _HashingReader(open(from_file_path, "rb", buffering=0))
+        f = io.TextIOWrapper(io.BufferedReader(raw), encoding="utf-8")
+    with f:
+        front_matter, title_line = read_header(f)
+        title = str(front_matter["title"]) if "title" in front_matter else extract_title(title_line)
+        content = MarkdownStream(read_markdown_lines(f))
+        if clock is not None:
+            content = clock.stream(content)
+        if cache is not None:
+            # Unchanged markdown is read back as nodes instead of being parsed again
+            content = cache.document(source_hash or hash_file(from_file_path), content, raw.digest.hexdigest)
+        if clock is not None:
+            content = clock.document(content)
+        # Fill the placeholders of the template, the basepath is applied to the href and src
+        # attributes as they are rendered
+        chunks = template.iter_render({"Title": title, "Content": content}, basepath)
+        if clock is not None:
+            chunks = clock.timed(chunks, "template")
+            clock.switch("write")
+        yield from chunks
+
+
+def render_page(from_file_path, template_path, basepath, cache=None) -> bytes:
+    """The HTML of a page (see iter_page) in memory, for serving it without writing it out."""
+    return "".join(iter_page(from_file_path, template_path, basepath, cache)).encode("utf-8")
+
+
+def generate_page(
+    from_file_path, template_path, dest_file_path, basepath, cache=None, writer=None, sink=None, source_hash=None
+):
     """
     Generate a single HTML page from a markdown file using a template.
     Args:
         from_file_path (str): The source markdown file to generate the HTML page from.
         template_path (str): The path to the HTML template file.
         dest_file_path (str): The destination path to save the generated HTML file.
+        basepath (str): The base path for the webpage.
+        cache (ParseCache): When given, the nodes of the markdown are read from (or on a miss
+            recorded into) the parse cache, so only the template and write stages run again.
+        writer (OutputWriter): When given, the page is written on its threads instead of this one.
+        sink (OutputSink): Where the page is written without a writer, by default to disk.
+        source_hash (str): The hash of the markdown when already known, see iter_page.
     Returns:
-        None
+        Future | None: The pending write when a writer is given and the page was small enough to
+            render into memory (see SPOOL_LIMIT), else None as the page is already written.
+
+    The page is only written if it differs from the existing file, unchanged pages keep their
+    modification time, and it is written atomically, a page that fails part way leaves the
+    previous file in place.
     """
     logger.info(f"Generating page from {from_file_path} to {dest_file_path} using {template_path}")
-    # Read the template file
-    template_path = Path(template_path).resolve()
-    with open(template_path, "r", encoding="utf-8") as template_file:
-        template = template_file.read()
-
-    # Generate the page
-    with open(from_file_path, "r", encoding="utf-8") as f:
-        markdown = f.read()
-    # Convert the markdown to HTML
-    html = markdown_to_html_node(markdown).to_html()
-    # Extract the title
-    title = extract_title(markdown)
-    # Replace the placeholders in the template
-    html = template.replace("{{ Title }}", title).replace("{{ Content }}", html)
-    # Replace any instances of href="/ with href="{basepath}
-    html = html.replace('href="/', f'href="{basepath}')
-    html = html.replace('src="/', f'src="{basepath}')
-    # Write the HTML to the destination file
-    with open(dest_file_path, "w", encoding="utf-8") as f:
-        f.write(html)
-    logger.info(f"Generated page at {dest_file_path}")
\ No newline at end of file
+    # None unless the build is traced (--trace), then it splits the time of the page between stages
+    clock = tracing.page_clock()
+    dest_file_path = Path(dest_file_path)
+    if sink is None:
+        sink = writer.sink if writer is not None else DirectorySink()
+    data = None
+    # Rendered into memory so the write can be handed off and compared with the existing
+    # file, unless the page turns out too big, then the rest streams straight to disk
+    with contextlib.closing(iter_page(from_file_path, template_path, basepath, cache, clock, source_hash)) as chunks:
+        parts, size = [], 0
+        for chunk in chunks:
+            parts.append(chunk)
+            size += len(chunk)
+            if size > SPOOL_LIMIT:
+                sink.stream(dest_file_path, itertools.chain(parts, chunks))
+                break
+        else:
+            data = "".join(parts).encode("utf-8")
+    write = None
+    if data is not None:
+        if writer is not None:
+            write = writer.submit(dest_file_path, data)
+        else:
+            sink.write(dest_file_path, data)
+    if clock is not None:
+        clock.finish(from_file_path, dest=str(dest_file_path))
+    logger.info(f"Generated page at {dest_file_path}")
+    return write
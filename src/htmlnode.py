@@ -1,21 +1,45 @@
 # python imports
+import sys
 
 # application imports
 
+# Attributes holding a URL, site relative ones ("/images/tom.png") get the basepath on render
+URL_ATTRIBUTES = frozenset(("href", "src"))
+
 
 class HTMLNode:
+    # A page has many thousands of nodes, slots keep each one small (no per-instance __dict__)
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
-        self.tag = tag  # "p", "a", "h1", etc
+        # "p", "a", "h1", etc, interned as the same few tag names repeat on every page
+        self.tag = sys.intern(tag) if type(tag) is str else tag
         self.value = value  # text in tag
         self.children = children  # list of HTMLNode objects children of this node
         self.props = props  # dict attributes of HTML tag
         # For example, a link (<a> tag) might have {"href": "https://www.google.com"}
 
-    def to_html(self):
+    def to_html(self, basepath=None):
         # for now just raise error instead of pass
         raise NotImplementedError
 
-    def props_to_html(self):
+    def iter_html(self, basepath=None):
+        """
+        Yield the HTML of the node in chunks instead of building one string,
+        "".join(node.iter_html()) == node.to_html()
+        """
+        raise NotImplementedError
+
+    def write_html(self, sink, basepath=None):
+        """
+        Stream the HTML of the node into anything with a write method (open file, StringIO, ...)
+        without holding the whole document in memory.
+        """
+        write = sink.write
+        for chunk in self.iter_html(basepath):
+            write(chunk)
+
+    def props_to_html(self, basepath=None):
         """
         return a string that represents the HTML of attributes of the node
 
@@ -26,51 +50,145 @@ class HTMLNode:
 
         returns (leading space before key):
          href="https://www.google.com" target="_blank"
+
+        With a basepath other than "/", site relative href and src values are moved under it:
+        "/blog/tom" becomes "/static_site_generator/blog/tom" for basepath "/static_site_generator/".
         """
-        if self.props is None:
-            return ""
-        return "".join(f' {key}="{value}"' for key, value in self.props.items())
+        return attributes_to_html(self.props, basepath)
 
     def __repr__(self):
         """print an HTMLNode object and see its tag, value, children, and props.
         This will be useful for your debugging.
+        Built with an explicit stack so deep trees do not hit the recursion limit.
         """
-        return f"HTMLNode(tag={self.tag}, value={self.value}, children={self.children}, props={self.props})"
+        return "".join(_iter_repr(self))
+
+    def _repr_parts(self):
+        # (text before the children, children, text after the children), see _iter_repr
+        return f"HTMLNode(tag={self.tag}, value={self.value}, children=", self.children, f", props={self.props})"
 
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
         super().__init__(tag, value, None, props)
 
-    def to_html(self):
-        if self.value is None:
-            raise ValueError("Invalid HTML: no value")
-        if self.tag is None:
-            return f"{self.value}"
-        # h1-h6, p, b, etc (no link) should not have props
-        # with props (for our current stuff should be like href, a)
-        if self.props:
-            prop_string = super().props_to_html()
-            return f"<{self.tag}{prop_string}>{self.value}</{self.tag}>"
-        return f"<{self.tag}>{self.value}</{self.tag}>"
+    def to_html(self, basepath=None):
+        return leaf_to_html(self.tag, self.value, self.props, basepath)
+
+    def iter_html(self, basepath=None):
+        # A leaf is small, it goes out as one chunk
+        yield self.to_html(basepath)
 
     def __repr__(self):
         return f"LeafNode(tag={self.tag}, value={self.value}, props={self.props})"
 
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         super().__init__(tag, None, children, props)
 
-    def to_html(self):
-        if self.tag is None:
-            raise ValueError("invalid HTML: missing tag")
-        if self.children is None:
-            raise ValueError("No children html elements")
+    def to_html(self, basepath=None):
+        # One join over the chunks of the whole subtree, instead of a string per level
+        return "".join(_iter_html(self, basepath))
 
-        child_html = "".join(child.to_html() for child in self.children)
-        return f"<{self.tag}{self.props_to_html()}>{child_html}</{self.tag}>"
+    def iter_html(self, basepath=None):
+        return _iter_html(self, basepath)
 
-    def __repr__(self):
+    def _repr_parts(self):
         # Optional but helpful for debugging
-        return f"ParentNode(tag={self.tag}, children={self.children}, props={self.props})"
+        return f"ParentNode(tag={self.tag}, children=", self.children, f", props={self.props})"
+
+
+def attributes_to_html(props, basepath=None):
+    """The attributes of a tag as HTML, see HTMLNode.props_to_html."""
+    if props is None:
+        return ""
+    if basepath is None or basepath == "/":
+        return "".join(f' {key}="{value}"' for key, value in props.items())
+    parts = []
+    for key, value in props.items():
+        if key in URL_ATTRIBUTES:
+            value = rebase_url(value, basepath)
+        parts.append(f' {key}="{value}"')
+    return "".join(parts)
+
+
+def leaf_to_html(tag, value, props, basepath=None):
+    """The HTML of a leaf, see LeafNode.to_html. Also used to render cached leaves without a node."""
+    if value is None:
+        raise ValueError("Invalid HTML: no value")
+    if tag is None:
+        return f"{value}"
+    # h1-h6, p, b, etc (no link) should not have props
+    # with props (for our current stuff should be like href, a)
+    if props:
+        prop_string = attributes_to_html(props, basepath)
+        return f"<{tag}{prop_string}>{value}</{tag}>"
+    return f"<{tag}>{value}</{tag}>"
+
+
+def rebase_url(url, basepath):
+    """
+    Move a site relative URL under basepath, anything else (relative, absolute with a scheme
+    or protocol relative "//host/...") is returned as is.
+    """
+    if url.startswith("/") and not url.startswith("//"):
+        return basepath + url[1:]
+    return url
+
+
+def _iter_html(root, basepath=None):
+    """
+    Yield the HTML of a tree in document order with an explicit stack instead of recursion,
+    so the depth of the tree is not limited by the Python recursion limit and every node is
+    visited exactly once. The stack holds nodes still to open and closing tags still to emit.
+    """
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+        elif isinstance(item, ParentNode):
+            if item.tag is None:
+                raise ValueError("invalid HTML: missing tag")
+            if item.children is None:
+                raise ValueError("No children html elements")
+            yield f"<{item.tag}{item.props_to_html(basepath)}>"
+            stack.append(f"</{item.tag}>")
+            stack.extend(reversed(item.children))
+        else:
+            # Leaves (and any other node type) render themselves without recursing
+            yield item.to_html(basepath)
+
+
+def _iter_repr(root):
+    """
+    Yield the repr of a tree piece by piece, the same text the nested f-strings would give.
+    Stack entries are (True, text) for text to emit or (False, object) for an object to expand.
+    """
+    stack = [(False, root)]
+    while stack:
+        is_text, item = stack.pop()
+        if is_text:
+            yield item
+            continue
+        if not isinstance(item, HTMLNode) or type(item).__repr__ is not HTMLNode.__repr__:
+            # Leaves and foreign objects have a flat repr of their own
+            yield repr(item)
+            continue
+        before, children, after = item._repr_parts()
+        yield before
+        stack.append((True, after))
+        if isinstance(children, list):
+            stack.append((True, "]"))
+            for index in range(len(children) - 1, -1, -1):
+                stack.append((False, children[index]))
+                if index:
+                    stack.append((True, ", "))
+            stack.append((True, "["))
+        else:
+            stack.append((True, repr(children)))
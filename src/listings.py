@@ -0,0 +1,263 @@
+# python imports
+import hashlib
+import html
+import logging
+import os
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+# application imports
+from log_config import setup_logging
+from htmlnode import LeafNode, ParentNode
+from template import load_template
+import tracing
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Posts are the pages below this directory of content/, listed at /blog/
+LISTING_SECTION = "blog"
+# Where the pages listing the posts of each tag go, /tags/<tag>/
+TAGS_DIR = "tags"
+# Posts per listing page
+LISTING_PAGE_SIZE = 10
+# Listings use layouts/list.html when there is one, else the default template
+LISTING_LAYOUT = "list"
+# Bump when the HTML of a listing changes, so every listing page is written again
+LISTING_VERSION = 1
+# Runs of anything but letters, digits and _ in any script, replaced by - in tag URLs
+SLUG_REGEX = re.compile(r"\W+")
+
+
+def collect_posts(metadata, content_dir, section=LISTING_SECTION, drafts=False) -> list[tuple]:
+    """
+    The posts of a section from the metadata index, without reading any page. The index holds
+    every page of the last build (see generate_pages_incrementally), changed pages included.
+    Args:
+        metadata (SiteMetadata): The metadata of the pages.
+        content_dir (Path): The root of the markdown content tree.
+        section (str): The directory of content_dir holding the posts, its own index.md is not one.
+        drafts (bool): List the drafts too.
+    Returns:
+        list[tuple]: (date, source, url, title, tags) of every post, oldest first. Posts without a
+            date sort before the dated ones, posts of the same date by source path.
+    """
+    # String operations only, a Path per post costs more than everything else here
+    root = len(str(Path(content_dir)))
+    prefix = os.path.join(str(Path(content_dir) / section), "")
+    section_index = prefix + "index.md"
+    posts = []
+    for source, entry in metadata.pages.items():
+        if not source.startswith(prefix) or source == section_index:
+            continue
+        page = entry[2]
+        if page["draft"] and not drafts:
+            continue
+        url = os.path.splitext(source[root:])[0].replace(os.sep, "/")
+        url = url[: -len("index")] if url.endswith("/index") else url + ".html"
+        posts.append((page["date"] or "", source, quote(url), page["title"] or url, page["tags"]))
+    posts.sort()
+    return posts
+
+
+def tag_key(tag: str) -> str:
+    """What tells tags apart: 'Tom Bombadil' and 'tom  bombadil' are the same tag."""
+    return " ".join(tag.casefold().split())
+
+
+def tag_slug(tag: str) -> str:
+    """The URL of a tag below /tags/, 'Tom Bombadil' is tom-bombadil and 'café' stays café."""
+    return SLUG_REGEX.sub("-", tag_key(tag)).strip("-") or _key_hash(tag_key(tag))
+
+
+def tag_slugs(keys) -> dict:
+    """
+    The slug of every tag key, unique: when different tags share a slug ('c++' and 'c', 'tom
+    bombadil' and 'tom-bombadil') the tags whose key is not the slug itself get a hash suffix,
+    instead of listing their posts on one page.
+    """
+    by_slug = {}
+    for key in keys:
+        by_slug.setdefault(tag_slug(key), []).append(key)
+    slugs = {}
+    for slug, shared in by_slug.items():
+        for key in shared:
+            slugs[key] = slug if len(shared) == 1 or key == slug else f"{slug}-{_key_hash(key)}"
+    return slugs
+
+
+def _key_hash(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+
+
+def plan_listings(posts, output_dir, page_size=LISTING_PAGE_SIZE, section=LISTING_SECTION) -> list[tuple]:
+    """
+    Lay out the listing pages of the posts: the section index (/blog/) and the pages of every
+    tag (/tags/<tag>/) show the newest posts, archive pages (/blog/page/2/) hold the rest, and
+    /tags/ lists the tags.
+
+    Archive pages are numbered from the oldest post, page/1/ holds the oldest page_size posts,
+    so a new post only changes the index and the newest archive page instead of moving every
+    post of every archive page along by one.
+    Args:
+        posts (list[tuple]): The posts oldest first, see collect_posts.
+        output_dir (Path): The root of the generated site.
+        page_size (int): Posts per page.
+        section (str): Where the section index goes, see LISTING_SECTION.
+    Returns:
+        list[tuple]: (destination, title, posts newest first, older url, newer url) of every
+            listing page, the tags page has (name, url, count) in place of the posts.
+    """
+    output_dir = Path(output_dir)
+    listings = _paginate(posts, output_dir, section, "Blog", page_size)
+    tags = {}
+    for post in posts:
+        for tag in post[4]:
+            # Tags that only differ in case or spacing are the same tag, listing the post once
+            tagged = tags.setdefault(tag_key(tag), (tag, []))[1]
+            if not tagged or tagged[-1] is not post:
+                tagged.append(post)
+    slugs = tag_slugs(tags)
+    tags = sorted((slugs[key], name, tagged) for key, (name, tagged) in tags.items())
+    for slug, name, tagged in tags:
+        listings.extend(_paginate(tagged, output_dir, f"{TAGS_DIR}/{slug}", f"Posts tagged {name}", page_size))
+    if tags:
+        tag_links = [(name, quote(f"/{TAGS_DIR}/{slug}/"), len(tagged)) for slug, name, tagged in tags]
+        listings.append((output_dir / TAGS_DIR / "index.html", "Tags", tag_links, None, None))
+    return listings
+
+
+def _paginate(posts, output_dir, directory, title, page_size) -> list[tuple]:
+    newest = posts[::-1]
+    if len(posts) <= page_size:
+        return [(output_dir / directory / "index.html", title, newest, None, None)]
+    page_count = (len(posts) + page_size - 1) // page_size
+
+    def page_url(number):
+        return quote(f"/{directory}/page/{number}/")
+
+    # The newest archive page with a post older than those on the index
+    older = (len(posts) - page_size - 1) // page_size + 1
+    listings = [(output_dir / directory / "index.html", title, newest[:page_size], page_url(older), None)]
+    for number in range(1, page_count + 1):
+        page_posts = posts[(number - 1) * page_size : number * page_size][::-1]
+        listings.append(
+            (
+                Path(f"{output_dir}/{directory}/page/{number}/index.html"),
+                f"{title}, page {number}",
+                page_posts,
+                page_url(number - 1) if number > 1 else None,
+                page_url(number + 1) if number < page_count else quote(f"/{directory}/"),
+            )
+        )
+    return listings
+
+
+def listing_digest(listing) -> str:
+    """Hash of everything a listing page shows, it is only written again when this changes."""
+    # The repr of plain strings, lists and tuples is stable and much cheaper than JSON
+    data = repr((LISTING_VERSION,) + tuple(listing[1:]))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def listing_node(listing) -> ParentNode:
+    """The HTML of a listing page as nodes, so its links get the basepath like any page."""
+    _, title, items, older, newer = listing
+    entries = []
+    for item in items:
+        if len(item) == 3:
+            name, url, count = item
+            entries.append(
+                ParentNode(
+                    "li", [LeafNode("a", html.escape(name, quote=False), {"href": url}), LeafNode(None, f" ({count})")]
+                )
+            )
+            continue
+        date, _, url, post_title, _ = item
+        children = [LeafNode("a", html.escape(post_title, quote=False), {"href": url})]
+        if date:
+            children += [LeafNode(None, " "), LeafNode("time", date[:10], {"datetime": date})]
+        entries.append(ParentNode("li", children))
+    children = [LeafNode("h1", html.escape(title, quote=False))]
+    if entries:
+        children.append(ParentNode("ul", entries))
+    links = []
+    if newer:
+        links.append(LeafNode("a", "Newer posts", {"href": newer, "rel": "prev"}))
+    if older:
+        links.append(LeafNode("a", "Older posts", {"href": older, "rel": "next"}))
+    if links:
+        children.append(ParentNode("nav", links))
+    return ParentNode("div", children)
+
+
+def render_listing(listing, template, basepath) -> str:
+    """The HTML of a listing page in its template, the same for a build and the dev server."""
+    return template.render({"Title": html.escape(listing[1], quote=False), "Content": listing_node(listing)}, basepath)
+
+
+def listing_layout(template_path) -> Path:
+    template_path = Path(template_path)
+    layout_path = template_path.parent / "layouts" / f"{LISTING_LAYOUT}.html"
+    return layout_path if layout_path.is_file() else template_path
+
+
+def generate_listings(
+    content_dir,
+    template_path,
+    output_dir,
+    basepath,
+    manifest,
+    metadata,
+    sink,
+    page_size=LISTING_PAGE_SIZE,
+    drafts=False,
+    full=False,
+) -> list[Path]:
+    """
+    Generate the listing pages (see plan_listings) from the metadata of the posts, without
+    rendering any post. Only the listing pages whose posts, links or layout changed since the
+    last build are written, and listing pages that are gone (a tag no longer used) are removed.
+    A page of content/ with the same output, like content/blog/index.md, takes precedence.
+    Args:
+        content_dir (Path): The root of the markdown content tree.
+        template_path (Path): The default template, see listing_layout.
+        output_dir (Path): The root of the generated site.
+        basepath (str): The base path for the webpage.
+        manifest (BuildManifest): Records what each listing page showed, updated in place.
+        metadata (SiteMetadata): The metadata of every page, see collect_posts.
+        sink (OutputSink): Where the listing pages go.
+        page_size (int): Posts per listing page.
+        drafts (bool): List the drafts too.
+        full (bool): Write every listing page regardless of the manifest.
+    Returns:
+        list[Path]: The listing pages that were written.
+    """
+    with tracing.span("listings"):
+        layout_path = listing_layout(template_path)
+        template = load_template(layout_path)
+        posts = collect_posts(metadata, content_dir, drafts=drafts)
+        listings = []
+        for listing in plan_listings(posts, output_dir, page_size):
+            if str(listing[0]) in manifest.pages:
+                # The page now owns the output, removing the stale listing would remove the page
+                manifest.listings.pop(str(listing[0]), None)
+            else:
+                listings.append(listing)
+        written = []
+        for listing in listings:
+            dest_path = listing[0]
+            entry = {"listing_hash": listing_digest(listing), "template_hash": template.digest, "basepath": basepath}
+            if not full and manifest.listings.get(str(dest_path)) == entry and sink.exists(dest_path):
+                continue
+            sink.make_dirs([dest_path.parent])
+            sink.write(dest_path, render_listing(listing, template, basepath).encode("utf-8"))
+            manifest.listings[str(dest_path)] = entry
+            written.append(dest_path)
+        removed = manifest.remove_stale_listings((listing[0] for listing in listings), sink)
+    logger.info(
+        f"Listed {len(posts)} posts on {len(listings)} pages: wrote {len(written)}, removed {len(removed)} stale"
+    )
+    return written
@@ -1,47 +1,35 @@
 #! /usr/bin/python3
-from textnode import TextNode, TextType
 import os
 import shutil
 from pathlib import Path
 import logging
 import argparse
+import asyncio
+import json
+import sys
 
 # application imports
 from log_config import setup_logging
-from extractor import generate_pages_recursively
+from extractor import PageGenerationError
+from manifest import BuildManifest, MANIFEST_PATH
+from metadata import SiteMetadata, METADATA_PATH
+from assets import COPY_STRATEGIES, COPY_WORKERS
+from build import SiteBuild, check_basepath
+from client import DAEMON_SOCKET, main as client_main
+from discover import DirectoryIndex, INDEX_PATH
+from daemon import run_daemon
+from parsecache import ParseCache, CACHE_DIR, CACHE_MAX_BYTES
+from output import DirectorySink
+from serve import serve, SERVE_HOST, SERVE_PORT, SERVE_CACHE_BYTES
+from shard import Shard, ShardMergeError, SHARDS_DIR, merge_shards, write_shard_manifest
+from watch import watch
+import tracing
 
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
 
-def copy_recursively(static_dir: str, public_dir: str) -> None:
-    """
-    Write a recursive function that copies all the contents from a source directory to a destination directory
-    and creates the destination directory if it does not exist.
-
-    Args:
-        static_dir (str): The source directory to copy from.
-        public_dir (str): The destination directory to copy to.
-    Returns:
-        None
-    """
-    src_path = Path(static_dir).resolve()
-    logger.info(f"Source Path: {src_path}")
-    dest_path = Path(public_dir).resolve()
-    logger.info(f"Destination Path: {dest_path}")
-
-    if src_path.is_file():
-        dest_path.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy(src_path, dest_path)
-        logger.info(f"Copied file {src_path} to {dest_path}")
-
-    elif src_path.is_dir():
-        # Recursively copy each item in the source directory
-        for item in src_path.iterdir():
-            copy_recursively(item, dest_path / item.name)
-
-
 def clean_up_public_dir(public_dir: str) -> None:
     """
     Write a function that cleans up the public directory by removing all files and directories in it.
@@ -64,41 +52,334 @@ def clean_up_public_dir(public_dir: str) -> None:
                 logger.info(f"Removed file {item}")
 
 
-def print_usage():
+def cache_command(argv) -> None:
     """
-    Print the usage instructions for the script.
-    Returns:
-        None
+    python3 main.py cache stats|clear, inspect or empty the parse cache.
+    """
+    parser = argparse.ArgumentParser(prog="main.py cache", description="Inspect or clear the parse cache.")
+    parser.add_argument("action", choices=["stats", "clear"])
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR, help=f"Default is {CACHE_DIR}")
+    args = parser.parse_args(argv)
+
+    cache = ParseCache(args.cache_dir)
+    if args.action == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    else:
+        print(f"Removed {cache.clear()} parse cache entries from {args.cache_dir}")
+
+
+def serve_command(argv) -> None:
+    """
+    python3 main.py serve, a development server rendering pages from content/ on request.
+    """
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Serve the site, rendering pages on request.")
+    parser.add_argument(
+        "basepath",
+        type=basepath_argument,
+        nargs="?",
+        default="/",
+        help="The base path for the webpage. Default is '/'",
+    )
+    parser.add_argument("--host", default=SERVE_HOST, help=f"Default is {SERVE_HOST}")
+    parser.add_argument("--port", type=int, default=SERVE_PORT, help=f"Default is {SERVE_PORT}")
+    parser.add_argument(
+        "--memory",
+        type=int,
+        default=SERVE_CACHE_BYTES >> 20,
+        metavar="MB",
+        help=f"Rendered pages kept in memory, in MB. Default is {SERVE_CACHE_BYTES >> 20}",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the parse cache")
+    parser.add_argument(
+        "--listings",
+        action="store_true",
+        help="Serve the blog index, tag and archive pages listing the posts of content/blog/",
+    )
+    args = parser.parse_args(argv)
+
+    builder = SiteBuild(
+        content_dir=Path("content"),
+        static_dir=Path("static"),
+        template_path=Path("template.html"),
+        output_dir=Path("docs"),
+        basepath=args.basepath,
+        manifest=BuildManifest(MANIFEST_PATH),
+        parse_cache=None if args.no_cache else ParseCache(CACHE_DIR),
+        # The index of the last build, only the posts changed since are read for the listings
+        metadata=SiteMetadata.load(METADATA_PATH),
+        listings=args.listings,
+    )
+    try:
+        asyncio.run(serve(builder, args.host, args.port, args.memory << 20))
+    except KeyboardInterrupt:
+        logger.info("Stopped serving")
+
+
+def daemon_command(argv) -> None:
+    """
+    python3 main.py daemon, keep the build loaded and build on request from client.py.
+    """
+    parser = argparse.ArgumentParser(prog="main.py daemon", description="Build on request over a Unix socket.")
+    parser.add_argument(
+        "basepath",
+        type=basepath_argument,
+        nargs="?",
+        default="/",
+        help="The base path for the webpage. Default is '/'",
+    )
+    parser.add_argument("--socket", type=Path, default=DAEMON_SOCKET, help=f"Default is {DAEMON_SOCKET}")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N", help="Processes used by full builds")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the parse cache")
+    parser.add_argument("--drafts", action="store_true", help="Also build the pages marked draft: true")
+    parser.add_argument("--listings", action="store_true", help="Generate the blog index, tag and archive pages")
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive number")
+
+    builder = SiteBuild(
+        content_dir=Path("content"),
+        static_dir=Path("static"),
+        template_path=Path("template.html"),
+        output_dir=Path("docs"),
+        basepath=args.basepath,
+        manifest=BuildManifest.load(MANIFEST_PATH),
+        jobs=args.jobs,
+        parse_cache=None if args.no_cache else ParseCache(CACHE_DIR),
+        file_index=DirectoryIndex.load(INDEX_PATH),
+        metadata=SiteMetadata.load(METADATA_PATH),
+        drafts=args.drafts,
+        listings=args.listings,
+    )
+    try:
+        asyncio.run(run_daemon(builder, args.socket))
+    except KeyboardInterrupt:
+        logger.info("Stopped the build daemon")
+    except RuntimeError as e:
+        logger.error(str(e))
+        raise SystemExit(1)
+
+
+def merge_command(argv) -> None:
+    """
+    python3 main.py merge [SHARD_DIR ...], combine the outputs of --shard builds into docs/.
+    """
+    parser = argparse.ArgumentParser(prog="main.py merge", description="Merge the outputs of sharded builds.")
+    parser.add_argument(
+        "shard_dirs",
+        nargs="*",
+        type=Path,
+        metavar="SHARD_DIR",
+        help=f"Shard directories written by --shard. Default is every shard in {SHARDS_DIR}/",
+    )
+    parser.add_argument("--output", type=Path, default=Path("docs"), help="Default is docs")
+    args = parser.parse_args(argv)
+
+    shard_dirs = args.shard_dirs or sorted(path for path in SHARDS_DIR.glob("*-of-*") if path.is_dir())
+    manifest = BuildManifest.load(MANIFEST_PATH)
+    try:
+        merged = merge_shards(shard_dirs, DirectorySink(args.output), manifest)
+    except ShardMergeError as e:
+        logger.error(str(e))
+        raise SystemExit(1)
+    manifest.save()
+    print(f"Merged {len(merged)} files from {len(shard_dirs)} shards into {args.output}")
+
+
+def basepath_argument(value: str) -> str:
+    """
+    argparse type of the basepath. It must start with /, so it is never taken for one of the
+    commands (cache, serve, merge, daemon, client), which are picked by the first argument.
     """
-    print("Usage: python3 main.py <basepath>")
-    print("basepath: The base path for the webpage. Default is '/'")
-    print("Example: python main.py /my_base_path")
+    try:
+        return check_basepath(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["cache"]:
+        return cache_command(argv[1:])
+    if argv[:1] == ["serve"]:
+        return serve_command(argv[1:])
+    if argv[:1] == ["merge"]:
+        return merge_command(argv[1:])
+    if argv[:1] == ["daemon"]:
+        return daemon_command(argv[1:])
+    if argv[:1] == ["client"]:
+        # python3 src/client.py does the same without importing the build
+        raise SystemExit(client_main(argv[1:]))
 
-def main():
-    
     parser = argparse.ArgumentParser(description="Generate HTML pages from markdown files.")
     parser.add_argument(
         "basepath",
-        type=str,
+        type=basepath_argument,
         nargs="?",
         default="/",
         help="The base path for the webpage. Default is '/'",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the build manifest, wipe the output directory and rebuild every page",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Render pages on N worker processes, 0 uses one per CPU. Default is 1",
+    )
+    parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help="Compare static files by hash when their size matches but their modification time does not",
+    )
+    parser.add_argument(
+        "--copy-strategy",
+        choices=sorted(COPY_STRATEGIES),
+        default="copy",
+        help="How static files are copied, unsupported strategies fall back to copy. Default is copy",
+    )
+    parser.add_argument(
+        "--copy-workers",
+        type=int,
+        default=COPY_WORKERS,
+        metavar="N",
+        help=f"Threads used to copy static files. Default is {COPY_WORKERS}",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every rendered page again instead of reusing the parse cache",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=CACHE_MAX_BYTES >> 20,
+        metavar="MB",
+        help="Size of the parse cache in MB, the least recently used pages are evicted past it. "
+        f"Default is {CACHE_MAX_BYTES >> 20}",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help="Write a .gz (and .zst where Python supports it) next to every compressible output "
+        "that gets smaller, for nginx gzip_static. Variants newer than their file are reused",
+    )
+    parser.add_argument(
+        "--compress-jobs",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Processes used to precompress, 0 uses one per CPU. Default is 0",
+    )
+    parser.add_argument(
+        "--drafts",
+        action="store_true",
+        help="Also build the pages marked draft: true in their front matter, by default they are left out",
+    )
+    parser.add_argument(
+        "--listings",
+        action="store_true",
+        help="Generate the blog index, tag and archive pages listing the posts of content/blog/",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        metavar="FILE",
+        help="Record the build phases and every page with its stages in Chrome Trace Event format "
+        "(chrome://tracing, ui.perfetto.dev) and print the slowest pages. Only the first build is traced",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="i/N",
+        help="Only build the pages and static files of shard i of N (by a hash of their path) into "
+        f"{SHARDS_DIR}/i-of-N, for several machines to build one site. Combine them with merge",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="After building, keep watching content/, static/ and the template and rebuild what changes",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive number")
+    if args.compress_jobs < 0:
+        parser.error("--compress-jobs must be 0 or a positive number")
+    shard = None
+    if args.shard is not None:
+        try:
+            shard = Shard.parse(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.watch:
+            parser.error("--watch builds the whole site, it cannot be used with --shard")
+        if args.listings:
+            parser.error("--listings needs the metadata of every post, it cannot be used with --shard")
 
-    public_dir = Path("docs").resolve()
-    if len(os.listdir(public_dir)) > 0:
-        clean_up_public_dir(public_dir)
-    # Copy the static directory to the public directory
-    static_dir = Path("static").resolve()
-    copy_recursively(static_dir, public_dir)
+    # A shard has its output, manifest and indexes to itself, so shards can be built side by side
+    output_dir = shard.directory() / "docs" if shard is not None else Path("docs")
+    manifest_path = MANIFEST_PATH.with_name(f"manifest-{shard.name}.json") if shard is not None else MANIFEST_PATH
+    metadata_path = METADATA_PATH.with_name(f"metadata-{shard.name}.json") if shard is not None else METADATA_PATH
+    index_path = INDEX_PATH.with_name(f"files-{shard.name}.json") if shard is not None else INDEX_PATH
+    public_dir = output_dir.resolve()
+    public_dir.mkdir(parents=True, exist_ok=True)
+    if args.full:
+        # Start from an empty output directory and forget what was built before
+        if len(os.listdir(public_dir)) > 0:
+            clean_up_public_dir(public_dir)
+        manifest = BuildManifest(manifest_path)
+        # List every directory and read every page's metadata again too
+        file_index = DirectoryIndex(index_path)
+        metadata = SiteMetadata(metadata_path)
+    else:
+        manifest = BuildManifest.load(manifest_path)
+        file_index = DirectoryIndex.load(index_path)
+        metadata = SiteMetadata.load(metadata_path)
 
-    content_dir = Path("content")
-    template_path = Path("template.html")
-    output_dir = Path("docs")
+    builder = SiteBuild(
+        content_dir=Path("content"),
+        static_dir=Path("static"),
+        template_path=Path("template.html"),
+        output_dir=output_dir,
+        basepath=args.basepath,
+        manifest=manifest,
+        jobs=args.jobs,
+        checksum=args.checksum,
+        copy_strategy=args.copy_strategy,
+        copy_workers=args.copy_workers,
+        parse_cache=None if args.no_cache else ParseCache(CACHE_DIR, args.cache_size << 20),
+        precompress=args.precompress,
+        compress_jobs=args.compress_jobs,
+        shard=shard,
+        file_index=file_index,
+        metadata=metadata,
+        drafts=args.drafts,
+        listings=args.listings,
+    )
+    if args.trace:
+        tracing.start_tracing()
+    # Copy new and changed static files, then generate the pages that did not change
+    try:
+        builder.run(full=args.full)
+        if shard is not None:
+            # Only written once the shard built completely, merge treats it as missing otherwise
+            write_shard_manifest(shard, output_dir, manifest, args.basepath)
+    except PageGenerationError as e:
+        logger.error(str(e))
+        if not args.watch:
+            raise SystemExit(1)
+    finally:
+        tracer = tracing.stop_tracing()
+        if tracer is not None:
+            tracer.save(args.trace)
+            print(tracer.summary())
 
-    # Generate pages from markdown files
-    generate_pages_recursively(content_dir, template_path, output_dir, args.basepath)
+    if args.watch:
+        watch(builder)
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# python imports
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of a manifest entry changes so old manifests are ignored
+MANIFEST_VERSION = 2
+MANIFEST_PATH = Path(".ssg") / "manifest.json"
+
+
+def hash_file(path) -> str:
+    """
+    Hash the contents of a file without loading it into memory all at once.
+    Args:
+        path (str | Path): The file to hash.
+    Returns:
+        str: The hex sha256 digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prune_empty_dirs(path: Path, stop_at: Path) -> None:
+    """
+    Remove empty directories from path upwards, never removing stop_at itself.
+    """
+    path = Path(path)
+    stop_at = Path(stop_at)
+    while path != stop_at and stop_at in path.parents:
+        try:
+            path.rmdir()
+        except OSError:
+            # Not empty (or already gone), nothing more to prune
+            return
+        logger.info(f"Removed empty directory {path}")
+        path = path.parent
+
+
+class BuildManifest:
+    """
+    Persistent record of what each output page was built from.
+
+    Every entry is keyed by the output path and stores the source path plus the
+    hashes of the inputs that went into the page:
+
+        {
+            "docs/blog/tom/index.html": {
+                "source": "content/blog/tom/index.md",
+                "source_hash": "...",
+                "template_hash": "...",
+                "basepath": "/",
+            }
+        }
+
+    A page only needs to be rendered again when its entry no longer matches.
+
+    Static assets copied into the output are tracked by output path and source path,
+    so outputs whose asset was deleted can be removed without touching anything else:
+
+        {"docs/images/tom.png": "static/images/tom.png"}
+
+    Generated listing pages (see listings.py) are tracked by output path with a hash of what
+    they show, so a listing is only written again when one of its posts changed:
+
+        {"docs/blog/index.html": {"listing_hash": "...", "template_hash": "...", "basepath": "/"}}
+
+    With --precompress, outputs whose compressed variants were not smaller are recorded with
+    their size, change time and those variants, so they are not read again until they change:
+
+        {"docs/logo.svg": [1843, 1718000000000000000, [".gz"]]}
+
+    Whether an output exists and removing it goes through the OutputSink of the build, and a
+    manifest without a path (BuildManifest(None)) is only kept in memory.
+    """
+
+    def __init__(self, path=MANIFEST_PATH, pages=None, assets=None, listings=None, incompressible=None):
+        self.path = Path(path) if path is not None else None
+        self.pages = pages if pages is not None else {}
+        self.assets = assets if assets is not None else {}
+        self.listings = listings if listings is not None else {}
+        self.incompressible = incompressible if incompressible is not None else {}
+
+    @classmethod
+    def load(cls, path=MANIFEST_PATH):
+        """
+        Load a manifest from disk. A missing, unreadable or outdated manifest
+        gives back an empty one, which simply means everything gets rebuilt.
+        """
+        path = Path(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logger.info(f"No build manifest at {path}, starting fresh")
+            return cls(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable build manifest {path}: {e}")
+            return cls(path)
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            logger.info(f"Build manifest {path} is from another version, starting fresh")
+            return cls(path)
+        return cls(
+            path,
+            data.get("pages", {}),
+            data.get("assets", {}),
+            data.get("listings", {}),
+            data.get("incompressible", {}),
+        )
+
+    def save(self) -> None:
+        """Write the manifest atomically so an interrupted build never leaves half a file."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            data = {
+                "version": MANIFEST_VERSION,
+                "pages": self.pages,
+                "assets": self.assets,
+                "listings": self.listings,
+                "incompressible": self.incompressible,
+            }
+            # json.dumps without indent runs the C encoder (json.dump never does), many times faster on
+            # big sites where the manifest is saved after every rebuild of a single page (watch, daemon)
+            f.write(json.dumps(data, sort_keys=True, separators=(",", ":")))
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved build manifest with {len(self.pages)} pages and {len(self.assets)} assets to {self.path}")
+
+    def is_current(self, dest_path, entry: dict, sink) -> bool:
+        """
+        Check whether dest_path was built from exactly these inputs and still exists in sink.
+        """
+        return self.pages.get(str(dest_path)) == entry and sink.exists(dest_path)
+
+    def record(self, dest_path, entry: dict) -> None:
+        self.pages[str(dest_path)] = entry
+
+    def remove_stale(self, live_dest_paths, sink) -> list[str]:
+        """
+        Delete outputs whose source no longer exists and drop them from the manifest.
+        Args:
+            live_dest_paths (iterable): Output paths that are still produced by the build.
+            sink (OutputSink): The outputs, a DirectorySink also prunes the emptied directories.
+        Returns:
+            list[str]: The removed output paths.
+        """
+        return _remove_outputs(self.pages, live_dest_paths, sink)
+
+    def remove_stale_assets(self, live_dest_paths, sink) -> list[str]:
+        """Same as remove_stale, for static assets whose source was deleted."""
+        return _remove_outputs(self.assets, live_dest_paths, sink)
+
+    def remove_stale_listings(self, live_dest_paths, sink) -> list[str]:
+        """Same as remove_stale, for listing pages that are no longer generated."""
+        return _remove_outputs(self.listings, live_dest_paths, sink)
+
+    def remove_outputs(self, dest_paths, sink) -> list[str]:
+        """
+        Delete specific outputs, pages, assets or listings, whose source is known to be gone.
+        Returns:
+            list[str]: The outputs that were tracked and removed.
+        """
+        dest_paths = [str(path) for path in dest_paths]
+        removed = []
+        for entries in (self.pages, self.assets, self.listings):
+            removed.extend(_remove_entries(entries, sorted({dest for dest in dest_paths if dest in entries}), sink))
+        return removed
+
+
+def _remove_outputs(entries, live_dest_paths, sink) -> list[str]:
+    live = {str(path) for path in live_dest_paths}
+    return _remove_entries(entries, sorted(set(entries) - live), sink)
+
+
+def _remove_entries(entries, dests, sink) -> list[str]:
+    removed = []
+    for dest in dests:
+        if sink.remove(dest):
+            logger.info(f"Removed stale output {dest}")
+        del entries[dest]
+        removed.append(dest)
+    return removed
@@ -0,0 +1,277 @@
+# python imports
+import datetime
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+from discover import RACY_NS
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# The line opening and closing the front matter block at the very top of a page
+FRONT_MATTER_FENCE = "---"
+# Front matter longer than this is a missing closing fence rather than metadata
+FRONT_MATTER_MAX_LINES = 200
+METADATA_PATH = Path(".ssg") / "metadata.json"
+# Bump when what read_metadata returns changes so old indexes are read again
+METADATA_VERSION = 1
+# key: value, keys are identifiers like date or cover_image
+FRONT_MATTER_LINE_REGEX = re.compile(r"([A-Za-z_][\w-]*)\s*:(.*)")
+
+
+class FrontMatterError(ValueError):
+    """Raised for front matter that cannot be read, the page fails with it."""
+
+
+def parse_front_matter(lines) -> dict:
+    """
+    Parse the lines between the front matter fences, a small subset of YAML:
+
+        title: Why Tom Bombadil Was a Mistake
+        date: 2024-05-01
+        tags: [lotr, "tom bombadil"]
+        draft: true
+        aliases:
+          - /tom.html
+          - /bombadil.html
+
+    Values are strings, true/false, integers, or lists in either form. Quotes are removed,
+    lines starting with # are comments.
+    Args:
+        lines (iterable[str]): The lines, without their newlines.
+    Returns:
+        dict: The metadata by key.
+    Raises:
+        FrontMatterError: If a line is none of the above.
+    """
+    metadata = {}
+    list_key = None
+    for number, line in enumerate(lines, start=2):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped.startswith("- ") and list_key is not None and line[:1].isspace():
+            metadata[list_key].append(_scalar(stripped[2:]))
+            continue
+        match = FRONT_MATTER_LINE_REGEX.fullmatch(line)
+        if match is None:
+            raise FrontMatterError(f"Line {number} of the front matter is not 'key: value': {line!r}")
+        key, value = match[1], match[2].strip()
+        list_key = None
+        if not value:
+            # The items follow on the next lines
+            metadata[key] = []
+            list_key = key
+        elif value.startswith("[") and value.endswith("]"):
+            metadata[key] = [_scalar(item) for item in value[1:-1].split(",") if item.strip()]
+        else:
+            metadata[key] = _scalar(value)
+    return metadata
+
+
+def _scalar(value: str):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    lowered = value.lower()
+    if lowered in ("true", "yes"):
+        return True
+    if lowered in ("false", "no"):
+        return False
+    if value.isdecimal():
+        return int(value)
+    return value
+
+
+def read_front_matter(f) -> dict:
+    """
+    Read the front matter at the top of an open markdown file, if it has any, and leave the
+    file at the first line of the markdown after it.
+    Returns:
+        dict: The metadata, empty without front matter.
+    Raises:
+        FrontMatterError: If the front matter is never closed or cannot be parsed.
+    """
+    if f.readline().rstrip("\r\n") != FRONT_MATTER_FENCE:
+        f.seek(0)
+        return {}
+    lines = []
+    for _ in range(FRONT_MATTER_MAX_LINES):
+        line = f.readline()
+        if not line:
+            break
+        line = line.rstrip("\r\n")
+        if line.rstrip() == FRONT_MATTER_FENCE:
+            return parse_front_matter(lines)
+        lines.append(line)
+    raise FrontMatterError(f"Front matter not closed with {FRONT_MATTER_FENCE!r} within {FRONT_MATTER_MAX_LINES} lines")
+
+
+def read_header(f) -> tuple[dict, str]:
+    """
+    Read the front matter and the title line of an open markdown file, and leave the file at
+    the first line of the markdown (the title line, rendered with the rest).
+    Returns:
+        tuple[dict, str]: The front matter (see read_front_matter) and the first line of the
+            markdown, blank lines between the front matter and the markdown are skipped.
+    """
+    metadata = read_front_matter(f)
+    if not metadata and f.tell() == 0:
+        line = f.readline()
+        f.seek(0)
+        return metadata, line
+    start = f.tell()
+    line = f.readline()
+    while line and not line.strip():
+        start = f.tell()
+        line = f.readline()
+    f.seek(start)
+    return metadata, line
+
+
+def page_title(line: str) -> str | None:
+    """The text of a '# Title' line, None if the line is not one."""
+    line = line.strip()
+    if not line.startswith("#"):
+        return None
+    return line[1:].strip() or None
+
+
+def read_metadata(path) -> dict:
+    """
+    Read the metadata of a page from its header only, the front matter and the title line,
+    without reading or parsing the rest of the markdown.
+    Args:
+        path (Path): The markdown file.
+    Returns:
+        dict: Every front matter key, and always:
+            title (str | None): From the front matter, else the '# Title' line.
+            date (str | None): An ISO date (2024-05-01) or date and time, sorts as a string.
+            tags (list[str]): The tags, also accepted as one comma separated string.
+            draft (bool): Drafts are left out of builds, see SiteBuild.
+            layout (str | None): The name of a layout in layouts/ to use, see select_layout.
+    Raises:
+        FrontMatterError: If the front matter or one of these fields is malformed.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        metadata, title_line = read_header(f)
+    title = metadata.get("title")
+    if title is None:
+        title = page_title(title_line)
+    return normalize_metadata(metadata, title)
+
+
+def normalize_metadata(metadata: dict, title=None) -> dict:
+    """Check and fill in the fields every page has, see read_metadata."""
+    metadata = dict(metadata)
+    metadata["title"] = str(title) if title is not None else None
+    date = metadata.get("date")
+    if date is not None:
+        date = str(date)
+        try:
+            (datetime.date if len(date) == 10 else datetime.datetime).fromisoformat(date)
+        except ValueError:
+            raise FrontMatterError(f"date must be an ISO date like 2024-05-01, not {date!r}") from None
+    metadata["date"] = date
+    tags = metadata.get("tags", [])
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    elif not isinstance(tags, list):
+        tags = [tags]
+    metadata["tags"] = [str(tag).strip() for tag in tags if str(tag).strip()]
+    draft = metadata.get("draft", False)
+    if not isinstance(draft, bool):
+        raise FrontMatterError(f"draft must be true or false, not {draft!r}")
+    metadata["draft"] = draft
+    layout = metadata.get("layout")
+    metadata["layout"] = str(layout) if layout is not None else None
+    return metadata
+
+
+class SiteMetadata:
+    """
+    The metadata of every page (see read_metadata) kept between builds, so listing, sorting and
+    filtering pages reads one stat per page instead of the page itself. An entry is read again
+    when the size or modification time of its page changes (pages changed in the last seconds
+    are read every time, see RACY_NS):
+
+        {"content/blog/tom/index.md": [mtime_ns, size, {"title": "...", "date": "2024-05-01", ...}]}
+
+    Every page of the last build is in it, so listings (see listings.py) are made from it alone.
+
+    An index without a path (SiteMetadata(None)) is only kept in memory.
+    """
+
+    def __init__(self, path=METADATA_PATH, pages=None):
+        self.path = Path(path) if path is not None else None
+        self.pages = pages if pages is not None else {}
+        # Only saved when something was read again or removed
+        self.changed = False
+
+    @classmethod
+    def load(cls, path=METADATA_PATH):
+        """Load the index of the last build, a missing or unreadable one reads every page again."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable metadata index {path}: {e}")
+            return cls(path)
+        if not isinstance(data, dict) or data.get("version") != METADATA_VERSION:
+            return cls(path)
+        return cls(path, data.get("pages", {}))
+
+    def save(self) -> None:
+        if self.path is None or not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": METADATA_VERSION, "pages": self.pages}, separators=(",", ":")))
+        os.replace(tmp_path, self.path)
+        self.changed = False
+        logger.info(f"Saved the metadata of {len(self.pages)} pages to {self.path}")
+
+    def get(self, source) -> dict:
+        """
+        The metadata of a page, read from its header if it changed since it was indexed.
+        Raises:
+            FileNotFoundError: If the page does not exist.
+            FrontMatterError: See read_metadata.
+        """
+        key = str(source)
+        stat = os.stat(source)
+        entry = self.pages.get(key)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        try:
+            metadata = read_metadata(source)
+        except FrontMatterError:
+            self.forget(source)
+            raise
+        # Another change within the same tick of the clock could keep the size and mtime (see
+        # RACY_NS), a recent page is kept without its mtime so it is read again next time
+        trusted = stat.st_mtime_ns < time.time_ns() - RACY_NS
+        self.pages[key] = [stat.st_mtime_ns if trusted else None, stat.st_size, metadata]
+        self.changed = True
+        return metadata
+
+    def forget(self, source) -> None:
+        if self.pages.pop(str(source), None) is not None:
+            self.changed = True
+
+    def retain(self, sources) -> None:
+        """Drop the pages that are not in sources, like deleted ones."""
+        keep = {str(source) for source in sources}
+        for key in [key for key in self.pages if key not in keep]:
+            del self.pages[key]
+            self.changed = True
@@ -0,0 +1,290 @@
+# python imports
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+from assets import copy_files, file_is_unchanged, COPY_WORKERS
+from manifest import hash_file, prune_empty_dirs
+import tracing
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Threads writing pages in the background, writing is I/O bound so a few are enough
+OUTPUT_WORKERS = 4
+# Rendered pages waiting for a writer thread, past it the renderer waits (bounds memory)
+OUTPUT_MAX_PENDING = 64
+# Pages up to this many characters are rendered into memory and written in the background,
+# bigger ones are streamed to disk by the renderer so memory stays flat
+SPOOL_LIMIT = 1 << 20
+
+
+def _tmp_path(path: Path) -> Path:
+    # Next to the destination, so os.replace stays on the same filesystem, and unique per
+    # thread so two writers never share a temp file
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_native_id()}.tmp")
+
+
+def is_unchanged(path, size: int, digest) -> bool:
+    """
+    Check whether the file at path already holds content of this size and sha256, comparing
+    the size first so most changed files are told apart without being read.
+    Args:
+        path (Path): The existing output.
+        size (int): The size of the new content in bytes.
+        digest (callable): Returns the hex sha256 of the new content, only called when the sizes match.
+    """
+    try:
+        if os.stat(path).st_size != size:
+            return False
+        return hash_file(path) == digest()
+    except OSError:
+        return False
+
+
+def write_if_changed(path, data: bytes) -> bool:
+    """
+    Write data to path unless the file already holds exactly these bytes, so unchanged outputs
+    keep their modification time. The write goes to a temp file moved into place with os.replace,
+    readers (and a crash part way) see the old file or the new one, never half of it.
+    Returns:
+        bool: Whether the file was written.
+    """
+    path = Path(path)
+    if is_unchanged(path, len(data), lambda: hashlib.sha256(data).hexdigest()):
+        logger.info(f"Unchanged {path}")
+        return False
+    tmp_path = _tmp_path(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def stream_if_changed(path, chunks, encoding="utf-8") -> bool:
+    """
+    write_if_changed for content too big to hold in memory: the chunks are written to the temp
+    file as they come, and it is only moved into place if it differs from the existing file.
+    Returns:
+        bool: Whether the file was replaced.
+    """
+    path = Path(path)
+    tmp_path = _tmp_path(path)
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                data = chunk.encode(encoding)
+                digest.update(data)
+                f.write(data)
+            size = f.tell()
+        if is_unchanged(path, size, digest.hexdigest):
+            tmp_path.unlink()
+            logger.info(f"Unchanged {path}")
+            return False
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return True
+
+
+class OutputSink:
+    """
+    Where a build puts its outputs: generated pages, copied static files and the removal of
+    stale ones all go through a sink instead of straight to the disk. Outputs are addressed by
+    the same paths as in the manifest (the root joined with the path in the site), so a build
+    works the same whatever the sink.
+
+        DirectorySink(Path("docs"))  # the output directory, the default
+        MemorySink(Path("docs"))     # a dict of path in the site to bytes, nothing is written to disk
+    """
+
+    # Whether worker processes can write to the sink. An in-memory sink is copied into each worker,
+    # so builds using one render in this process
+    shared_across_processes = False
+
+    def __init__(self, root=Path("docs")):
+        self.root = Path(root)
+
+    def exists(self, path) -> bool:
+        """Whether there is an output at path."""
+        raise NotImplementedError
+
+    def make_dirs(self, dirs) -> None:
+        """Create the directories outputs are about to be written to."""
+        raise NotImplementedError
+
+    def write(self, path, data: bytes) -> bool:
+        """Write data to path unless it already holds these bytes, returns whether it was written."""
+        raise NotImplementedError
+
+    def stream(self, path, chunks, encoding="utf-8") -> bool:
+        """write for content too big to hold in memory, see stream_if_changed."""
+        raise NotImplementedError
+
+    def is_copy_of(self, src_path, path, checksum=False) -> bool:
+        """Whether path already holds a copy of the file src_path, see file_is_unchanged."""
+        raise NotImplementedError
+
+    def copy(self, pairs, strategy="copy", workers=COPY_WORKERS) -> None:
+        """Copy (source file, output path) pairs into the sink, see copy_files."""
+        raise NotImplementedError
+
+    def remove(self, path) -> bool:
+        """Remove the output at path, returns whether there was one."""
+        raise NotImplementedError
+
+
+class DirectorySink(OutputSink):
+    """Outputs written to a directory on disk, see write_if_changed."""
+
+    shared_across_processes = True
+
+    def exists(self, path) -> bool:
+        return Path(path).is_file()
+
+    def make_dirs(self, dirs) -> None:
+        # Once each, so the threads and processes writing into them never race to create them
+        for directory in sorted({Path(directory) for directory in dirs}):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def write(self, path, data: bytes) -> bool:
+        return write_if_changed(path, data)
+
+    def stream(self, path, chunks, encoding="utf-8") -> bool:
+        return stream_if_changed(path, chunks, encoding)
+
+    def is_copy_of(self, src_path, path, checksum=False) -> bool:
+        return file_is_unchanged(src_path, path, checksum)
+
+    def copy(self, pairs, strategy="copy", workers=COPY_WORKERS) -> None:
+        copy_files(pairs, strategy, workers)
+
+    def remove(self, path) -> bool:
+        path = Path(path)
+        if not path.is_file():
+            return False
+        path.unlink()
+        prune_empty_dirs(path.parent, self.root)
+        return True
+
+
+class MemorySink(OutputSink):
+    """
+    Outputs kept in memory, in files by their path in the site ("blog/index.html"), so a whole
+    site can be built without writing to disk, for tests or to serve it from another program:
+
+        sink = MemorySink()
+        SiteBuild(output_dir=sink, manifest=BuildManifest(None)).run()
+        sink.files["index.html"]
+    """
+
+    def __init__(self, root=Path("docs")):
+        super().__init__(root)
+        self.files = {}
+        # (size, mtime) of the source of every copied static file, compared like on disk
+        self._copied = {}
+
+    def key(self, path) -> str:
+        return Path(path).relative_to(self.root).as_posix()
+
+    def read(self, path) -> bytes:
+        return self.files[self.key(path)]
+
+    def exists(self, path) -> bool:
+        return self.key(path) in self.files
+
+    def make_dirs(self, dirs) -> None:
+        pass
+
+    def write(self, path, data: bytes) -> bool:
+        key = self.key(path)
+        self._copied.pop(key, None)
+        if self.files.get(key) == data:
+            return False
+        self.files[key] = data
+        return True
+
+    def stream(self, path, chunks, encoding="utf-8") -> bool:
+        return self.write(path, "".join(chunks).encode(encoding))
+
+    def is_copy_of(self, src_path, path, checksum=False) -> bool:
+        key = self.key(path)
+        copied = self._copied.get(key)
+        if copied is None:
+            return False
+        stat = os.stat(src_path)
+        if copied[0] != stat.st_size:
+            return False
+        if copied[1] == stat.st_mtime_ns:
+            return True
+        if not checksum or Path(src_path).read_bytes() != self.files[key]:
+            return False
+        # Like on disk, the copy takes the time of the source so it is not compared again
+        self._copied[key] = (stat.st_size, stat.st_mtime_ns)
+        return True
+
+    def copy(self, pairs, strategy="copy", workers=COPY_WORKERS) -> None:
+        for src_path, path in pairs:
+            key = self.key(path)
+            stat = os.stat(src_path)
+            self.files[key] = Path(src_path).read_bytes()
+            self._copied[key] = (stat.st_size, stat.st_mtime_ns)
+
+    def remove(self, path) -> bool:
+        key = self.key(path)
+        self._copied.pop(key, None)
+        return self.files.pop(key, None) is not None
+
+
+class OutputWriter:
+    """
+    Writes rendered pages into a sink (the disk by default) on a small thread pool, so rendering
+    the next page never waits on the disk. At most max_pending pages wait to be written, past that
+    submit blocks until a writer thread is free.
+
+        with OutputWriter() as writer:
+            future = writer.submit(dest_path, html.encode())
+        future.result()  # True if written, raises if the write failed
+    """
+
+    def __init__(self, sink=None, workers=OUTPUT_WORKERS, max_pending=OUTPUT_MAX_PENDING):
+        self.sink = sink if sink is not None else DirectorySink()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="output")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, path, data: bytes):
+        """Queue a write, returns a Future of the sink's write (write_if_changed on disk)."""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._write, path, data)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _write(self, path, data):
+        with tracing.span("write", category="io", path=str(path)):
+            return self.sink.write(path, data)
+
+    def close(self) -> None:
+        """Wait for every queued write."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
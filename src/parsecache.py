@@ -0,0 +1,277 @@
+# python imports
+import logging
+import marshal
+import os
+import sys
+import threading
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+from htmlnode import LeafNode, ParentNode, attributes_to_html, leaf_to_html
+from splitblocks import PARSER_VERSION
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(".ssg") / "cache"
+# Default size cap, the least recently used entries are evicted past it
+CACHE_MAX_BYTES = 256 << 20
+CACHE_SUFFIX = ".nodes"
+# First record of every entry, entries written by another parser or Python are misses
+CACHE_HEADER = ("ssg-nodes", PARSER_VERSION, marshal.version, sys.version_info[:2])
+
+# Node kinds in the flat encoding, see encode_node
+_LEAF = 0
+_PARENT = 1
+
+
+def encode_node(node) -> tuple:
+    """
+    Flatten an HTMLNode tree into one tuple of plain values, nodes in document order:
+
+        LeafNode:   0, tag, value, props
+        ParentNode: 1, tag, number of children, props
+
+    A flat tuple of strings marshals in one pass and loads without rebuilding a graph of
+    objects the way pickle does, and deep trees do not recurse.
+    """
+    fields = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        props = dict(node.props) if node.props is not None else None
+        if type(node) is LeafNode:
+            fields.extend((_LEAF, node.tag, node.value, props))
+        elif type(node) is ParentNode:
+            fields.extend((_PARENT, node.tag, len(node.children), props))
+            stack.extend(reversed(node.children))
+        else:
+            raise TypeError(f"Cannot cache {type(node).__name__}")
+    return tuple(fields)
+
+
+def decode_node(fields):
+    """Rebuild the tree of encode_node."""
+    root = None
+    # [children list, number of children still to read] of the open parents
+    open_parents = []
+    index = 0
+    while index < len(fields):
+        kind, tag, third, props = fields[index : index + 4]
+        index += 4
+        if kind == _LEAF:
+            node = LeafNode(tag, third, props)
+        else:
+            node = ParentNode(tag, [], props)
+        if open_parents:
+            parent = open_parents[-1]
+            parent[0].append(node)
+            parent[1] -= 1
+            if parent[1] == 0:
+                open_parents.pop()
+                # Close every parent this was the last child of
+                while open_parents and open_parents[-1][1] == 0:
+                    open_parents.pop()
+        else:
+            root = node
+        if kind == _PARENT and third:
+            open_parents.append([node.children, third])
+    return root
+
+
+def iter_encoded_html(fields, basepath=None):
+    """
+    Yield the HTML of an encoded tree straight from its fields, the same chunks as
+    decode_node(fields).iter_html(basepath) without creating a node.
+    """
+    # [closing tag, number of children still to render] of the open parents
+    open_parents = []
+    index = 0
+    while index < len(fields):
+        kind, tag, third, props = fields[index : index + 4]
+        index += 4
+        if open_parents:
+            open_parents[-1][1] -= 1
+        if kind == _LEAF:
+            yield leaf_to_html(tag, third, props, basepath)
+        else:
+            if tag is None:
+                raise ValueError("invalid HTML: missing tag")
+            yield f"<{tag}{attributes_to_html(props, basepath)}>"
+            if third:
+                open_parents.append([f"</{tag}>", third])
+                continue
+            yield f"</{tag}>"
+        # Close every parent this was the last child of
+        while open_parents and open_parents[-1][1] == 0:
+            yield open_parents.pop()[0]
+
+
+class ParseCache:
+    """
+    Content addressed cache of parsed markdown, so a page whose markdown did not change is
+    never parsed again (a template or basepath change only re-renders).
+
+    Entries are keyed by the sha256 of the markdown and the parser version and hold the
+    encoded node of every block, written and read one block at a time so a cached page
+    streams like a parsed one:
+
+        .ssg/cache/3f/3f2a...c1-p1.nodes
+
+    Reading an entry marks it as recently used, prune() evicts the least recently used
+    entries until the cache fits in max_bytes.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def path_for(self, source_hash: str) -> Path:
+        return self.root / source_hash[:2] / f"{source_hash}-p{PARSER_VERSION}{CACHE_SUFFIX}"
+
+    def document(self, source_hash: str, stream, streamed_hash=None):
+        """
+        The cached blocks of a markdown document or, on a miss, stream itself recording its
+        blocks into the cache as it is rendered.
+        Args:
+            source_hash (str): The sha256 of the markdown.
+            stream (MarkdownStream): The document, only read on a miss.
+            streamed_hash (callable): The sha256 of the markdown stream read, called once it is
+                read to the end. The blocks are only recorded when it is source_hash, so a page
+                edited after it was hashed is not cached under the hash of its old markdown.
+        Returns:
+            An object with iter_html(basepath), like MarkdownStream.
+        """
+        path = self.path_for(source_hash)
+        try:
+            # Touching the entry is what keeps it from being evicted
+            os.utime(path)
+        except OSError:
+            return _RecordedDocument(path, stream, source_hash, streamed_hash)
+        return _CachedDocument(path, stream, source_hash, streamed_hash)
+
+    def entries(self) -> list[tuple[Path, os.stat_result]]:
+        """(path, stat) of every entry, least recently used first."""
+        entries = []
+        if not self.root.is_dir():
+            return entries
+        with os.scandir(self.root) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    entries.extend((Path(f.path), f.stat()) for f in files if f.name.endswith(CACHE_SUFFIX))
+        entries.sort(key=lambda entry: (entry[1].st_mtime_ns, entry[0]))
+        return entries
+
+    def stats(self) -> dict:
+        entries = self.entries()
+        return {
+            "path": str(self.root),
+            "entries": len(entries),
+            "bytes": sum(stat.st_size for _, stat in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def prune(self) -> list[Path]:
+        """
+        Evict the least recently used entries until the cache fits in max_bytes.
+        Returns:
+            list[Path]: The evicted entries.
+        """
+        entries = self.entries()
+        total = sum(stat.st_size for _, stat in entries)
+        evicted = []
+        for path, stat in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            evicted.append(path)
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} parse cache entries, {total >> 20} MiB left")
+        return evicted
+
+    def clear(self) -> int:
+        """Remove every entry. Returns the number removed."""
+        entries = self.entries()
+        for path, _ in entries:
+            path.unlink(missing_ok=True)
+        for shard in self.root.glob("*"):
+            if shard.is_dir():
+                try:
+                    shard.rmdir()
+                except OSError:
+                    pass
+        return len(entries)
+
+
+class _CachedDocument:
+    __slots__ = ("path", "stream", "source_hash", "streamed_hash")
+
+    def __init__(self, path, stream, source_hash=None, streamed_hash=None):
+        self.path = path
+        self.stream = stream
+        self.source_hash = source_hash
+        self.streamed_hash = streamed_hash
+
+    def iter_html(self, basepath=None):
+        with open(self.path, "rb") as f:
+            try:
+                current = marshal.load(f) == CACHE_HEADER
+            except (EOFError, ValueError, TypeError):
+                current = False
+            if current:
+                yield "<div>"
+                while True:
+                    try:
+                        fields = marshal.load(f)
+                    except (EOFError, ValueError, TypeError) as e:
+                        # Part of the page is already out, fail it and parse it again next time
+                        self.path.unlink(missing_ok=True)
+                        raise ValueError(f"Corrupt parse cache entry {self.path}") from e
+                    if fields is None:
+                        break
+                    yield from iter_encoded_html(fields, basepath)
+                yield "</div>"
+                return
+        # Written by another Python (or unreadable), parse again and replace it
+        yield from _RecordedDocument(self.path, self.stream, self.source_hash, self.streamed_hash).iter_html(basepath)
+
+
+class _RecordedDocument:
+    __slots__ = ("path", "stream", "source_hash", "streamed_hash")
+
+    def __init__(self, path, stream, source_hash=None, streamed_hash=None):
+        self.path = path
+        self.stream = stream
+        self.source_hash = source_hash
+        self.streamed_hash = streamed_hash
+
+    def iter_html(self, basepath=None):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Written next to the entry and moved into place once complete, so concurrent
+        # workers and interrupted builds never leave a partial entry behind. Unique per thread
+        # too, the dev server renders pages with the same markdown on several threads at once
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_native_id()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                marshal.dump(CACHE_HEADER, f)
+                yield "<div>"
+                for node in self.stream.iter_nodes():
+                    marshal.dump(encode_node(node), f)
+                    yield from node.iter_html(basepath)
+                yield "</div>"
+                # End marker, an entry without one was cut short
+                marshal.dump(None, f)
+            if self.streamed_hash is not None and self.streamed_hash() != self.source_hash:
+                # The page changed since it was hashed, its blocks are not those of source_hash
+                logger.debug(f"{self.path.name} changed while it was parsed, not recorded")
+                tmp_path.unlink()
+                return
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
@@ -0,0 +1,510 @@
+# python imports
+import asyncio
+import contextlib
+import functools
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from pathlib import Path, PurePosixPath
+from urllib.parse import unquote, urlsplit
+
+# application imports
+from log_config import setup_logging
+from assets import walk_files
+from extractor import render_page
+from listings import LISTING_SECTION, TAGS_DIR, collect_posts, listing_layout, plan_listings, render_listing
+from metadata import FrontMatterError
+from template import load_template, select_layout
+from watch import create_watcher
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 9999
+# Rendered pages kept in memory, the least recently requested are dropped past it
+SERVE_CACHE_BYTES = 64 << 20
+# Largest request line plus headers accepted
+MAX_HEAD_BYTES = 64 << 10
+# Pages are gzipped once when rendered, a fast level as this is the dev loop
+GZIP_LEVEL = 6
+GZIP_MIN_SIZE = 256
+# Seconds between checks for changes when nothing happens, see DevServer._watch
+WATCH_INTERVAL_SECONDS = 0.25
+
+REASONS = {
+    200: "OK",
+    301: "Moved Permanently",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class RenderedPage:
+    """A page rendered for serving: its HTML, gzipped HTML (if smaller) and strong ETag."""
+
+    __slots__ = ("body", "gzipped", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        gzipped = gzip.compress(body, GZIP_LEVEL, mtime=0) if len(body) >= GZIP_MIN_SIZE else body
+        self.gzipped = gzipped if len(gzipped) < len(body) else None
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + (len(self.gzipped) if self.gzipped is not None else 0)
+
+
+class PageCache:
+    """Least recently used rendered pages by source path, bounded by their size in bytes."""
+
+    def __init__(self, max_bytes=SERVE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._pages = OrderedDict()
+
+    def get(self, key):
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+        return page
+
+    def put(self, key, page) -> None:
+        self.pop(key)
+        self._pages[key] = page
+        self.bytes += page.size
+        # The page just rendered stays even if it is bigger than the whole cache
+        while self.bytes > self.max_bytes and len(self._pages) > 1:
+            _, evicted = self._pages.popitem(last=False)
+            self.bytes -= evicted.size
+
+    def pop(self, key) -> None:
+        page = self._pages.pop(key, None)
+        if page is not None:
+            self.bytes -= page.size
+
+    def clear(self) -> None:
+        self._pages.clear()
+        self.bytes = 0
+
+    def __contains__(self, key):
+        return key in self._pages
+
+    def __len__(self):
+        return len(self._pages)
+
+
+def accepts_gzip(accept_encoding) -> bool:
+    """Whether an Accept-Encoding header allows gzip, "gzip;q=0" and "*;q=0" do not."""
+    if not accept_encoding:
+        return False
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    if "gzip" in qualities:
+        return qualities["gzip"] > 0
+    return qualities.get("*", 0) > 0
+
+
+def etag_matches(if_none_match, etag) -> bool:
+    """If-None-Match uses the weak comparison, W/"x" matches "x"."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def parse_request(head: bytes):
+    """
+    Split the head of a request into (method, target, version, headers with lowercase names).
+    Returns None if it is not HTTP.
+    """
+    try:
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        return None
+    if not version.startswith("HTTP/1."):
+        return None
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, separator, value = line.partition(":")
+        if not separator:
+            return None
+        headers[name.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+def _is_within(path: Path, root: Path) -> bool:
+    return path == root or root in path.parents
+
+
+def _is_inside(path: Path, root: Path) -> bool:
+    # After following symlinks, so nothing outside the tree is ever served
+    return path.resolve().is_relative_to(root.resolve())
+
+
+class DevServer:
+    """
+    Development server that renders pages from content/ when they are requested, so no build
+    is needed before serving. Rendered pages are kept in a PageCache and dropped when their
+    markdown changes (all of them when a template, layout or partial changes). Static files
+    are sent from static/ with sendfile, or their .gz sibling to clients accepting gzip.
+
+    Responses carry strong ETags and conditional requests get a 304. Pages are gzipped once,
+    when rendered, for clients that accept it.
+
+    When the builder has listings on, the blog index, tag and archive pages are rendered from
+    the metadata of the posts like the rest, and dropped when a post changes.
+    """
+
+    def __init__(self, builder, host=SERVE_HOST, port=SERVE_PORT, cache_bytes=SERVE_CACHE_BYTES, watch=True):
+        self.builder = builder
+        self.host = host
+        self.port = port
+        self.watch = watch
+        self.pages = PageCache(cache_bytes)
+        # Renders in flight by source, concurrent requests for a page share one render
+        self._rendering = {}
+        # Bumped by every invalidation, a render started before one is not cached
+        self._generation = 0
+        # The listing pages by URL path below the prefix, planned when first requested
+        self._listing_plan = None
+        # Cache keys of the rendered listing pages, dropped together when a post changes
+        self._listing_keys = set()
+        # Rendering is CPU bound Python, threads keep the loop answering while a page renders
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="render")
+        self._server = None
+        self._stop = threading.Event()
+        self._watcher = None
+        # Open connections, closed with the server so idle keep-alive clients do not hold it up
+        self._connections = set()
+
+    @property
+    def prefix(self) -> str:
+        basepath = self.builder.basepath
+        return basepath if basepath.endswith("/") else basepath + "/"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEAD_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.watch:
+            # Created here so no change made once start returns is missed
+            watcher = create_watcher(self.builder.watch_paths())
+            loop = asyncio.get_running_loop()
+            self._watcher = threading.Thread(target=self._watch, args=(watcher, loop), daemon=True)
+            self._watcher.start()
+        logger.info(f"Serving {self.builder.content_dir} on http://{self.host}:{self.port}{self.prefix}")
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+        if self._watcher is not None:
+            await asyncio.to_thread(self._watcher.join)
+        self._executor.shutdown(wait=True)
+
+    def _watch(self, watcher, loop) -> None:
+        try:
+            while not self._stop.is_set():
+                changes = watcher.wait(WATCH_INTERVAL_SECONDS)
+                if changes:
+                    loop.call_soon_threadsafe(self.invalidate, changes)
+        finally:
+            watcher.close()
+
+    def invalidate(self, changed_paths) -> None:
+        """
+        Drop the rendered pages affected by changed files: a markdown file drops its page, a
+        static file nothing (they are read on every request), anything else every page.
+        """
+        self._generation += 1
+        self._rendering.clear()
+        for path in map(Path, changed_paths):
+            if _is_within(path, self.builder.static_dir):
+                continue
+            if path.suffix == ".md" and _is_within(path, self.builder.content_dir):
+                self.pages.pop(path)
+                if _is_within(path, self.builder.content_dir / LISTING_SECTION):
+                    self._drop_listings()
+            else:
+                # The template, a layout, a partial or a directory of pages
+                self.pages.clear()
+                self._drop_listings()
+                logger.info(f"{path} changed, dropped every rendered page")
+                return
+
+    def _drop_listings(self) -> None:
+        self._listing_plan = None
+        for key in self._listing_keys:
+            self.pages.pop(key)
+        self._listing_keys.clear()
+
+    def listing_plan(self) -> dict:
+        """
+        The listing pages by URL path below the prefix (blog/index.html), see plan_listings. Like
+        every page served, drafts are listed and the metadata of the posts is only read again for
+        the posts that changed since it was indexed.
+        """
+        if self._listing_plan is None:
+            builder = self.builder
+            section = builder.content_dir / LISTING_SECTION
+            sources = set()
+            for source in walk_files(section) if section.is_dir() else []:
+                if source.suffix != ".md" or builder.is_ignored(source):
+                    continue
+                try:
+                    builder.metadata.get(source)
+                except (FileNotFoundError, FrontMatterError) as e:
+                    logger.warning(f"Not listing {source}: {e}")
+                    continue
+                sources.add(str(source))
+            # The index can still hold posts deleted since the last build
+            posts = [
+                post for post in collect_posts(builder.metadata, builder.content_dir, drafts=True) if post[1] in sources
+            ]
+            listings = plan_listings(posts, builder.output_dir, builder.listing_page_size)
+            self._listing_plan = {
+                listing[0].relative_to(builder.output_dir).as_posix(): listing for listing in listings
+            }
+        return self._listing_plan
+
+    def resolve(self, url_path: str):
+        """
+        Map a URL path to what serves it, the same layout as the built site:
+            ("page", markdown source), ("listing", listing), ("static", file), ("redirect", location)
+            or None.
+        Files left out of the build by an .ssgignore are not served either.
+        """
+        prefix = self.prefix
+        if not url_path.startswith(prefix):
+            return ("redirect", prefix) if url_path + "/" == prefix else None
+        relative = url_path[len(prefix) :]
+        parts = relative.split("/")
+        # An empty part (a leading or doubled slash, %2F unquoted) would make the path absolute
+        if any(part in (".", "..") or "\\" in part or "\0" in part for part in parts) or "" in parts[:-1]:
+            return None
+        is_directory = relative == "" or relative.endswith("/")
+        path = PurePosixPath(relative + "index.html" if is_directory else relative)
+        content_dir, static_dir = self.builder.content_dir, self.builder.static_dir
+        if path.suffix == ".html":
+            source = content_dir / path.with_suffix(".md")
+            if source.is_file() and _is_inside(source, content_dir) and not self.builder.is_ignored(source):
+                return "page", source
+            if self.builder.listings and path.parts[0] in (LISTING_SECTION, TAGS_DIR):
+                listing = self.listing_plan().get(path.as_posix())
+                if listing is not None:
+                    return "listing", listing
+        static = static_dir / path
+        if static.is_file() and _is_inside(static, static_dir) and not self.builder.is_ignored(static):
+            return "static", static
+        if not is_directory and ((content_dir / path).is_dir() or (static_dir / path).is_dir()):
+            return "redirect", url_path + "/"
+        return None
+
+    async def page(self, source: Path, render=None) -> RenderedPage:
+        """
+        The rendered page of a markdown source, from the cache or rendered now. A page without a
+        source, like a listing, passes its key as source and the function rendering it.
+        """
+        page = self.pages.get(source)
+        if page is not None:
+            return page
+        pending = self._rendering.get(source)
+        if pending is not None:
+            return await pending
+        generation = self._generation
+        render = render or functools.partial(self._render, source)
+        pending = asyncio.get_running_loop().run_in_executor(self._executor, render)
+        self._rendering[source] = pending
+        try:
+            page = await pending
+        finally:
+            if self._rendering.get(source) is pending:
+                del self._rendering[source]
+        if generation == self._generation:
+            self.pages.put(source, page)
+        return page
+
+    async def listing_page(self, listing) -> RenderedPage:
+        """The rendered page of a listing from listing_plan, cached like the pages."""
+        key = ("listing", listing[0])
+        page = await self.page(key, functools.partial(self._render_listing, listing))
+        if key in self.pages:
+            self._listing_keys.add(key)
+        return page
+
+    def _render(self, source: Path) -> RenderedPage:
+        builder = self.builder
+        layout_name = builder.metadata.get(source)["layout"]
+        layout = select_layout(source.relative_to(builder.content_dir), builder.template_path, name=layout_name)
+        return RenderedPage(render_page(source, layout, builder.basepath, builder.parse_cache))
+
+    def _render_listing(self, listing) -> RenderedPage:
+        template = load_template(listing_layout(self.builder.template_path))
+        return RenderedPage(render_listing(listing, template, self.builder.basepath).encode("utf-8"))
+
+    async def _handle(self, reader, writer) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, "GET", 400, {}, b"Request head too large\n", keep_alive=False)
+                    break
+                request = parse_request(head)
+                if request is None:
+                    await self._send(writer, "GET", 400, {}, b"Bad request\n", keep_alive=False)
+                    break
+                if not await self._respond(writer, *request):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _respond(self, writer, method, target, version, headers) -> bool:
+        """Answer one request, returns whether the connection stays open."""
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if method not in ("GET", "HEAD"):
+            # The body of the request was not read, the connection cannot be reused
+            await self._send(writer, method, 405, {"Allow": "GET, HEAD"}, b"Method not allowed\n", keep_alive=False)
+            return False
+        if "content-length" in headers or "transfer-encoding" in headers:
+            keep_alive = False
+        url_path = unquote(urlsplit(target).path)
+        resolved = self.resolve(url_path)
+        if resolved is None:
+            status = 404
+            await self._send(writer, method, 404, {}, b"Not found\n", keep_alive)
+        elif resolved[0] == "redirect":
+            status = 301
+            await self._send(writer, method, 301, {"Location": resolved[1]}, b"", keep_alive)
+        elif resolved[0] in ("page", "listing"):
+            status = await self._send_page(writer, method, headers, resolved, keep_alive)
+        else:
+            status = await self._send_static(writer, method, headers, resolved[1], keep_alive)
+        logger.info(f"{method} {target} {status}")
+        return keep_alive
+
+    async def _send_page(self, writer, method, headers, resolved, keep_alive) -> int:
+        kind, target = resolved
+        # A listing is named by its output in errors, it has no markdown source
+        source = target[0] if kind == "listing" else target
+        try:
+            page = await (self.listing_page(target) if kind == "listing" else self.page(source))
+        except Exception as e:
+            logger.error(f"Failed to render {source}: {e}")
+            await self._send(writer, method, 500, {}, f"Failed to render {source}: {e}\n".encode(), keep_alive)
+            return 500
+        response_headers = {
+            "Content-Type": "text/html; charset=utf-8",
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        body, etag = page.body, page.etag
+        if page.gzipped is not None and accepts_gzip(headers.get("accept-encoding")):
+            body, etag = page.gzipped, page.etag[:-1] + '-gzip"'
+            response_headers["Content-Encoding"] = "gzip"
+        response_headers["ETag"] = etag
+        if etag_matches(headers.get("if-none-match"), etag):
+            await self._send(writer, method, 304, response_headers, b"", keep_alive)
+            return 304
+        await self._send(writer, method, 200, response_headers, body, keep_alive)
+        return 200
+
+    async def _send_static(self, writer, method, headers, path, keep_alive) -> int:
+        response_headers = {
+            "Content-Type": mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            "Cache-Control": "no-cache",
+        }
+        stat = os.stat(path)
+        sibling = path.with_name(path.name + ".gz")
+        try:
+            sibling_stat = os.stat(sibling)
+        except FileNotFoundError:
+            sibling_stat = None
+        if sibling_stat is not None and sibling_stat.st_mtime_ns >= stat.st_mtime_ns:
+            # Only a precompressed file as new as the file itself stands in for it
+            response_headers["Vary"] = "Accept-Encoding"
+            if accepts_gzip(headers.get("accept-encoding")):
+                response_headers["Content-Encoding"] = "gzip"
+                path, stat = sibling, sibling_stat
+        suffix = "-gzip" if "Content-Encoding" in response_headers else ""
+        etag = f'"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}{suffix}"'
+        response_headers["ETag"] = etag
+        response_headers["Last-Modified"] = formatdate(stat.st_mtime, usegmt=True)
+        if etag_matches(headers.get("if-none-match"), etag):
+            await self._send(writer, method, 304, response_headers, b"", keep_alive)
+            return 304
+        response_headers["Content-Length"] = str(stat.st_size)
+        writer.write(_response_head(200, response_headers, keep_alive))
+        if method != "HEAD":
+            with open(path, "rb") as f:
+                # The head must be out before the kernel sends the file straight to the socket
+                await writer.drain()
+                await asyncio.get_running_loop().sendfile(writer.transport, f, 0, stat.st_size)
+        await writer.drain()
+        return 200
+
+    async def _send(self, writer, method, status, headers, body, keep_alive) -> None:
+        headers = dict(headers)
+        if status != 304:
+            headers["Content-Length"] = str(len(body))
+            headers.setdefault("Content-Type", "text/plain; charset=utf-8")
+        writer.write(_response_head(status, headers, keep_alive))
+        if method != "HEAD" and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+
+def _response_head(status, headers, keep_alive) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}", f"Date: {formatdate(usegmt=True)}", "Server: ssg-dev"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    if not keep_alive:
+        lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def serve(builder, host=SERVE_HOST, port=SERVE_PORT, cache_bytes=SERVE_CACHE_BYTES) -> None:
+    """Run a DevServer for a SiteBuild until cancelled (Ctrl-C)."""
+    server = DevServer(builder, host, port, cache_bytes)
+    await server.start()
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
@@ -0,0 +1,224 @@
+# python imports
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+from assets import walk_files
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Where shard builds go by default, one directory per shard: shards/2-of-4/{docs,shard.json}
+SHARDS_DIR = Path("shards")
+# The list of outputs of a shard, read by merge_shards
+SHARD_MANIFEST = "shard.json"
+# Bump when the layout of shard.json changes, shards of another version are not merged
+SHARD_VERSION = 1
+
+
+class ShardMergeError(Exception):
+    """
+    Raised when shard outputs cannot be merged: a shard is missing or given twice, the shards are
+    from different builds, or two shards wrote the same output. Carries every problem found, so
+    one run of merge lists all of them.
+    """
+
+    def __init__(self, problems):
+        self.problems = problems
+        lines = "\n".join(f"  {problem}" for problem in problems)
+        super().__init__(f"Cannot merge shards, {len(problems)} problem(s):\n{lines}")
+
+
+class Shard:
+    """
+    One of count shards of a build (index from 1 to count). Pages and static files are assigned to
+    shards by a hash of their path below content/ or static/, so every machine agrees on the split
+    without talking to the others, and adding a page never moves the other pages to another shard.
+    """
+
+    def __init__(self, index: int, count: int):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Shard {index}/{count} is out of range, expecting i/N with 1 <= i <= N")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, spec: str):
+        """
+        Parse "i/N" as given to --shard.
+        Raises:
+            ValueError: If spec is not two numbers or the shard is out of range.
+        """
+        index, sep, count = spec.partition("/")
+        if not sep or not index.strip().isdigit() or not count.strip().isdigit():
+            raise ValueError(f"Invalid shard {spec!r}, expecting i/N like 2/4")
+        return cls(int(index), int(count))
+
+    @property
+    def name(self) -> str:
+        return f"{self.index}-of-{self.count}"
+
+    def directory(self, root=SHARDS_DIR) -> Path:
+        return Path(root) / self.name
+
+    def owns(self, relative_path) -> bool:
+        """Whether the input at relative_path (below content/ or static/) is built by this shard."""
+        return shard_of(relative_path, self.count) == self.index - 1
+
+    def __eq__(self, other):
+        return isinstance(other, Shard) and (self.index, self.count) == (other.index, other.count)
+
+    def __repr__(self):
+        return f"Shard({self.index}/{self.count})"
+
+
+def shard_of(relative_path, count: int) -> int:
+    """
+    The shard (from 0) of an input, from the sha256 of its relative POSIX path, which is the same
+    on every machine and Python, unlike hash().
+    """
+    key = Path(relative_path).as_posix().encode("utf-8")
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "big") % count
+
+
+def write_shard_manifest(shard: Shard, output_dir, manifest, basepath) -> Path:
+    """
+    List the outputs of a shard build next to its output directory, for merge_shards. Every file
+    in output_dir is listed (also precompressed variants), with the source it was built from.
+    Args:
+        shard (Shard): The shard that was built.
+        output_dir (Path): Its output directory, shards/<name>/docs by default.
+        manifest (BuildManifest): The build manifest of the shard, for the sources.
+        basepath (str): The base path of the build, every shard must use the same one.
+    Returns:
+        Path: The shard manifest.
+    """
+    output_dir = Path(output_dir)
+    sources = {**manifest.assets, **{dest: entry["source"] for dest, entry in manifest.pages.items()}}
+    files = {}
+    for path in walk_files(output_dir):
+        files[path.relative_to(output_dir).as_posix()] = sources.get(str(path))
+    path = output_dir.parent / SHARD_MANIFEST
+    data = {
+        "version": SHARD_VERSION,
+        "index": shard.index,
+        "count": shard.count,
+        "basepath": basepath,
+        "output": output_dir.name,
+        "files": files,
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    logger.info(f"Shard {shard.name}: listed {len(files)} outputs in {path}")
+    return path
+
+
+def _load_shard(shard_dir: Path, problems: list):
+    path = shard_dir / SHARD_MANIFEST
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        problems.append(f"{shard_dir}: no readable {SHARD_MANIFEST} ({e}), was the shard build finished?")
+        return None
+    if not isinstance(data, dict) or data.get("version") != SHARD_VERSION:
+        problems.append(f"{path} is from another version")
+        return None
+    return data
+
+
+def merge_shards(shard_dirs, output, manifest) -> dict:
+    """
+    Combine the outputs of shard builds into one site. Nothing is written unless every shard of
+    the build is there exactly once, all with the same basepath, and no output was written by
+    two shards. Files already in the output that are unchanged are left alone, and outputs of
+    an earlier build or merge that no shard produced any more are removed.
+    Args:
+        shard_dirs (iterable[Path]): The shard directories, holding shard.json and the output.
+        output (OutputSink): Where the merged site goes, DirectorySink(docs) for the output directory.
+        manifest (BuildManifest): The manifest of the output, updated in place. Merged files are
+            recorded like copied static files, so the next build or merge can clean them up.
+    Returns:
+        dict: The merged output path to the shard file it was copied from.
+    Raises:
+        ShardMergeError: Listing every missing, duplicated or inconsistent shard and every collision.
+    """
+    problems = []
+    shards = []
+    for shard_dir in sorted(Path(shard_dir) for shard_dir in shard_dirs):
+        data = _load_shard(shard_dir, problems)
+        if data is not None:
+            shards.append((shard_dir, data))
+    if not shards and not problems:
+        problems.append("No shards to merge")
+
+    counts = sorted({data["count"] for _, data in shards})
+    if len(counts) > 1:
+        problems.append(f"Shards of builds split {' and '.join(map(str, counts))} ways, only one can be merged")
+    basepaths = sorted({data["basepath"] for _, data in shards})
+    if len(basepaths) > 1:
+        problems.append(f"Shards built with different basepaths: {', '.join(map(repr, basepaths))}")
+    if len(counts) == 1:
+        seen = {}
+        for shard_dir, data in shards:
+            if data["index"] in seen:
+                problems.append(f"Shard {data['index']}/{counts[0]} given twice: {seen[data['index']]} and {shard_dir}")
+            seen[data["index"]] = shard_dir
+        missing = [str(index) for index in range(1, counts[0] + 1) if index not in seen]
+        if missing:
+            problems.append(f"Missing shard(s) {', '.join(missing)} of {counts[0]}")
+
+    # Output path in the site to the (shard directory, source) it came from
+    owners = {}
+    for shard_dir, data in shards:
+        files_dir = shard_dir / data["output"]
+        for relative, source in data["files"].items():
+            if relative in owners:
+                other_dir, other_source = owners[relative]
+                problems.append(
+                    f"Collision on {relative}: {other_source or other_dir} ({other_dir.name}) "
+                    f"and {source or shard_dir} ({shard_dir.name})"
+                )
+                continue
+            if not (files_dir / relative).is_file():
+                problems.append(f"{shard_dir.name} lists {relative} but it is missing from {files_dir}")
+            owners[relative] = (shard_dir, source)
+    if problems:
+        raise ShardMergeError(problems)
+
+    merged = {}
+    to_copy = []
+    skipped = 0
+    for shard_dir, data in shards:
+        files_dir = shard_dir / data["output"]
+        for relative in data["files"]:
+            src_path = files_dir / relative
+            dest_path = output.root / relative
+            merged[str(dest_path)] = str(src_path)
+            if output.is_copy_of(src_path, dest_path):
+                skipped += 1
+            else:
+                to_copy.append((src_path, dest_path))
+    output.make_dirs([output.root])
+    output.copy(to_copy)
+    removed = (
+        manifest.remove_stale(merged, output)
+        + manifest.remove_stale_assets(merged, output)
+        + manifest.remove_stale_listings(merged, output)
+    )
+    # The merged pages were rendered by the shards, the manifest cannot tell what from
+    manifest.pages.clear()
+    manifest.listings.clear()
+    manifest.assets.update(merged)
+    logger.info(
+        f"Merged {len(shards)} shards into {output.root}: copied {len(to_copy)}, "
+        f"skipped {skipped} unchanged, removed {len(removed)}"
+    )
+    return merged
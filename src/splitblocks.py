@@ -1,5 +1,6 @@
 # python imports
 import re
+from collections.abc import Iterator
 from enum import Enum
 
 # application imports
@@ -20,6 +21,17 @@ class BlockType(Enum):
     ORDERED_LIST = "ordered_list"
 
 
+# Compiled once, matched at the start of a stripped block
+HEADING_REGEX = re.compile(r"#{1,6}\s")
+# space is optional
+QUOTE_REGEX = re.compile(r">\s")
+UNORDERED_LIST_REGEX = re.compile(r"-\s")
+ORDERED_LIST_REGEX = re.compile(r"\d+\.\s")
+CODE_FENCE = "```"
+# Bump whenever the same markdown would give different nodes, it invalidates the parse cache
+PARSER_VERSION = 1
+
+
 def block_to_block_type(block: str) -> BlockType:
     """
     Takes a single block of markdown text as input and returns the BlockType representing the type of block it is
@@ -38,25 +50,18 @@ def block_to_block_type(block: str) -> BlockType:
         BlockType: The type of block represented by the input string.
     """
     block = block.strip()  # remove leading and trailing whitespace
-    # regex for heading block
-    heading_regex = re.compile(r"^#{1,6}\s+?")
-    if re.match(heading_regex, block):
+    # The block types start with different characters, so at most one pattern is tried
+    first = block[:1]
+    if first == "#" and HEADING_REGEX.match(block):
         return BlockType.HEADING
-    # regex for code block
-    code_regex = re.compile(r"```\n(.*?)\n```", re.DOTALL)
-    if re.match(code_regex, block):
+    # ```\n, the code, then \n``` (the code may be empty)
+    if first == "`" and block.startswith("```\n") and block.find("\n```", 4) != -1:
         return BlockType.CODE
-    # regex for quote block, space is optional
-    quote_regex = re.compile(r"^>\s+?")
-    if re.match(quote_regex, block):
+    if first == ">" and QUOTE_REGEX.match(block):
         return BlockType.QUOTE
-    # regex for unordered list block
-    unordered_list_regex = re.compile(r"^-\s+")
-    if re.match(unordered_list_regex, block):
+    if first == "-" and UNORDERED_LIST_REGEX.match(block):
         return BlockType.UNORDERED_LIST
-    # regex for ordered list block
-    ordered_list_regex = re.compile(r"^\d+\.\s+")
-    if re.match(ordered_list_regex, block):
+    if first.isdecimal() and ORDERED_LIST_REGEX.match(block):
         return BlockType.ORDERED_LIST
     # if none of the above, return paragraph
     return BlockType.PARAGRAPH
@@ -83,12 +88,64 @@ def markdown_to_blocks(markdown: str) -> list[str]:
         "- This is the first list item in a list block\n- This is a list item\n- This is another list item"
     ]
     """
-    blocks = markdown.split("\n\n")
-    # Remove leading and trailing whitespace from each block
-    blocks = [block.strip() for block in blocks]
-    # Remove empty blocks
-    blocks = [block for block in blocks if block]
-    return blocks
+    return [block for block, _ in scan_blocks(markdown.split("\n"))]
+
+
+def scan_blocks(lines) -> Iterator[tuple[str, BlockType]]:
+    """
+    Split markdown lines into blocks and classify them in the same pass.
+
+    Blocks are separated by empty lines and stripped, blocks of only whitespace are dropped.
+    A block that opens with a ``` line runs to its closing fence even when the code has
+    empty lines in it. A fence that is never closed ends at the next empty line instead,
+    like any other block.
+
+    Args:
+        lines (iterable[str]): The lines of the document, without their newlines.
+    Yields:
+        tuple[str, BlockType]: Each block and its type, in document order.
+    """
+    source = iter(lines)
+    # Lines read ahead for an unclosed fence, to be read again (last one first)
+    replay = []
+    # Once a fence is found to be unclosed, no closing fence follows and none can close
+    fences_close = True
+    group = []
+    started = False
+    while True:
+        if replay:
+            line = replay.pop()
+        else:
+            line = next(source, None)
+            if line is None:
+                break
+        if not line:
+            if started:
+                block = "\n".join(group).strip()
+                yield block, block_to_block_type(block)
+            group = []
+            started = False
+            continue
+        group.append(line)
+        if started or not line.strip():
+            continue
+        started = True
+        if fences_close and line.lstrip() == CODE_FENCE:
+            fence = []
+            while True:
+                line = replay.pop() if replay else next(source, None)
+                if line is None:
+                    # Unclosed, read the lines again as ordinary ones
+                    replay.extend(reversed(fence))
+                    fences_close = False
+                    break
+                fence.append(line)
+                if line.startswith(CODE_FENCE):
+                    group.extend(fence)
+                    break
+    if started:
+        block = "\n".join(group).strip()
+        yield block, block_to_block_type(block)
 
 
 def markdown_to_html_node(markdown: str) -> ParentNode:
@@ -103,23 +160,65 @@ def markdown_to_html_node(markdown: str) -> ParentNode:
         - Assign the proper child HTMLNode objects to the block node.
     - Make all the block nodes children under a single parent HTML node (which should just be a div) and return it.
     """
-    # Split the markdown into blocks
-    blocks = markdown_to_blocks(markdown)
-
     children_nodes = []
-    for block in blocks:
+    # Split the markdown into blocks, each already classified by the scanner
+    for block, block_type in scan_blocks(markdown.split("\n")):
         # create helper for creating block nodes
-        html_block_node = block_to_html_node(block)
+        html_block_node = block_to_html_node(block, block_type)
         children_nodes.append(html_block_node)
     return ParentNode("div", children_nodes)
 
 
-def block_to_html_node(block: str) -> HTMLNode:
+def read_markdown_lines(f) -> Iterator[str]:
+    """
+    Read the lines of an open markdown file one at a time, without their newlines.
+    Gives the same lines as markdown.split("\\n") on the whole file, except the empty last one
+    that split gives for a file ending in a newline. That line ends no block, so the blocks are
+    the same either way.
+    """
+    for line in f:
+        yield line[:-1] if line.endswith("\n") else line
+
+
+class MarkdownStream:
+    """
+    The HTML of a markdown document rendered one block at a time, as it is read.
+
+    Stands in for the root node of markdown_to_html_node wherever only iter_html or
+    write_html is used (like Template.iter_render), with the same output. Only the block
+    being rendered is ever in memory, so very large sources stream in bounded memory. The
+    exception is an unclosed code fence, whose lines are held until the end of the file to
+    find out that it is unclosed. The lines can be iterated once.
+    """
+
+    __slots__ = ("lines",)
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def iter_nodes(self):
+        """Yield the node of each block in turn, the children of the root <div>."""
+        for block, block_type in scan_blocks(self.lines):
+            yield block_to_html_node(block, block_type)
+
+    def iter_html(self, basepath=None):
+        yield "<div>"
+        for node in self.iter_nodes():
+            yield from node.iter_html(basepath)
+        yield "</div>"
+
+    def write_html(self, sink, basepath=None) -> None:
+        sink.writelines(self.iter_html(basepath))
+
+
+def block_to_html_node(block: str, block_type: BlockType | None = None) -> HTMLNode:
     """
     Takes a single block of markdown text as input and returns an HTMLNode representing the block.
+    The block type is determined from the block unless the caller already knows it.
     """
     # Determine the type of block
-    block_type = block_to_block_type(block)
+    if block_type is None:
+        block_type = block_to_block_type(block)
     # based on the type of block, create a new HTMLNode with matching properties
     match block_type:
         case BlockType.PARAGRAPH:
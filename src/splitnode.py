@@ -13,6 +13,16 @@ SYMBOL_TO_TEXTTYPE = {
     # Add more symbols and their corresponding TextType if needed
 }
 
+# ![alt](url)
+IMAGE_REGEX = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
+# [text](url), but not the tail of an image
+LINK_REGEX = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+# Images and links in one alternation, so a single scan finds both in order
+INLINE_REGEX = re.compile(f"(?P<image>{IMAGE_REGEX.pattern})|(?P<link>{LINK_REGEX.pattern})")
+# Emphasis delimiters in the order the old split passes applied them, this order decides
+# which delimiter wins when they overlap, e.g. "**a_b**" is bold text "a_b"
+DELIMITER_PRIORITY = ("**", "_", "`")
+
 
 def _split_node(node, delimiter, text_type):
     nodes_list = []
@@ -76,8 +86,7 @@ def extract_markdown_images(text):
     :return __: list of tuples [(alt_text, url)]
     """
 
-    alt_uri_regex = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
-    matches = re.findall(alt_uri_regex, text)
+    matches = re.findall(IMAGE_REGEX, text)
     return matches
 
 
@@ -93,8 +102,7 @@ def extract_markdown_links(text):
     :return __: list of tuples
     """
 
-    alt_uri_link_regex = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)")
-    matches = re.findall(alt_uri_link_regex, text)
+    matches = re.findall(LINK_REGEX, text)
     return matches
 
 
@@ -122,27 +130,21 @@ def split_nodes_image(old_nodes):
         if node.text_type != TextType.NORMAL:
             new_nodes.append(node)
             continue
-        # Extaract the image links from the text
-        matches = extract_markdown_images(node.text)
-        # If there are no image links, return list with original TextNode
-        if not matches:
-            new_nodes.append(node)
-            continue
-        # If there are image links, split the text into sections
-        # and create new TextNode objects for each image
-        remaining_text = node.text
-        for match in matches:
-            image_alt, image_link = match
-            parts = remaining_text.split(f"![{image_alt}]({image_link})", 1)
-
-            if parts[0]:
-                new_nodes.append(TextNode(parts[0], TextType.NORMAL))
+        # Split the text around each image match by position, slicing once per match
+        # instead of re-splitting the remaining text (quadratic on image heavy text)
+        text = node.text
+        position = 0
+        for match in IMAGE_REGEX.finditer(text):
+            if match.start() > position:
+                new_nodes.append(TextNode(text[position : match.start()], TextType.NORMAL))
             # Create a new TextNode for the image
-            new_nodes.append(TextNode(image_alt, TextType.IMAGE, image_link))
-            remaining_text = parts[1] if len(parts) > 1 else ""
-        # If there's any remaining text after the last image, add it as a normal TextNode
-        if remaining_text:
-            new_nodes.append(TextNode(remaining_text, TextType.NORMAL))
+            new_nodes.append(TextNode(match.group(1), TextType.IMAGE, match.group(2)))
+            position = match.end()
+        # If there are no images this keeps the original text, otherwise the text after the last one
+        if position == 0:
+            new_nodes.append(node)
+        elif position < len(text):
+            new_nodes.append(TextNode(text[position:], TextType.NORMAL))
 
     return new_nodes
 
@@ -171,27 +173,20 @@ def split_nodes_link(old_nodes):
         if node.text_type != TextType.NORMAL:
             new_nodes.append(node)
             continue
-        # Extaract the image links from the text
-        matches = extract_markdown_links(node.text)
-        # If there are no valid markdown url links, return list with original TextNode
-        if not matches:
+        # Split the text around each link match by position, see split_nodes_image
+        text = node.text
+        position = 0
+        for match in LINK_REGEX.finditer(text):
+            if match.start() > position:
+                new_nodes.append(TextNode(text[position : match.start()], TextType.NORMAL))
+            # Create a new TextNode for the link
+            new_nodes.append(TextNode(match.group(1), TextType.LINK, match.group(2)))
+            position = match.end()
+        # If there are no links this keeps the original text, otherwise the text after the last one
+        if position == 0:
             new_nodes.append(node)
-            continue
-        # If there are valid markdown url links, split the text into sections
-        # and create new TextNode objects for each link
-        remaining_text = node.text
-        for match in matches:
-            uri_alt, uri_link = match
-            parts = remaining_text.split(f"[{uri_alt}]({uri_link})", 1)
-
-            if parts[0]:
-                new_nodes.append(TextNode(parts[0], TextType.NORMAL))
-            # Create a new TextNode for the image
-            new_nodes.append(TextNode(uri_alt, TextType.LINK, uri_link))
-            remaining_text = parts[1] if len(parts) > 1 else ""
-        # If there's any remaining text after the last image, add it as a normal TextNode
-        if remaining_text:
-            new_nodes.append(TextNode(remaining_text, TextType.NORMAL))
+        elif position < len(text):
+            new_nodes.append(TextNode(text[position:], TextType.NORMAL))
 
     return new_nodes
 
@@ -221,14 +216,71 @@ def text_to_textnodes(text: str) -> list[TextNode]:
             TextNode(link, link, https://boot.dev)
         ]
 
+    This is a single left to right scan with INLINE_REGEX that finds the images and links
+    in one go, the normal text between them is then split on the emphasis delimiters with
+    str.split, without building intermediate nodes. It gives exactly the nodes (and errors)
+    of running split_nodes_image, split_nodes_link and split_nodes_delimiter for "**", "_"
+    and "`" one after the other.
     """
-    nodes = [TextNode(text, TextType.NORMAL)]
+    nodes = []
+    # Priority of the first delimiter that failed, the old passes raised for "**" anywhere
+    # in the text before they ever looked at "_"
+    error = None
+    start = position = 0
+    while True:
+        for match in INLINE_REGEX.finditer(text, position):
+            if match.lastgroup == "link" and "![" in match.group(6):
+                # An image that starts inside this link's url and ends after it was matched
+                # first by the old image pass, so the image wins and the link is just text
+                image = IMAGE_REGEX.search(text, match.start() + 1)
+                if image is not None and image.start() < match.end():
+                    error = _split_emphasis(text[start : image.start()], nodes, error)
+                    nodes.append(TextNode(image.group(1), TextType.IMAGE, image.group(2)))
+                    start = position = image.end()
+                    break
+            error = _split_emphasis(text[start : match.start()], nodes, error)
+            if match.lastgroup == "image":
+                nodes.append(TextNode(match.group(2), TextType.IMAGE, match.group(3)))
+            else:
+                nodes.append(TextNode(match.group(5), TextType.LINK, match.group(6)))
+            start = match.end()
+        else:
+            break
+    error = _split_emphasis(text[start:], nodes, error)
+    if error is not None:
+        raise Exception(f"Invalid Markdown syntax, missing closing {DELIMITER_PRIORITY[error]}")
+    return nodes
 
-    # Order matters: images and links should be split before emphasis
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
-    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
 
-    return nodes
+def _split_emphasis(text, nodes, error):
+    """
+    Split a run of normal text on the emphasis delimiters in priority order, like the
+    split_nodes_delimiter passes did, and append the resulting nodes.
+    Returns the priority of the first delimiter left unclosed in this run or before it.
+    """
+    if not text:
+        return error
+    if "**" not in text and "_" not in text and "`" not in text:
+        if error is None:
+            nodes.append(TextNode(text, TextType.NORMAL))
+        return error
+    pieces = [(text, TextType.NORMAL)]
+    for priority, delimiter in enumerate(DELIMITER_PRIORITY):
+        if error is not None and error <= priority:
+            # Some earlier run already failed on a delimiter that goes first
+            return error
+        text_type = SYMBOL_TO_TEXTTYPE[delimiter]
+        new_pieces = []
+        for piece, piece_type in pieces:
+            if piece_type is not TextType.NORMAL or delimiter not in piece:
+                new_pieces.append((piece, piece_type))
+                continue
+            parts = piece.split(delimiter)
+            if len(parts) % 2 == 0:
+                return priority
+            for i, part in enumerate(parts):
+                new_pieces.append((part, text_type if i % 2 else TextType.NORMAL))
+        pieces = new_pieces
+    if error is None:
+        nodes.extend(TextNode(piece, piece_type) for piece, piece_type in pieces if piece)
+    return error
@@ -0,0 +1,250 @@
+# python imports
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# {{ Title }}, {{ Content }} ...
+SLOT_REGEX = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+# {{ include "partials/header.html" }}, quotes are optional
+INCLUDE_REGEX = re.compile(r"\{\{\s*include\s+\"?([^\"\s}]+)\"?\s*\}\}")
+TAG_REGEX = re.compile(f"{INCLUDE_REGEX.pattern}|{SLOT_REGEX.pattern}")
+# The opening of a site relative href="/..." or src="/..." attribute, see Template.iter_render
+URL_ATTRIBUTE_REGEX = re.compile(r'(\s(?:href|src)=")/(?!/)')
+
+# Compiled templates by resolved path, see load_template
+_TEMPLATE_CACHE = {}
+
+
+class Slot:
+    """A named placeholder in a compiled template, e.g. {{ Title }}."""
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text  # the placeholder as written, used when no value is given
+
+    def __eq__(self, other):
+        return isinstance(other, Slot) and self.name == other.name
+
+    def __repr__(self):
+        return f"Slot({self.name})"
+
+
+class Template:
+    """
+    A template parsed once into literal chunks and slots.
+
+        Template("<title>{{ Title }}</title>").pieces
+        # ["<title>", Slot(Title), "</title>"]
+
+    Partials pulled in with {{ include "file.html" }} are inlined when the template is
+    compiled, so rendering is a single join over the pieces.
+    """
+
+    def __init__(self, pieces, dependencies=None, digest=None):
+        self.pieces = pieces
+        # {path: mtime_ns} for the template and every partial it includes
+        self.dependencies = dependencies if dependencies is not None else {}
+        # Hash of the text of the template and its partials
+        self.digest = digest
+        # {basepath: pieces} with the URLs in the literal chunks moved under the basepath
+        self._rebased = {}
+
+    @classmethod
+    def from_string(cls, text):
+        return cls(_merge_literals(_parse(text)), digest=hashlib.sha256(text.encode("utf-8")).hexdigest())
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Compile a template file, inlining its partials.
+        Raises:
+            ValueError: If partials include each other in a loop.
+        """
+        path = Path(path).resolve()
+        dependencies = {}
+        digest = hashlib.sha256()
+        pieces = _merge_literals(_compile_file(path, dependencies, digest, ()))
+        return cls(pieces, dependencies, digest.hexdigest())
+
+    def slots(self) -> list[str]:
+        return [piece.name for piece in self.pieces if isinstance(piece, Slot)]
+
+    def iter_render(self, values: dict, basepath=None):
+        """
+        Yield the rendered document in chunks. A value can be a string or an HTMLNode,
+        which is streamed with its iter_html so its HTML is never built as one string.
+
+        With a basepath other than "/", site relative href="/..." and src="/..." URLs in the
+        template and in the nodes are moved under it. Text, like a code sample showing an
+        href="/", is left alone. The rewritten template is computed once per basepath.
+        """
+        if basepath is None or basepath == "/":
+            pieces = self.pieces
+        else:
+            pieces = self._rebased.get(basepath)
+            if pieces is None:
+                pieces = self._rebased[basepath] = _rebase_literals(self.pieces, basepath)
+        for piece in pieces:
+            if isinstance(piece, Slot):
+                # Unknown placeholders are left in the output untouched
+                value = values.get(piece.name, piece.text)
+                if isinstance(value, str):
+                    yield value
+                else:
+                    yield from value.iter_html(basepath)
+            else:
+                yield piece
+
+    def render(self, values: dict, basepath=None) -> str:
+        """
+        Fill the slots with values and return the document.
+        Args:
+            values (dict): Slot name to text, e.g. {"Title": "Home", "Content": "<div>...</div>"}.
+            basepath (str): Root the site relative URLs are moved under, see iter_render.
+        Returns:
+            str: The rendered document.
+        """
+        return "".join(self.iter_render(values, basepath))
+
+    def write(self, sink, values: dict, basepath=None) -> None:
+        """Write the rendered document piece by piece to an open text file or buffer."""
+        sink.writelines(self.iter_render(values, basepath))
+
+    def is_current(self) -> bool:
+        """Check that none of the files this template was compiled from changed since."""
+        for path, mtime_ns in self.dependencies.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+def _rebase_literals(pieces, basepath):
+    # The slots stay, only the literal HTML of the template has attributes to rewrite
+    replacement = r"\g<1>" + basepath.replace("\\", r"\\")
+    return [piece if isinstance(piece, Slot) else URL_ATTRIBUTE_REGEX.sub(replacement, piece) for piece in pieces]
+
+
+def _parse(text):
+    pieces = []
+    position = 0
+    for match in SLOT_REGEX.finditer(text):
+        pieces.append(text[position : match.start()])
+        pieces.append(Slot(match.group(1), match.group(0)))
+        position = match.end()
+    pieces.append(text[position:])
+    return pieces
+
+
+def _compile_file(path, dependencies, digest, stack):
+    if path in stack:
+        chain = " -> ".join(str(p) for p in stack + (path,))
+        raise ValueError(f"Template include loop: {chain}")
+    dependencies[str(path)] = os.stat(path).st_mtime_ns
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    digest.update(text.encode("utf-8"))
+
+    pieces = []
+    position = 0
+    for match in TAG_REGEX.finditer(text):
+        pieces.append(text[position : match.start()])
+        if match.group(1) is not None:
+            # Partials are looked up next to the file that includes them
+            partial_path = (path.parent / match.group(1)).resolve()
+            pieces.extend(_compile_file(partial_path, dependencies, digest, stack + (path,)))
+        else:
+            pieces.append(Slot(match.group(2), match.group(0)))
+        position = match.end()
+    pieces.append(text[position:])
+    return pieces
+
+
+def _merge_literals(pieces):
+    # Join neighbouring literal chunks (and drop empty ones) so rendering has less to do
+    merged = []
+    for piece in pieces:
+        if isinstance(piece, str):
+            if not piece:
+                continue
+            if merged and isinstance(merged[-1], str):
+                merged[-1] += piece
+                continue
+        merged.append(piece)
+    return merged
+
+
+def load_template(path) -> Template:
+    """
+    Return the compiled template for path, compiling it only when it is not cached yet
+    or when the template or one of its partials changed on disk since it was compiled.
+    Args:
+        path (str | Path): The template file.
+    Returns:
+        Template: The compiled template.
+    """
+    key = str(Path(path).resolve())
+    template = _TEMPLATE_CACHE.get(key)
+    if template is None or not template.is_current():
+        logger.info(f"Compiling template {key}")
+        template = Template.from_file(key)
+        _TEMPLATE_CACHE[key] = template
+    return template
+
+
+def clear_template_cache() -> None:
+    _TEMPLATE_CACHE.clear()
+
+
+def select_layout(relative_page_path, template_path, layouts_dir=None, name=None) -> Path:
+    """
+    Pick the layout for a page from the layouts directory, falling back to the default template.
+    The most specific layout wins, for content/blog/tom/index.md the candidates are:
+
+        layouts/blog/tom/index.html
+        layouts/blog/tom.html
+        layouts/blog.html
+        template.html
+
+    A page naming its layout in its front matter (layout: post) gets layouts/post.html instead.
+    Args:
+        relative_page_path (Path): The markdown path relative to the content directory.
+        template_path (Path): The default template.
+        layouts_dir (Path): The layouts directory, defaults to layouts/ next to the template.
+        name (str): The layout the page asks for, see read_metadata.
+    Returns:
+        Path: The layout to render the page with.
+    Raises:
+        FileNotFoundError: If the named layout does not exist or is not below layouts_dir.
+    """
+    template_path = Path(template_path)
+    layouts_dir = Path(layouts_dir) if layouts_dir is not None else template_path.parent / "layouts"
+    if name is not None:
+        name_path = Path(name)
+        # Only a layout below layouts/, "/tmp/x" would replace layouts_dir when joined to it
+        if name_path.is_absolute() or name_path.drive or ".." in name_path.parts:
+            raise FileNotFoundError(f"Layout {name!r} not found, it must be a name below {layouts_dir}")
+        layout_path = layouts_dir / f"{name}.html"
+        if not layout_path.is_file():
+            raise FileNotFoundError(f"Layout {name!r} not found, expected {layout_path}")
+        return layout_path
+    if not layouts_dir.is_dir():
+        return template_path
+    candidate = Path(relative_page_path).with_suffix("")
+    while candidate.parts:
+        layout_path = layouts_dir / candidate.parent / f"{candidate.name}.html"
+        if layout_path.is_file():
+            return layout_path
+        candidate = candidate.parent
+    return template_path
@@ -0,0 +1,131 @@
+# Tests for syncing static assets into the output directory
+# python imports
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# application imports
+from assets import sync_static, file_is_unchanged, walk_files, copy_file, copy_files, COPY_STRATEGIES
+from manifest import BuildManifest
+from output import DirectorySink
+
+
+class TestSyncStatic(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.static = self.root / "static"
+        self.docs = self.root / "docs"
+        (self.static / "images").mkdir(parents=True)
+        (self.static / "index.css").write_text("body {}")
+        (self.static / "images" / "tom.png").write_bytes(b"\x89PNG tom")
+        self.manifest = BuildManifest(self.root / "manifest.json")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def sync(self, checksum=False):
+        return sync_static(self.static, DirectorySink(self.docs), self.manifest, checksum)
+
+    def test_walk_files_sorted(self):
+        self.assertEqual(walk_files(self.static), [self.static / "images" / "tom.png", self.static / "index.css"])
+
+    def test_first_sync_copies_everything(self):
+        report = self.sync()
+        self.assertEqual(len(report.copied), 2)
+        self.assertEqual(report.skipped, 0)
+        self.assertEqual((self.docs / "images" / "tom.png").read_bytes(), b"\x89PNG tom")
+
+    def test_second_sync_touches_nothing(self):
+        self.sync()
+        mtime = os.stat(self.docs / "index.css").st_mtime_ns
+        inode = os.stat(self.docs / "index.css").st_ino
+        report = self.sync()
+        self.assertEqual(report.copied, [])
+        self.assertEqual(report.skipped, 2)
+        self.assertEqual(os.stat(self.docs / "index.css").st_mtime_ns, mtime)
+        self.assertEqual(os.stat(self.docs / "index.css").st_ino, inode)
+
+    def test_changed_file_is_copied(self):
+        self.sync()
+        (self.static / "index.css").write_text("body { color: red }")
+        report = self.sync()
+        self.assertEqual(report.copied, [self.docs / "index.css"])
+        self.assertEqual((self.docs / "index.css").read_text(), "body { color: red }")
+
+    def test_deleted_source_removes_output_only(self):
+        self.sync()
+        (self.docs / "index.html").write_text("generated page")
+        (self.static / "images" / "tom.png").unlink()
+        report = self.sync()
+        self.assertEqual(report.removed, [str(self.docs / "images" / "tom.png")])
+        self.assertFalse((self.docs / "images").exists())
+        # Files that did not come from static are left alone
+        self.assertTrue((self.docs / "index.html").exists())
+
+    def test_checksum_skips_same_content_with_new_mtime(self):
+        self.sync()
+        stat = os.stat(self.static / "index.css")
+        os.utime(self.static / "index.css", ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+        self.assertFalse(file_is_unchanged(self.static / "index.css", self.docs / "index.css"))
+        self.assertTrue(file_is_unchanged(self.static / "index.css", self.docs / "index.css", checksum=True))
+        self.assertEqual(self.sync(checksum=True).copied, [])
+        # The copy took the new time, so the files are not hashed again
+        self.assertEqual(os.stat(self.docs / "index.css").st_mtime_ns, os.stat(self.static / "index.css").st_mtime_ns)
+        self.assertEqual(self.sync().copied, [])
+
+    def test_missing_output_is_copied(self):
+        self.sync()
+        (self.docs / "index.css").unlink()
+        self.assertEqual(self.sync().copied, [self.docs / "index.css"])
+
+
+class TestCopyStrategies(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.src = self.root / "src.png"
+        self.src.write_bytes(b"image bytes" * 1000)
+        os.utime(self.src, ns=(1_000_000_000, 1_000_000_000))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_every_strategy_copies_contents_and_mtime(self):
+        for strategy in COPY_STRATEGIES:
+            with self.subTest(strategy=strategy):
+                dest = self.root / f"{strategy}.png"
+                used = copy_file(self.src, dest, strategy)
+                self.assertIn(used, (strategy, "copy"))
+                self.assertEqual(dest.read_bytes(), self.src.read_bytes())
+                self.assertTrue(file_is_unchanged(self.src, dest))
+
+    def test_hardlink_shares_inode(self):
+        dest = self.root / "link.png"
+        self.assertEqual(copy_file(self.src, dest, "hardlink"), "hardlink")
+        self.assertEqual(os.stat(dest).st_ino, os.stat(self.src).st_ino)
+
+    def test_replacing_hardlink_does_not_touch_source(self):
+        dest = self.root / "link.png"
+        copy_file(self.src, dest, "hardlink")
+        other = self.root / "other.png"
+        other.write_bytes(b"other")
+        copy_file(other, dest, "copy")
+        self.assertEqual(dest.read_bytes(), b"other")
+        self.assertEqual(self.src.read_bytes(), b"image bytes" * 1000)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            copy_file(self.src, self.root / "dest.png", "teleport")
+
+    def test_copy_files_on_thread_pool(self):
+        pairs = [(self.src, self.root / "out" / f"dir{i % 3}" / f"{i}.png") for i in range(20)]
+        used = copy_files(pairs, "kernel", workers=4)
+        self.assertEqual(len(used), 20)
+        for _, dest in pairs:
+            self.assertEqual(dest.read_bytes(), self.src.read_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+# Tests for full and targeted site builds
+# python imports
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+# application imports
+from build import SiteBuild
+from extractor import BuildCancelled, PageGenerationError
+from manifest import BuildManifest
+from output import MemorySink
+
+
+class TestSiteBuild(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.content = self.root / "content"
+        self.static = self.root / "static"
+        self.docs = self.root / "docs"
+        self.template = self.root / "template.html"
+        (self.content / "blog").mkdir(parents=True)
+        self.static.mkdir()
+        (self.content / "index.md").write_text("# Home")
+        (self.content / "blog" / "post.md").write_text("# Post")
+        (self.static / "index.css").write_text("body {}")
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        self.builder = self.make_builder()
+        self.builder.run()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def make_builder(self):
+        manifest = BuildManifest.load(self.root / ".ssg" / "manifest.json")
+        return SiteBuild(self.content, self.static, self.template, self.docs, "/", manifest)
+
+    def test_run_builds_site(self):
+        self.assertTrue((self.docs / "index.html").is_file())
+        self.assertTrue((self.docs / "blog" / "post.html").is_file())
+        self.assertTrue((self.docs / "index.css").is_file())
+        self.assertEqual(self.make_builder().run(), [])
+
+    def test_changed_page_only(self):
+        mtime = os.stat(self.docs / "index.html").st_mtime_ns
+        (self.content / "blog" / "post.md").write_text("# Changed post")
+        written = self.builder.rebuild_paths([self.content / "blog" / "post.md"])
+        self.assertEqual(written, [self.docs / "blog" / "post.html"])
+        self.assertIn("Changed post", (self.docs / "blog" / "post.html").read_text())
+        self.assertEqual(os.stat(self.docs / "index.html").st_mtime_ns, mtime)
+
+    def test_deleted_page(self):
+        (self.content / "blog" / "post.md").unlink()
+        self.builder.rebuild_paths([self.content / "blog" / "post.md"])
+        self.assertFalse((self.docs / "blog").exists())
+        self.assertNotIn(str(self.docs / "blog" / "post.html"), self.builder.manifest.pages)
+
+    def test_new_and_deleted_asset(self):
+        (self.static / "app.js").write_text("alert(1)")
+        written = self.builder.rebuild_paths([self.static / "app.js"])
+        self.assertEqual(written, [self.docs / "app.js"])
+        (self.static / "index.css").unlink()
+        self.builder.rebuild_paths([self.static / "index.css"])
+        self.assertFalse((self.docs / "index.css").exists())
+        self.assertTrue((self.docs / "app.js").exists())
+
+    def test_template_change_rebuilds_pages(self):
+        self.template.write_text("<main>{{ Content }}</main>")
+        written = self.builder.rebuild_paths([self.template])
+        self.assertEqual(sorted(written), [self.docs / "blog" / "post.html", self.docs / "index.html"])
+
+    def test_new_directory_rescans_content(self):
+        (self.content / "new").mkdir()
+        (self.content / "new" / "index.md").write_text("# New")
+        written = self.builder.rebuild_paths([self.content / "new"])
+        self.assertEqual(written, [self.docs / "new" / "index.html"])
+
+    def test_ignore_file(self):
+        (self.content / "blog" / "draft.md").write_text("# Draft")
+        (self.static / "notes.txt").write_text("notes")
+        (self.content / ".ssgignore").write_text("draft.md\n")
+        (self.static / ".ssgignore").write_text("*.txt\n")
+        written = self.builder.rebuild_paths([self.content / ".ssgignore", self.static / ".ssgignore"])
+        self.assertEqual(written, [])
+        self.assertFalse((self.docs / ".ssgignore").exists())
+        # An ignored file is skipped even when a watcher reports it
+        self.assertEqual(self.builder.rebuild_paths([self.content / "blog" / "draft.md"]), [])
+        (self.content / ".ssgignore").write_text("")
+        written = self.builder.rebuild_paths([self.content / ".ssgignore"])
+        self.assertEqual(written, [self.docs / "blog" / "draft.html"])
+
+    def test_front_matter(self):
+        (self.root / "layouts").mkdir()
+        (self.root / "layouts" / "post.html").write_text("<h6>{{ Title }}</h6>{{ Content }}")
+        post = self.content / "blog" / "post.md"
+        post.write_text("---\ntitle: The Post\nlayout: post\n---\n\n# Post\n\nText")
+        self.builder.rebuild_paths([post])
+        html = (self.docs / "blog" / "post.html").read_text()
+        self.assertEqual(html, "<h6>The Post</h6><div><h1>Post</h1><p>Text</p></div>")
+
+    def test_drafts(self):
+        post = self.content / "blog" / "post.md"
+        post.write_text("---\ndraft: true\n---\n# Post")
+        self.builder.rebuild_paths([post])
+        self.assertFalse((self.docs / "blog" / "post.html").exists())
+        self.assertEqual(self.make_builder().run(), [])
+        builder = self.make_builder()
+        builder.drafts = True
+        self.assertEqual(builder.run(), [self.docs / "blog" / "post.html"])
+
+    def test_broken_front_matter_fails_only_that_page(self):
+        (self.content / "blog" / "post.md").write_text("---\ndate: soon\n---\n# Post")
+        (self.content / "index.md").write_text("# Home again")
+        with self.assertRaises(PageGenerationError) as context:
+            self.make_builder().run()
+        self.assertEqual(context.exception.generated, [self.docs / "index.html"])
+        self.assertIn("FrontMatterError", context.exception.failures[0][1])
+        # The last good page stays until the front matter is fixed
+        self.assertTrue((self.docs / "blog" / "post.html").exists())
+
+    def test_cancelled_rebuild_leaves_page_stale(self):
+        (self.content / "index.md").write_text("# Home again")
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(BuildCancelled):
+            self.builder.rebuild_paths([self.content / "index.md"], cancel)
+        # The page is still considered stale and is built next time
+        self.assertEqual(self.builder.rebuild_paths([self.content / "index.md"]), [self.docs / "index.html"])
+
+
+class TestMemoryBuild(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.content = self.root / "content"
+        self.static = self.root / "static"
+        (self.content / "blog").mkdir(parents=True)
+        (self.static / "images").mkdir(parents=True)
+        (self.content / "index.md").write_text("# Home\n\n![tom](/images/tom.png)")
+        (self.content / "blog" / "post.md").write_text("# Post")
+        (self.static / "images" / "tom.png").write_bytes(b"\x89PNG tom")
+        self.template = self.root / "template.html"
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        self.inputs = sorted(self.root.rglob("*"))
+        self.sink = MemorySink(self.root / "docs")
+        self.builder = SiteBuild(
+            self.content, self.static, self.template, self.sink, "/base/", BuildManifest(None), jobs=2
+        )
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_build_writes_nothing_to_disk(self):
+        self.builder.run()
+        self.assertEqual(sorted(self.root.rglob("*")), self.inputs)
+        self.assertEqual(sorted(self.sink.files), ["blog/post.html", "images/tom.png", "index.html"])
+        self.assertIn(b'<img src="/base/images/tom.png"', self.sink.files["index.html"])
+        self.assertEqual(self.sink.read(self.root / "docs" / "images" / "tom.png"), b"\x89PNG tom")
+
+    def test_same_output_as_directory(self):
+        self.builder.run()
+        SiteBuild(self.content, self.static, self.template, self.root / "docs", "/base/", BuildManifest(None)).run()
+        docs = self.root / "docs"
+        on_disk = {path.relative_to(docs).as_posix(): path.read_bytes() for path in docs.rglob("*") if path.is_file()}
+        self.assertEqual(self.sink.files, on_disk)
+
+    def test_incremental_rebuilds(self):
+        self.builder.run()
+        self.assertEqual(self.builder.run(), [])
+        (self.content / "blog" / "post.md").write_text("# Changed")
+        (self.static / "images" / "tom.png").unlink()
+        written = self.builder.rebuild_paths([self.content / "blog" / "post.md", self.static / "images" / "tom.png"])
+        self.assertEqual(written, [self.root / "docs" / "blog" / "post.html"])
+        self.assertIn(b"Changed", self.sink.files["blog/post.html"])
+        self.assertNotIn("images/tom.png", self.sink.files)
+        (self.content / "blog" / "post.md").unlink()
+        self.builder.run()
+        self.assertEqual(sorted(self.sink.files), ["index.html"])
+
+    def test_precompress_needs_a_directory(self):
+        with self.assertRaises(ValueError):
+            SiteBuild(self.content, self.static, self.template, self.sink, precompress=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+# Tests for output precompression
+# python imports
+import gzip
+import os
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+
+# application imports
+import compress
+from build import SiteBuild
+from compress import ENCODINGS, precompress_file, precompress_tree
+from manifest import BuildManifest
+
+
+HTML = "<p>" + "the ring and the hobbit " * 100 + "</p>"
+
+
+class TestPrecompress(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.page = self.root / "page.html"
+        self.page.write_text(HTML)
+        self.gz = self.root / "page.html.gz"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def age(self, path, seconds=10**9):
+        os.utime(path, ns=(seconds, seconds))
+
+    def test_writes_smaller_variants(self):
+        report = precompress_file(self.page)
+        self.assertEqual(len(report.written), len(ENCODINGS))
+        self.assertEqual(gzip.decompress(self.gz.read_bytes()).decode(), HTML)
+        self.assertLess(self.gz.stat().st_size, self.page.stat().st_size)
+
+    def test_newer_variant_is_reused(self):
+        precompress_file(self.page)
+        self.gz.write_bytes(b"not touched")
+        report = precompress_file(self.page)
+        self.assertEqual((report.reused, report.written), (len(ENCODINGS), []))
+        self.assertEqual(self.gz.read_bytes(), b"not touched")
+
+    def test_changed_file_is_compressed_again(self):
+        precompress_file(self.page)
+        self.page.write_text(HTML + "<p>more</p>")
+        self.assertEqual(len(precompress_file(self.page).written), len(ENCODINGS))
+        self.assertTrue(gzip.decompress(self.gz.read_bytes()).decode().endswith("<p>more</p>"))
+
+    def test_replaced_file_with_older_mtime_is_compressed_again(self):
+        precompress_file(self.page)
+        # Copied in with its (older) modification time kept, like a static file
+        replacement = self.root / "new.html"
+        replacement.write_text(HTML + "<p>new</p>")
+        self.age(replacement)
+        os.replace(replacement, self.page)
+        precompress_file(self.page)
+        self.assertTrue(gzip.decompress(self.gz.read_bytes()).decode().endswith("<p>new</p>"))
+
+    def test_only_smaller_variants(self):
+        self.page.write_bytes(os.urandom(4096))
+        self.gz.write_bytes(b"stale")
+        self.age(self.gz)
+        report = precompress_file(self.page)
+        self.assertEqual(report.written, [])
+        self.assertEqual(report.not_smaller, len(ENCODINGS))
+        # An old variant of the file must not be served for it
+        self.assertFalse(self.gz.exists())
+
+    def test_tree_skips_and_cleans_up(self):
+        (self.root / "image.png").write_bytes(b"png" * 200)
+        (self.root / "small.css").write_text("body {}")
+        (self.root / "gone.html.gz").write_bytes(b"stale")
+        (self.root / "archive.tar.gz").write_bytes(b"kept")
+        (self.root / "shipped.json.gz").write_bytes(b"kept")
+        report = precompress_tree(self.root, jobs=1, keep={str(self.root / "shipped.json.gz")})
+        self.assertEqual(report.removed, [self.root / "gone.html.gz"])
+        names = sorted(path.name for path in self.root.iterdir())
+        expected = ["archive.tar.gz", "image.png", "page.html", "shipped.json.gz", "small.css"]
+        self.assertEqual(names, sorted(expected + [f"page.html{suffix}" for suffix in ENCODINGS]))
+
+    def test_files_without_variants_are_not_read_again(self):
+        for i in range(40):
+            (self.root / f"small{i}.css").write_text("body {}")
+            (self.root / f"random{i}.txt").write_bytes(os.urandom(1024))
+        incompressible = {}
+        precompress_tree(self.root, jobs=2, incompressible=incompressible)
+        self.assertEqual(len(incompressible), 40)
+        with (
+            mock.patch.object(compress, "ProcessPoolExecutor") as executor,
+            mock.patch.object(Path, "read_bytes") as read_bytes,
+        ):
+            report = precompress_tree(self.root, jobs=2, incompressible=incompressible)
+        executor.assert_not_called()
+        read_bytes.assert_not_called()
+        self.assertEqual((report.reused, report.not_smaller), (len(ENCODINGS), 80 * len(ENCODINGS)))
+        # A changed file is compressed again
+        (self.root / "random0.txt").write_text(HTML)
+        report = precompress_tree(self.root, jobs=1, incompressible=incompressible)
+        self.assertEqual(report.written, [self.root / f"random0.txt{suffix}" for suffix in ENCODINGS])
+        self.assertNotIn(str(self.root / "random0.txt"), incompressible)
+
+    def test_parallel_matches_serial(self):
+        for i in range(40):
+            (self.root / f"page{i}.html").write_text(HTML * (i + 1))
+        serial = self.root / "serial"
+        serial.mkdir()
+        for i in range(40):
+            (serial / f"page{i}.html").write_text(HTML * (i + 1))
+        precompress_tree(serial, jobs=1)
+        report = precompress_tree(self.root, jobs=2)
+        self.assertEqual(len(report.written), 41 * len(ENCODINGS))
+        for i in range(40):
+            name = f"page{i}.html.gz"
+            self.assertEqual((self.root / name).read_bytes(), (serial / name).read_bytes())
+
+
+class TestBuildPrecompress(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        (self.root / "content").mkdir()
+        (self.root / "static").mkdir()
+        (self.root / "content" / "index.md").write_text("# Home\n\n" + "Some text. " * 100)
+        (self.root / "static" / "index.css").write_text("body { margin: 0 }\n" * 50)
+        (self.root / "template.html").write_text("<title>{{ Title }}</title>{{ Content }}")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_build_precompresses_outputs(self):
+        manifest = BuildManifest.load(self.root / ".ssg" / "manifest.json")
+        builder = SiteBuild(
+            self.root / "content",
+            self.root / "static",
+            self.root / "template.html",
+            self.root / "docs",
+            "/",
+            manifest,
+            precompress=True,
+            compress_jobs=1,
+        )
+        builder.run()
+        self.assertTrue((self.root / "docs" / "index.html.gz").is_file())
+        self.assertTrue((self.root / "docs" / "index.css.gz").is_file())
+        report = builder.precompress_output()
+        self.assertEqual((report.reused, report.written), (2 * len(ENCODINGS), []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+# Tests for the build daemon and its client
+# python imports
+import asyncio
+import contextlib
+import io
+import json
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+# application imports
+from build import SiteBuild
+from client import main as client_main, send_request
+from daemon import BuildDaemon
+from manifest import BuildManifest
+
+
+class TestBuildDaemon(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.content = self.root / "content"
+        self.docs = self.root / "docs"
+        (self.content / "blog").mkdir(parents=True)
+        (self.root / "static").mkdir()
+        (self.content / "index.md").write_text("# Home\n\n[post](/blog/post.html)")
+        (self.content / "blog" / "post.md").write_text("# Post")
+        (self.root / "static" / "index.css").write_text("body {}")
+        self.template = self.root / "template.html"
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        self.manifest_path = self.root / ".ssg" / "manifest.json"
+        self.builder = SiteBuild(
+            self.content, self.root / "static", self.template, self.docs, "/", BuildManifest(self.manifest_path)
+        )
+        self.socket_path = self.root / ".ssg" / "daemon.sock"
+        self.daemon = BuildDaemon(self.builder, self.socket_path)
+        await self.daemon.start()
+
+    async def asyncTearDown(self):
+        await self.daemon.close()
+        self._tmp.cleanup()
+
+    async def request(self, **request):
+        return await asyncio.to_thread(send_request, request, self.socket_path, 10)
+
+    async def test_builds_on_request(self):
+        response = await self.request(action="build")
+        self.assertTrue(response["ok"])
+        self.assertEqual(
+            sorted(response["written"]), [str(self.docs / "blog" / "post.html"), str(self.docs / "index.html")]
+        )
+        self.assertTrue((self.docs / "index.css").is_file())
+        self.assertEqual((await self.request(action="build"))["written"], [])
+
+    async def test_rebuilds_paths(self):
+        await self.request(action="build")
+        source = self.content / "blog" / "post.md"
+        source.write_text("# Changed")
+        response = await self.request(action="build", paths=[str(source)])
+        self.assertEqual(response["written"], [str(self.docs / "blog" / "post.html")])
+        self.assertIn("Changed", (self.docs / "blog" / "post.html").read_text())
+        self.assertIsInstance(response["elapsed_ms"], float)
+
+    async def test_manifest_saved_after_the_response(self):
+        await self.request(action="build")
+        await self.daemon.close()
+        pages = json.loads(self.manifest_path.read_text())["pages"]
+        self.assertEqual(len(pages), 2)
+        self.assertFalse(self.socket_path.exists())
+
+    async def test_basepath_change_rebuilds_every_page(self):
+        await self.request(action="build")
+        response = await self.request(action="build", basepath="/base/", paths=[str(self.content / "index.md")])
+        self.assertEqual(len(response["written"]), 2)
+        self.assertIn('href="/base/blog/post.html"', (self.docs / "index.html").read_text())
+        for basepath in ("base/", "", 7):
+            response = await self.request(action="build", basepath=basepath)
+            self.assertFalse(response["ok"])
+            self.assertIn("is not a base path", response["error"])
+        self.assertEqual(self.daemon.builder.basepath, "/base/")
+
+    async def test_failed_page(self):
+        (self.content / "broken.md").write_text("no title")
+        response = await self.request(action="build")
+        self.assertFalse(response["ok"])
+        self.assertEqual(len(response["written"]), 2)
+        self.assertEqual(response["failures"][0][0], str(self.content / "broken.md"))
+
+    async def test_status_and_bad_requests(self):
+        await self.request(action="build")
+        status = await self.request(action="status")
+        self.assertEqual((status["ok"], status["builds"], status["pages"]), (True, 1, 2))
+        self.assertFalse((await self.request(action="dance"))["ok"])
+
+        def send_raw():
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(str(self.socket_path))
+                sock.sendall(b"not json\n")
+                return json.loads(sock.makefile("rb").readline())
+
+        self.assertIn("Invalid request", (await asyncio.to_thread(send_raw))["error"])
+
+    async def test_stop(self):
+        await self.request(action="stop")
+        await asyncio.wait_for(self.daemon.wait_stopped(), 5)
+
+    async def test_one_daemon_per_socket(self):
+        with self.assertRaises(RuntimeError):
+            await BuildDaemon(self.builder, self.socket_path).start()
+
+    async def test_stale_socket_is_replaced(self):
+        await self.daemon.close()
+        # Left behind by a daemon that was killed
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(str(self.socket_path))
+        self.daemon = BuildDaemon(self.builder, self.socket_path)
+        await self.daemon.start()
+        self.assertTrue((await self.request(action="status"))["ok"])
+
+    async def test_client(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            code = await asyncio.to_thread(client_main, ["build", "--socket", str(self.socket_path)])
+        self.assertEqual(code, 0)
+        self.assertIn(str(self.docs / "index.html"), output.getvalue())
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(client_main(["status", "--socket", str(self.root / "missing.sock")]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
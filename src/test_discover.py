@@ -0,0 +1,127 @@
+# Tests for scandir discovery, .ssgignore rules and the directory index
+# python imports
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# application imports
+import discover
+from discover import DirectoryIndex, IgnoreRules, scan_files
+
+
+class TestIgnoreRules(unittest.TestCase):
+    def test_patterns(self):
+        rules = IgnoreRules(["# drafts", "", "drafts/", "*.tmp", "!keep.tmp", "/notes.md", "blog/*/wip.md"])
+        self.assertTrue(rules.ignores("drafts", "drafts", True))
+        self.assertTrue(rules.ignores("blog/drafts", "drafts", True))
+        self.assertFalse(rules.ignores("drafts", "drafts", False))
+        self.assertTrue(rules.ignores("blog/x.tmp", "x.tmp", False))
+        self.assertFalse(rules.ignores("blog/keep.tmp", "keep.tmp", False))
+        self.assertTrue(rules.ignores("notes.md", "notes.md", False))
+        self.assertFalse(rules.ignores("blog/notes.md", "notes.md", False))
+        self.assertTrue(rules.ignores("blog/tom/wip.md", "wip.md", False))
+        self.assertFalse(rules.ignores("wip.md", "wip.md", False))
+
+    def test_ignores_path(self):
+        rules = IgnoreRules(["drafts/"])
+        self.assertTrue(rules.ignores_path(Path("blog/drafts/post.md")))
+        self.assertFalse(rules.ignores_path(Path("blog/post.md")))
+
+    def test_digest(self):
+        self.assertEqual(IgnoreRules(["*.tmp", "# note"]).digest, IgnoreRules(["*.tmp"]).digest)
+        self.assertNotEqual(IgnoreRules(["*.tmp"]).digest, IgnoreRules().digest)
+
+
+class TestScanFiles(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name) / "content"
+        for name in ("index.md", "a-b.md", "a/b.md", "a/c/d.md", "b.png", "drafts/x.md", "blog/post.tmp"):
+            (self.root / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / name).write_text(name)
+        self.past = time.time() - 60
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def age(self):
+        # The index only trusts directories that were not changed in the last seconds
+        for dirpath, _, _ in os.walk(self.root):
+            os.utime(dirpath, (self.past, self.past))
+
+    def test_sorted_like_paths(self):
+        files = scan_files(self.root)
+        self.assertEqual(files, sorted(path for path in self.root.rglob("*") if path.is_file()))
+        self.assertEqual(scan_files(self.root, suffixes=(".md",)), sorted(self.root.rglob("*.md")))
+        self.assertEqual(scan_files(self.root / "missing"), [])
+
+    def test_ignore_file(self):
+        (self.root / ".ssgignore").write_text("drafts/\n*.tmp\n")
+        files = [path.relative_to(self.root).as_posix() for path in scan_files(self.root)]
+        self.assertEqual(files, ["a/b.md", "a/c/d.md", "a-b.md", "b.png", "index.md"])
+        self.assertIn(self.root / "drafts" / "x.md", scan_files(self.root, use_ignore=False))
+
+    def test_symlinked_directory_followed(self):
+        os.symlink(self.root / "a", self.root / "link")
+        files = scan_files(self.root)
+        self.assertIn(self.root / "link" / "b.md", files)
+        self.assertIn(self.root / "link" / "c" / "d.md", files)
+        # A link back to a parent is listed once, not followed forever
+        os.symlink(self.root, self.root / "a" / "c" / "up")
+        with self.assertLogs(discover.logger, "WARNING"):
+            files = scan_files(self.root)
+        self.assertEqual(len(files), len(set(files)))
+        self.assertNotIn(self.root / "a" / "c" / "up" / "index.md", files)
+
+    def test_index_skips_unchanged_directories(self):
+        self.age()
+        index = DirectoryIndex(Path(self._tmp.name) / "files.json")
+        expected = scan_files(self.root, index)
+        index.save()
+        index = DirectoryIndex.load(index.path)
+        with mock.patch.object(discover, "_list_directory", wraps=discover._list_directory) as listed:
+            self.assertEqual(scan_files(self.root, index), expected)
+            self.assertEqual(listed.call_count, 0)
+            (self.root / "a" / "c" / "e.md").write_text("new")
+            (self.root / "blog" / "post.tmp").unlink()
+            files = scan_files(self.root, index)
+            self.assertEqual(listed.call_count, 2)
+        self.assertIn(self.root / "a" / "c" / "e.md", files)
+        self.assertNotIn(self.root / "blog" / "post.tmp", files)
+
+    def test_index_does_not_trust_recent_directories(self):
+        index = DirectoryIndex(None)
+        scan_files(self.root, index)
+        self.assertEqual(index.listings(self.root, IgnoreRules().digest), {})
+
+    def test_ignore_change_lists_again(self):
+        self.age()
+        index = DirectoryIndex(None)
+        scan_files(self.root, index)
+        (self.root / ".ssgignore").write_text("drafts/\n")
+        # Same mtimes as when the listings were made, only the rules changed
+        self.age()
+        self.assertNotIn(self.root / "drafts" / "x.md", scan_files(self.root, index))
+
+    def test_unreadable_index(self):
+        path = Path(self._tmp.name) / "files.json"
+        path.write_text("{not json")
+        self.assertEqual(DirectoryIndex.load(path).trees, {})
+        path.write_text('{"version": 0, "trees": {"content": {}}}')
+        self.assertEqual(DirectoryIndex.load(path).trees, {})
+        self.assertEqual(DirectoryIndex.load(Path(self._tmp.name) / "missing.json").trees, {})
+
+    def test_save_leaves_no_temp_file(self):
+        path = Path(self._tmp.name) / "index" / "files.json"
+        index = DirectoryIndex(path)
+        scan_files(self.root, index)
+        index.save()
+        self.assertEqual([child.name for child in path.parent.iterdir()], ["files.json"])
+        self.assertEqual(DirectoryIndex.load(path).trees, index.trees)
+
+
+if __name__ == "__main__":
+    unittest.main()
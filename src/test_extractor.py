@@ -1,10 +1,12 @@
 # Tests for Extractor Logic
 # python imports
+import tempfile
 import unittest
+from pathlib import Path
 
 
 # application imports
-from extractor import extract_title
+from extractor import extract_title, find_markdown_pages, generate_page, render_pages, PageGenerationError
 
 
 class TestMarkdownExtractor(unittest.TestCase):
@@ -36,3 +38,71 @@ class TestMarkdownExtractor(unittest.TestCase):
         with self.assertRaises(ValueError) as context:
             extract_title(md)
             self.assertEqual(str(context.exception), "Title text not found in markdown string.")
+
+
+class TestRenderPages(unittest.TestCase):
+    # <------ Test cases for serial and parallel page rendering ------>
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.content = self.root / "content"
+        self.template = self.root / "template.html"
+        self.template.write_text('<title>{{ Title }}</title><a href="/x">{{ Content }}</a>')
+        for i in range(5):
+            page = self.content / f"post{i}" / "index.md"
+            page.parent.mkdir(parents=True)
+            page.write_text(f"# Post {i}\n\nSome **bold** and a [link](/post{i})")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def read_tree(self, root):
+        return {str(path.relative_to(root)): path.read_bytes() for path in sorted(root.rglob("*.html"))}
+
+    def test_parallel_matches_serial(self):
+        render_pages(find_markdown_pages(self.content, self.root / "serial"), self.template, "/base/", jobs=1)
+        render_pages(find_markdown_pages(self.content, self.root / "parallel"), self.template, "/base/", jobs=2)
+        serial = self.read_tree(self.root / "serial")
+        self.assertEqual(len(serial), 5)
+        self.assertEqual(serial, self.read_tree(self.root / "parallel"))
+
+    def test_errors_reported_per_page(self):
+        (self.content / "post1" / "index.md").write_text("no title here")
+        (self.content / "post3" / "index.md").write_text("")
+        pages = find_markdown_pages(self.content, self.root / "docs")
+        with self.assertRaises(PageGenerationError) as context:
+            render_pages(pages, self.template, "/", jobs=2)
+        sources = [source for source, _ in context.exception.failures]
+        self.assertEqual(sources, [self.content / "post1" / "index.md", self.content / "post3" / "index.md"])
+        self.assertIn(str(self.content / "post1" / "index.md"), str(context.exception))
+        # The good pages are still written
+        self.assertEqual(len(self.read_tree(self.root / "docs")), 3)
+
+    def test_failed_page_keeps_previous_output(self):
+        source = self.content / "post0" / "index.md"
+        dest = self.root / "docs" / "index.html"
+        dest.parent.mkdir()
+        generate_page(source, self.template, dest, "/")
+        before = dest.read_bytes()
+        # The title is fine, the error only shows up while the content is streamed
+        source.write_text("# Post 0\n\nFine\n\nan _unclosed emphasis")
+        with self.assertRaises(Exception):
+            generate_page(source, self.template, dest, "/")
+        self.assertEqual(dest.read_bytes(), before)
+        self.assertEqual([path.name for path in dest.parent.iterdir()], ["index.html"])
+
+    def test_basepath_does_not_touch_code_samples(self):
+        source = self.content / "post0" / "index.md"
+        source.write_text(
+            "# Post 0\n\n[home](/) and ![tom](/images/tom.png)\n\n"
+            '```\n<a href="/about">About</a>\n<img src="/logo.png">\n```\n\n'
+            'Inline `<link href="/x.css">` too'
+        )
+        dest = self.root / "index.html"
+        generate_page(source, self.template, dest, "/base/")
+        html = dest.read_text()
+        self.assertIn('<a href="/base/x">', html)
+        self.assertIn('<a href="/base/">home</a>', html)
+        self.assertIn('<img src="/base/images/tom.png" alt="tom">', html)
+        self.assertIn('<a href="/about">About</a>\n<img src="/logo.png">', html)
+        self.assertIn('<code><link href="/x.css"></code>', html)
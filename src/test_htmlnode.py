@@ -1,8 +1,9 @@
 # python imports
+import io
 import unittest
 
 # application imports
-from htmlnode import HTMLNode, LeafNode, ParentNode
+from htmlnode import HTMLNode, LeafNode, ParentNode, rebase_url
 
 
 class TestHTMLNode(unittest.TestCase):
@@ -36,6 +37,26 @@ class TestHTMLNode(unittest.TestCase):
         props_to_html_return = node.props_to_html()
         self.assertEqual(props_to_html_return, ' href="https://www.google.com" target="_blank"')
 
+    def test_compact_layout(self):
+        for node in (HTMLNode("p"), LeafNode("b", "x"), ParentNode("div", [])):
+            self.assertFalse(hasattr(node, "__dict__"))
+        with self.assertRaises(AttributeError):
+            LeafNode("b", "x").extra = 1
+
+    def test_tags_interned(self):
+        level = 2
+        self.assertIs(ParentNode(f"h{level}", []).tag, ParentNode("".join(["h", "2"]), []).tag)
+
+    def test_props_are_the_callers(self):
+        props = {}
+        node = LeafNode("p", "text", props)
+        self.assertIs(node.props, props)
+        self.assertEqual(node.to_html(), "<p>text</p>")
+        node.props["class"] = "x"
+        self.assertEqual(node.to_html(), '<p class="x">text</p>')
+        self.assertIn("props={})", repr(LeafNode("b", "x", {})))
+        self.assertIsNone(LeafNode("p", "text").props)
+
     def test_to_html_error(self):
         """
         test that to_html raises the NotImplementedError
@@ -112,6 +133,78 @@ class TestParentNode(unittest.TestCase):
         with self.assertRaises(ValueError):
             parent_node.to_html()
 
+    # Streaming serialization
+    def test_iter_html_matches_to_html(self):
+        link = LeafNode("a", "link", {"href": "/home"})
+        parent_node = ParentNode("div", [ParentNode("p", [LeafNode(None, "text "), link])], {"class": "x"})
+        chunks = list(parent_node.iter_html())
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), parent_node.to_html())
+
+    def test_write_html_to_sink(self):
+        parent_node = ParentNode(
+            "ul", [ParentNode("li", [LeafNode("b", "one")]), ParentNode("li", [LeafNode("i", "two")])]
+        )
+        sink = io.StringIO()
+        parent_node.write_html(sink)
+        self.assertEqual(sink.getvalue(), "<ul><li><b>one</b></li><li><i>two</i></li></ul>")
+
+    # Deep trees render without recursion
+    def test_deep_tree_past_recursion_limit(self):
+        depth = 5000
+        node = LeafNode("b", "deep")
+        for _ in range(depth):
+            node = ParentNode("span", [node])
+        self.assertEqual(node.to_html(), "<span>" * depth + "<b>deep</b>" + "</span>" * depth)
+        self.assertTrue(repr(node).startswith("ParentNode(tag=span, children=[ParentNode(tag=span"))
+
+    def test_repr_matches_nested_format(self):
+        leaf = LeafNode("a", "x", {"href": "/"})
+        inner = ParentNode("p", [leaf, LeafNode(None, "y")])
+        node = HTMLNode("div", None, [inner], {"class": "c"})
+        self.assertEqual(
+            repr(node),
+            "HTMLNode(tag=div, value=None, children=[ParentNode(tag=p, children=["
+            "LeafNode(tag=a, value=x, props={'href': '/'}), LeafNode(tag=None, value=y, props=None)"
+            "], props=None)], props={'class': 'c'})",
+        )
+        self.assertEqual(repr(ParentNode("b", None)), "ParentNode(tag=b, children=None, props=None)")
+        self.assertEqual(repr(ParentNode("b", [])), "ParentNode(tag=b, children=[], props=None)")
+
+    def test_iter_html_errors(self):
+        with self.assertRaises(ValueError):
+            list(ParentNode("b", None).iter_html())
+        with self.assertRaises(ValueError):
+            list(ParentNode("div", [LeafNode("p", None)]).iter_html())
+        with self.assertRaises(NotImplementedError):
+            HTMLNode("p").write_html(io.StringIO())
+
+    def test_rebase_url(self):
+        self.assertEqual(rebase_url("/blog/tom", "/site/"), "/site/blog/tom")
+        self.assertEqual(rebase_url("/", "/site/"), "/site/")
+        self.assertEqual(rebase_url("//cdn.example.com/x.js", "/site/"), "//cdn.example.com/x.js")
+        self.assertEqual(rebase_url("https://boot.dev", "/site/"), "https://boot.dev")
+        self.assertEqual(rebase_url("images/tom.png", "/site/"), "images/tom.png")
+
+    def test_basepath_applied_to_url_props(self):
+        node = ParentNode(
+            "p",
+            [
+                LeafNode("a", "home", {"href": "/", "title": "/not/a/url"}),
+                LeafNode("img", "", {"src": "/images/tom.png", "alt": "/tom"}),
+                LeafNode("code", 'href="/literal"'),
+            ],
+            {"href": "/parent"},
+        )
+        self.assertEqual(
+            node.to_html("/site/"),
+            '<p href="/site/parent"><a href="/site/" title="/not/a/url">home</a>'
+            '<img src="/site/images/tom.png" alt="/tom"></img><code>href="/literal"</code></p>',
+        )
+        self.assertEqual("".join(node.iter_html("/site/")), node.to_html("/site/"))
+        # The default basepath changes nothing
+        self.assertEqual(node.to_html("/"), node.to_html())
+
 
 if __name__ == "__main__":
     unittest.main()
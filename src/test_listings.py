@@ -0,0 +1,167 @@
+# Tests for the generated blog, tag and archive listing pages
+# python imports
+import tempfile
+import unittest
+from pathlib import Path
+
+# application imports
+from build import SiteBuild
+from listings import collect_posts, plan_listings, tag_slug
+from manifest import BuildManifest
+from metadata import SiteMetadata
+from output import MemorySink
+
+
+def post(number, tags=()):
+    return (f"2024-01-{number:02d}", f"content/blog/{number}.md", f"/blog/{number}.html", f"Post {number}", list(tags))
+
+
+class TestPlanListings(unittest.TestCase):
+    def test_pagination_from_the_oldest(self):
+        posts = [post(number) for number in range(1, 6)]
+        listings = plan_listings(posts, Path("docs"), page_size=2)
+        pages = {dest.as_posix(): (titles, older, newer) for dest, _, titles, older, newer in listings}
+        self.assertEqual(
+            sorted(pages),
+            [
+                "docs/blog/index.html",
+                "docs/blog/page/1/index.html",
+                "docs/blog/page/2/index.html",
+                "docs/blog/page/3/index.html",
+            ],
+        )
+        self.assertEqual(pages["docs/blog/index.html"], ([post(5), post(4)], "/blog/page/2/", None))
+        self.assertEqual(pages["docs/blog/page/1/index.html"], ([post(2), post(1)], None, "/blog/page/2/"))
+        self.assertEqual(pages["docs/blog/page/3/index.html"], ([post(5)], "/blog/page/2/", "/blog/"))
+        # A new post leaves the full archive pages as they were
+        more = plan_listings(posts + [post(6)], Path("docs"), page_size=2)
+        self.assertEqual(more[1:3], listings[1:3])
+
+    def test_no_archive_when_everything_fits(self):
+        listings = plan_listings([post(1), post(2)], Path("docs"), page_size=2)
+        self.assertEqual(listings, [(Path("docs/blog/index.html"), "Blog", [post(2), post(1)], None, None)])
+
+    def test_tags(self):
+        self.assertEqual(tag_slug("Tom Bombadil!"), "tom-bombadil")
+        self.assertEqual(tag_slug("Café"), "café")
+        posts = [post(1, ["Tom Bombadil", "tom  bombadil"]), post(2, ["tom bombadil", "lotr"])]
+        listings = plan_listings(posts, Path("docs"), page_size=10)
+        pages = {dest.as_posix(): items for dest, _, items, _, _ in listings}
+        self.assertEqual(
+            pages["docs/tags/tom-bombadil/index.html"],
+            [post(2, ["tom bombadil", "lotr"]), post(1, ["Tom Bombadil", "tom  bombadil"])],
+        )
+        self.assertEqual(
+            pages["docs/tags/index.html"], [("lotr", "/tags/lotr/", 1), ("Tom Bombadil", "/tags/tom-bombadil/", 2)]
+        )
+
+    def test_different_tags_never_share_a_page(self):
+        posts = [post(1, ["日本"]), post(2, ["中国"]), post(3, ["c"]), post(4, ["C++"])]
+        tags = {dest.as_posix(): items for dest, _, items, _, _ in plan_listings(posts, Path("docs"))}
+        self.assertEqual(tags["docs/tags/日本/index.html"], [post(1, ["日本"])])
+        self.assertEqual(tags["docs/tags/中国/index.html"], [post(2, ["中国"])])
+        self.assertEqual(tags["docs/tags/c/index.html"], [post(3, ["c"])])
+        links = {name: url for name, url, _ in tags["docs/tags/index.html"]}
+        self.assertEqual(links["日本"], "/tags/%E6%97%A5%E6%9C%AC/")
+        self.assertRegex(links["C++"], r"^/tags/c-[0-9a-f]{8}/$")
+
+
+class TestCollectPosts(unittest.TestCase):
+    def test_from_the_metadata_index(self):
+        content = Path("content")
+        index = SiteMetadata(None)
+        page = {"title": None, "date": None, "tags": [], "draft": False, "layout": None}
+        index.pages = {
+            "content/blog/index.md": [1, 1, dict(page, title="Blog")],
+            "content/blog/tom/index.md": [1, 1, dict(page, title="Tom", date="2024-05-01")],
+            "content/blog/draft.md": [1, 1, dict(page, title="Draft", draft=True)],
+            "content/about.md": [1, 1, dict(page, title="About")],
+        }
+        self.assertEqual(
+            collect_posts(index, content), [("2024-05-01", "content/blog/tom/index.md", "/blog/tom/", "Tom", [])]
+        )
+        self.assertEqual(len(collect_posts(index, content, drafts=True)), 2)
+
+
+class TestListingBuild(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.content = self.root / "content"
+        self.docs = self.root / "docs"
+        (self.content / "blog").mkdir(parents=True)
+        (self.root / "static").mkdir()
+        self.template = self.root / "template.html"
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        for number in range(1, 6):
+            self.write_post(number, "lotr" if number % 2 else "tom")
+        self.sink = MemorySink(self.docs)
+        self.builder = SiteBuild(
+            self.content,
+            self.root / "static",
+            self.template,
+            self.sink,
+            "/base/",
+            BuildManifest(None),
+            listings=True,
+            listing_page_size=2,
+        )
+        self.builder.run()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write_post(self, number, tag, title=None):
+        path = self.content / "blog" / f"{number}.md"
+        path.write_text(f"---\ndate: 2024-01-{number:02d}\ntags: [{tag}]\n---\n# {title or f'Post {number}'}\n")
+        return path
+
+    def test_listing_pages(self):
+        html = self.sink.files["blog/index.html"].decode()
+        self.assertIn('<a href="/base/blog/5.html">Post 5</a> <time datetime="2024-01-05">2024-01-05</time>', html)
+        self.assertIn('<a href="/base/blog/page/2/" rel="next">Older posts</a>', html)
+        self.assertNotIn("Post 3", html)
+        self.assertIn("Post 1", self.sink.files["blog/page/1/index.html"].decode())
+        self.assertIn('<a href="/base/tags/tom/">tom</a> (2)', self.sink.files["tags/index.html"].decode())
+        self.assertEqual(self.builder.run(), [])
+
+    def test_changed_post_rewrites_its_listings_only(self):
+        post = self.write_post(1, "lotr", "Renamed")
+        written = self.builder.rebuild_paths([post])
+        self.assertEqual(
+            written,
+            [
+                self.docs / "blog" / "1.html",
+                self.docs / "blog" / "page" / "1" / "index.html",
+                self.docs / "tags" / "lotr" / "page" / "1" / "index.html",
+            ],
+        )
+        post.write_text("# Untagged\n")
+        written = self.builder.rebuild_paths([post])
+        self.assertIn(self.docs / "tags" / "index.html", written)
+        self.assertNotIn(self.docs / "tags" / "tom" / "index.html", written)
+
+    def test_drafts_and_deleted_tags(self):
+        for number in (2, 4):
+            (self.content / "blog" / f"{number}.md").write_text("---\ndraft: true\n---\n# Draft\n")
+        self.builder.run()
+        self.assertNotIn("tags/tom/index.html", self.sink.files)
+        self.assertNotIn("Draft", self.sink.files["blog/page/1/index.html"].decode())
+
+    def test_content_page_wins(self):
+        (self.content / "blog" / "index.md").write_text("# My own blog index")
+        self.builder.run()
+        self.assertIn(b"My own blog index", self.sink.files["blog/index.html"])
+        self.assertIn("blog/page/1/index.html", self.sink.files)
+        (self.content / "blog" / "index.md").unlink()
+        self.builder.run()
+        self.assertIn(b"Older posts", self.sink.files["blog/index.html"])
+
+    def test_turned_off(self):
+        self.builder.listings = False
+        self.builder.run()
+        self.assertEqual(sorted(self.sink.files), [f"blog/{number}.html" for number in range(1, 6)])
+
+
+if __name__ == "__main__":
+    unittest.main()
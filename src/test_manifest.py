@@ -0,0 +1,113 @@
+# Tests for the build manifest and incremental page generation
+# python imports
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# application imports
+from extractor import find_markdown_pages, generate_pages_incrementally
+from manifest import BuildManifest, hash_file
+
+
+TEMPLATE = "<html><title>{{ Title }}</title><body>{{ Content }}</body></html>"
+
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.content = self.root / "content"
+        self.docs = self.root / "docs"
+        self.template = self.root / "template.html"
+        self.manifest_path = self.root / ".ssg" / "manifest.json"
+        (self.content / "blog" / "tom").mkdir(parents=True)
+        (self.content / "index.md").write_text("# Home\n\nWelcome")
+        (self.content / "blog" / "tom" / "index.md").write_text("# Tom\n\nBombadil")
+        self.template.write_text(TEMPLATE)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def build(self, basepath="/", full=False):
+        manifest = BuildManifest.load(self.manifest_path)
+        generated = generate_pages_incrementally(self.content, self.template, self.docs, basepath, manifest, full)
+        manifest.save()
+        return generated
+
+    def test_find_markdown_pages_sorted(self):
+        pages = find_markdown_pages(self.content, self.docs)
+        self.assertEqual(
+            pages,
+            [
+                (self.content / "blog" / "tom" / "index.md", self.docs / "blog" / "tom" / "index.html"),
+                (self.content / "index.md", self.docs / "index.html"),
+            ],
+        )
+
+    def test_hash_file(self):
+        self.assertEqual(hash_file(self.template), hash_file(self.template))
+        self.assertNotEqual(hash_file(self.template), hash_file(self.content / "index.md"))
+
+    def test_first_build_generates_everything(self):
+        generated = self.build()
+        self.assertEqual(len(generated), 2)
+        self.assertIn("<h1>Home</h1>", (self.docs / "index.html").read_text())
+        self.assertTrue(self.manifest_path.is_file())
+
+    def test_unchanged_build_skips_everything(self):
+        self.build()
+        mtime = os.stat(self.docs / "index.html").st_mtime_ns
+        self.assertEqual(self.build(), [])
+        self.assertEqual(os.stat(self.docs / "index.html").st_mtime_ns, mtime)
+
+    def test_only_changed_source_is_rebuilt(self):
+        self.build()
+        (self.content / "index.md").write_text("# Home\n\nChanged")
+        self.assertEqual(self.build(), [self.docs / "index.html"])
+        self.assertIn("Changed", (self.docs / "index.html").read_text())
+
+    def test_template_change_rebuilds_all(self):
+        self.build()
+        self.template.write_text("<main>" + TEMPLATE + "</main>")
+        self.assertEqual(len(self.build()), 2)
+
+    def test_new_layout_rebuilds_only_its_pages(self):
+        self.build()
+        (self.root / "layouts").mkdir()
+        (self.root / "layouts" / "blog.html").write_text("<article>{{ Content }}</article>")
+        self.assertEqual(self.build(), [self.docs / "blog" / "tom" / "index.html"])
+        self.assertTrue((self.docs / "blog" / "tom" / "index.html").read_text().startswith("<article>"))
+
+    def test_basepath_change_rebuilds_all(self):
+        self.build()
+        self.assertEqual(len(self.build(basepath="/site/")), 2)
+
+    def test_missing_output_is_rebuilt(self):
+        self.build()
+        (self.docs / "index.html").unlink()
+        self.assertEqual(self.build(), [self.docs / "index.html"])
+
+    def test_deleted_source_removes_output(self):
+        self.build()
+        (self.content / "blog" / "tom" / "index.md").unlink()
+        self.build()
+        self.assertFalse((self.docs / "blog" / "tom" / "index.html").exists())
+        self.assertFalse((self.docs / "blog").exists())
+        self.assertTrue((self.docs / "index.html").exists())
+        manifest = BuildManifest.load(self.manifest_path)
+        self.assertEqual(list(manifest.pages), [str(self.docs / "index.html")])
+
+    def test_full_rebuilds_everything(self):
+        self.build()
+        self.assertEqual(len(self.build(full=True)), 2)
+
+    def test_corrupt_manifest_starts_fresh(self):
+        self.manifest_path.parent.mkdir(parents=True)
+        self.manifest_path.write_text("{not json")
+        manifest = BuildManifest.load(self.manifest_path)
+        self.assertEqual(manifest.pages, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+# Tests for front matter and the site metadata index
+# python imports
+import io
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# application imports
+import metadata
+from metadata import FrontMatterError, SiteMetadata, parse_front_matter, read_header, read_metadata
+
+
+class TestFrontMatter(unittest.TestCase):
+    def test_parse(self):
+        lines = [
+            "title: 'Tom: a mistake'",
+            "# a comment",
+            "date: 2024-05-01",
+            'tags: [lotr, "tom bombadil"]',
+            "draft: true",
+            "weight: 3",
+            "aliases:",
+            "  - /tom.html",
+            "  - /bombadil.html",
+        ]
+        self.assertEqual(
+            parse_front_matter(lines),
+            {
+                "title": "Tom: a mistake",
+                "date": "2024-05-01",
+                "tags": ["lotr", "tom bombadil"],
+                "draft": True,
+                "weight": 3,
+                "aliases": ["/tom.html", "/bombadil.html"],
+            },
+        )
+        with self.assertRaises(FrontMatterError):
+            parse_front_matter(["just words"])
+
+    def test_read_header(self):
+        f = io.StringIO("---\ntitle: Tom\n---\n\n# Tom\n\nBody")
+        self.assertEqual(read_header(f), ({"title": "Tom"}, "# Tom\n"))
+        self.assertEqual(f.read(), "# Tom\n\nBody")
+        f = io.StringIO("# Tom\n\nBody")
+        self.assertEqual(read_header(f), ({}, "# Tom\n"))
+        self.assertEqual(f.read(), "# Tom\n\nBody")
+        with self.assertRaises(FrontMatterError):
+            read_header(io.StringIO("---\ntitle: Tom\n\n# Tom"))
+
+
+class TestReadMetadata(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_defaults_and_title_line(self):
+        page = self.root / "page.md"
+        page.write_text("# Why Tom Bombadil Was a Mistake\n\nBody")
+        self.assertEqual(
+            read_metadata(page),
+            {"title": "Why Tom Bombadil Was a Mistake", "date": None, "tags": [], "draft": False, "layout": None},
+        )
+        page.write_text("---\ntags: lotr, tom\nlayout: post\ndate: 2024-05-01T10:00:00\n---\n# Tom\n")
+        self.assertEqual(read_metadata(page)["tags"], ["lotr", "tom"])
+        self.assertEqual(read_metadata(page)["date"], "2024-05-01T10:00:00")
+        for front_matter in ("date: May 1st", "draft: maybe"):
+            page.write_text(f"---\n{front_matter}\n---\n# Tom\n")
+            with self.assertRaises(FrontMatterError):
+                read_metadata(page)
+
+    def test_only_reads_the_header(self):
+        page = self.root / "big.md"
+        # Bytes that are not UTF-8 far below the header would fail the whole file to decode
+        page.write_bytes(b"---\ndate: 2024-05-01\n---\n# Big\n" + b"text\n" * 200_000 + b"\xff\xfe")
+        self.assertEqual(read_metadata(page)["title"], "Big")
+
+
+class TestSiteMetadata(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.page = self.root / "post.md"
+        self.page.write_text("---\ndate: 2024-05-01\n---\n# Post\n")
+        self.age(self.page)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def age(self, path):
+        # Pages changed in the last seconds are not trusted to the index
+        past = time.time() - 60
+        os.utime(path, (past, past))
+
+    def test_reads_changed_pages_only(self):
+        index = SiteMetadata(self.root / "metadata.json")
+        self.assertEqual(index.get(self.page)["date"], "2024-05-01")
+        index.save()
+        index = SiteMetadata.load(index.path)
+        with mock.patch.object(metadata, "read_metadata", wraps=metadata.read_metadata) as read:
+            self.assertEqual(index.get(self.page)["title"], "Post")
+            self.assertEqual(read.call_count, 0)
+            self.page.write_text("---\ndate: 2024-06-01\n---\n# Post\n")
+            self.assertEqual(index.get(self.page)["date"], "2024-06-01")
+            self.assertEqual(read.call_count, 1)
+        # Changed too recently to trust its mtime next time, see RACY_NS
+        self.assertIsNone(index.pages[str(self.page)][0])
+        self.assertEqual(index.get(self.page)["date"], "2024-06-01")
+
+    def test_retain_and_broken_pages(self):
+        index = SiteMetadata(None)
+        index.get(self.page)
+        other = self.root / "other.md"
+        other.write_text("---\ndraft: sometimes\n---\n# Other\n")
+        with self.assertRaises(FrontMatterError):
+            index.get(other)
+        index.retain([other])
+        self.assertEqual(index.pages, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+# Tests for the write-if-changed output writer
+# python imports
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# application imports
+from extractor import PageGenerationError, find_markdown_pages, generate_page, render_pages
+from output import DirectorySink, MemorySink, OutputWriter, stream_if_changed, write_if_changed
+
+
+class TestWriteIfChanged(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.path = self.root / "page.html"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def age(self, path):
+        # An old mtime so a rewrite is always visible
+        os.utime(path, ns=(10**9, 10**9))
+
+    def assert_no_tmp(self):
+        self.assertEqual([path.name for path in self.root.iterdir() if path.suffix == ".tmp"], [])
+
+    def test_write_if_changed(self):
+        self.assertTrue(write_if_changed(self.path, b"<p>one</p>"))
+        self.age(self.path)
+        self.assertFalse(write_if_changed(self.path, b"<p>one</p>"))
+        self.assertEqual(self.path.stat().st_mtime_ns, 10**9)
+        # Same size, different bytes
+        self.assertTrue(write_if_changed(self.path, b"<p>two</p>"))
+        self.assertEqual(self.path.read_bytes(), b"<p>two</p>")
+        self.assertNotEqual(self.path.stat().st_mtime_ns, 10**9)
+        self.assert_no_tmp()
+
+    def test_stream_if_changed(self):
+        self.assertTrue(stream_if_changed(self.path, iter(["<p>", "é", "</p>"])))
+        self.age(self.path)
+        self.assertFalse(stream_if_changed(self.path, iter(["<p>é", "</p>"])))
+        self.assertEqual(self.path.stat().st_mtime_ns, 10**9)
+        self.assertTrue(stream_if_changed(self.path, iter(["<p>e</p>"])))
+        self.assertEqual(self.path.read_text(encoding="utf-8"), "<p>e</p>")
+        self.assert_no_tmp()
+
+    def test_failed_stream_keeps_previous_file(self):
+        write_if_changed(self.path, b"old")
+
+        def chunks():
+            yield "new"
+            raise ValueError("render failed")
+
+        with self.assertRaises(ValueError):
+            stream_if_changed(self.path, chunks())
+        self.assertEqual(self.path.read_bytes(), b"old")
+        self.assert_no_tmp()
+
+    def test_writer_is_bounded(self):
+        release = threading.Event()
+        started = threading.Semaphore(0)
+
+        def slow_write(path, data):
+            started.release()
+            release.wait(5)
+            return write_if_changed(path, data)
+
+        with mock.patch("output.write_if_changed", slow_write):
+            writer = OutputWriter(workers=1, max_pending=2)
+            futures = [writer.submit(self.root / "a.html", b"a"), writer.submit(self.root / "b.html", b"b")]
+            started.acquire(timeout=5)
+            blocked = threading.Thread(target=lambda: futures.append(writer.submit(self.root / "c.html", b"c")))
+            blocked.start()
+            blocked.join(0.1)
+            # Two writes pending, the third waits for a free slot
+            self.assertTrue(blocked.is_alive())
+            release.set()
+            blocked.join(5)
+            writer.close()
+        self.assertEqual([future.result() for future in futures], [True, True, True])
+        self.assertEqual((self.root / "c.html").read_bytes(), b"c")
+
+    def test_writer_reports_errors(self):
+        with OutputWriter() as writer:
+            future = writer.submit(self.root / "missing" / "page.html", b"x")
+        self.assertIsInstance(future.exception(), FileNotFoundError)
+
+
+class TestSinks(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.static = self.root / "tom.png"
+        self.static.write_bytes(b"png")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_memory_sink(self):
+        sink = MemorySink(self.root / "docs")
+        page = self.root / "docs" / "blog" / "index.html"
+        self.assertTrue(sink.write(page, b"<p>one</p>"))
+        self.assertFalse(sink.write(page, b"<p>one</p>"))
+        self.assertTrue(sink.stream(page, iter(["<p>", "é</p>"])))
+        self.assertEqual(sink.files, {"blog/index.html": "<p>é</p>".encode()})
+        copy = self.root / "docs" / "tom.png"
+        self.assertFalse(sink.is_copy_of(self.static, copy))
+        sink.copy([(self.static, copy)])
+        self.assertTrue(sink.is_copy_of(self.static, copy))
+        os.utime(self.static, ns=(10**9, 10**9))
+        self.assertFalse(sink.is_copy_of(self.static, copy))
+        self.assertTrue(sink.is_copy_of(self.static, copy, checksum=True))
+        self.assertTrue(sink.remove(page))
+        self.assertFalse(sink.exists(page))
+        self.assertFalse(sink.remove(page))
+        self.assertEqual(list(self.root.iterdir()), [self.static])
+
+    def test_directory_sink_prunes_emptied_directories(self):
+        sink = DirectorySink(self.root / "docs")
+        page = self.root / "docs" / "blog" / "tom" / "index.html"
+        sink.make_dirs([page.parent])
+        self.assertTrue(sink.write(page, b"<p>tom</p>"))
+        self.assertTrue(sink.exists(page))
+        self.assertTrue(sink.remove(page))
+        self.assertEqual(list((self.root / "docs").iterdir()), [])
+        self.assertFalse(sink.remove(page))
+
+
+class TestPageOutput(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.content = self.root / "content"
+        self.template = self.root / "template.html"
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        for i in range(3):
+            page = self.content / f"post{i}" / "index.md"
+            page.parent.mkdir(parents=True)
+            page.write_text(f"# Post {i}\n\n" + "Some **bold** text.\n\n" * 50)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_unchanged_pages_keep_their_mtime(self):
+        pages = find_markdown_pages(self.content, self.root / "docs")
+        render_pages(pages, self.template, "/")
+        for _, dest in pages:
+            os.utime(dest, ns=(10**9, 10**9))
+        (self.content / "post1" / "index.md").write_text("# Post 1\n\nChanged")
+        render_pages(pages, self.template, "/")
+        mtimes = [dest.stat().st_mtime_ns == 10**9 for _, dest in pages]
+        self.assertEqual(mtimes, [True, False, True])
+
+    def test_big_page_streams_to_disk(self):
+        source = self.content / "post0" / "index.md"
+        generate_page(source, self.template, self.root / "buffered.html", "/")
+        with mock.patch("extractor.SPOOL_LIMIT", 100):
+            self.assertIsNone(generate_page(source, self.template, self.root / "streamed.html", "/"))
+        self.assertEqual((self.root / "streamed.html").read_bytes(), (self.root / "buffered.html").read_bytes())
+
+    def test_pages_into_memory(self):
+        sink = MemorySink(self.root / "docs")
+        pages = find_markdown_pages(self.content, self.root / "docs")
+        with mock.patch("extractor.SPOOL_LIMIT", 100):
+            render_pages(pages, self.template, "/", jobs=2, sink=sink)
+        self.assertEqual(sorted(sink.files), [f"post{i}/index.html" for i in range(3)])
+        self.assertFalse((self.root / "docs").exists())
+
+    def test_failed_write_fails_the_page(self):
+        pages = find_markdown_pages(self.content, self.root / "docs")
+        for _, dest in pages:
+            dest.parent.mkdir(parents=True)
+        # A directory where the page goes cannot be replaced by a file
+        pages[1][1].mkdir()
+        with self.assertRaises(PageGenerationError) as context:
+            render_pages(pages, self.template, "/")
+        self.assertEqual([source for source, _ in context.exception.failures], [pages[1][0]])
+        self.assertTrue(pages[0][1].is_file() and pages[2][1].is_file())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+# Tests for the on-disk parse cache
+# python imports
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+# application imports
+import extractor
+from build import SiteBuild
+from extractor import generate_page
+from htmlnode import LeafNode, ParentNode
+from main import cache_command
+from manifest import BuildManifest, hash_file
+from parsecache import ParseCache, decode_node, encode_node, iter_encoded_html
+from splitblocks import MarkdownStream, markdown_to_html_node, read_markdown_lines
+
+
+MARKDOWN = "# Title\n\nSome **bold** and a [link](/blog)\n\n```\ncode\n\nwith a blank line\n```\n\n- one\n- two\n"
+
+
+class UnreadableLines:
+    """Lines that fail the test if the parser ever reads them."""
+
+    def __iter__(self):
+        raise AssertionError("the markdown was parsed again")
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.cache = ParseCache(self.root / "cache")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def render(self, document, basepath=None):
+        return "".join(document.iter_html(basepath))
+
+    def stream(self, markdown=MARKDOWN):
+        return MarkdownStream(read_markdown_lines(io.StringIO(markdown)))
+
+    def test_encode_decode_round_trip(self):
+        node = markdown_to_html_node(MARKDOWN)
+        decoded = decode_node(encode_node(node))
+        self.assertEqual(decoded.to_html(), node.to_html())
+        self.assertEqual(repr(decoded), repr(node))
+
+    def test_encode_decode_deep_tree(self):
+        node = LeafNode("b", "leaf", {})
+        for i in range(5000):
+            node = ParentNode("span", [LeafNode(None, str(i)), node], {"id": str(i)} if i % 2 else None)
+        self.assertEqual(decode_node(encode_node(node)).to_html(), node.to_html())
+
+    def test_iter_encoded_html_matches_nodes(self):
+        node = markdown_to_html_node(MARKDOWN)
+        for basepath in (None, "/", "/site/"):
+            self.assertEqual(list(iter_encoded_html(encode_node(node), basepath)), list(node.iter_html(basepath)))
+        empty = ParentNode("ul", [], {"class": "x"})
+        self.assertEqual("".join(iter_encoded_html(encode_node(empty))), empty.to_html())
+        with self.assertRaises(ValueError):
+            list(iter_encoded_html(encode_node(LeafNode("b", None))))
+
+    def test_miss_records_and_hit_does_not_parse(self):
+        expected = markdown_to_html_node(MARKDOWN).to_html("/site/")
+        self.assertEqual(self.render(self.cache.document("ab" * 32, self.stream()), "/site/"), expected)
+        self.assertEqual(self.cache.stats()["entries"], 1)
+        document = self.cache.document("ab" * 32, MarkdownStream(UnreadableLines()))
+        self.assertEqual(self.render(document, "/site/"), expected)
+        # The basepath is applied on render, the same entry serves any basepath
+        self.assertEqual(self.render(document), markdown_to_html_node(MARKDOWN).to_html())
+
+    def test_failed_render_leaves_no_entry(self):
+        with self.assertRaises(Exception):
+            self.render(self.cache.document("cd" * 32, self.stream("# Title\n\nan _unclosed")))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.assertEqual(list((self.root / "cache").rglob("*.tmp")), [])
+
+    def test_corrupt_entry_is_dropped(self):
+        self.render(self.cache.document("ef" * 32, self.stream()))
+        path = self.cache.path_for("ef" * 32)
+        path.write_bytes(path.read_bytes()[:-20])
+        with self.assertRaises(ValueError):
+            self.render(self.cache.document("ef" * 32, self.stream()))
+        self.assertFalse(path.exists())
+
+    def test_foreign_entry_is_parsed_again(self):
+        path = self.cache.path_for("01" * 32)
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"not marshal data")
+        html = self.render(self.cache.document("01" * 32, self.stream()))
+        self.assertEqual(html, markdown_to_html_node(MARKDOWN).to_html())
+        self.assertEqual(self.render(self.cache.document("01" * 32, MarkdownStream(UnreadableLines()))), html)
+
+    def test_prune_evicts_least_recently_used(self):
+        for i, key in enumerate(("aa", "bb", "cc")):
+            self.render(self.cache.document(key * 32, self.stream()))
+            os.utime(self.cache.path_for(key * 32), ns=(i * 10**9, i * 10**9))
+        # Reading "aa" makes it the most recently used
+        self.cache.document("aa" * 32, self.stream())
+        size = self.cache.path_for("aa" * 32).stat().st_size
+        self.cache.max_bytes = 2 * size
+        self.assertEqual(self.cache.prune(), [self.cache.path_for("bb" * 32)])
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+    def test_clear(self):
+        self.render(self.cache.document("aa" * 32, self.stream()))
+        self.assertEqual(self.cache.clear(), 1)
+        self.assertEqual(
+            self.cache.stats(),
+            {"path": str(self.root / "cache"), "entries": 0, "bytes": 0, "max_bytes": self.cache.max_bytes},
+        )
+
+    def test_same_markdown_recorded_on_two_threads(self):
+        barrier = threading.Barrier(2)
+
+        def lines():
+            # Both threads are writing their entry before either one finishes
+            for i, line in enumerate(read_markdown_lines(io.StringIO(MARKDOWN))):
+                if i == 3:
+                    barrier.wait(timeout=5)
+                yield line
+
+        def render():
+            return self.render(self.cache.document("bc" * 32, MarkdownStream(lines())))
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(lambda _: render(), range(2)))
+        expected = markdown_to_html_node(MARKDOWN).to_html()
+        self.assertEqual(results, [expected, expected])
+        self.assertEqual(self.render(self.cache.document("bc" * 32, MarkdownStream(UnreadableLines()))), expected)
+        self.assertEqual(
+            [path.name for path in self.cache.path_for("bc" * 32).parent.iterdir()],
+            [self.cache.path_for("bc" * 32).name],
+        )
+
+    def test_generate_page_with_cache(self):
+        source = self.root / "index.md"
+        source.write_text(MARKDOWN)
+        template = self.root / "template.html"
+        template.write_text('<link href="/index.css"><title>{{ Title }}</title>{{ Content }}')
+        generate_page(source, template, self.root / "plain.html", "/base/")
+        generate_page(source, template, self.root / "miss.html", "/base/", self.cache)
+        self.assertTrue(self.cache.path_for(hash_file(source)).is_file())
+        generate_page(source, template, self.root / "hit.html", "/base/", self.cache)
+        plain = (self.root / "plain.html").read_text()
+        self.assertEqual((self.root / "miss.html").read_text(), plain)
+        self.assertEqual((self.root / "hit.html").read_text(), plain)
+
+    def test_page_edited_after_hashing_is_not_recorded(self):
+        source = self.root / "index.md"
+        source.write_bytes(b"---\r\ntitle: Old\r\n---\r\n\r\n# Old\r\n\r\nOLD text\r\n")
+        old_hash = hash_file(source)
+        template = self.root / "template.html"
+        template.write_text("{{ Content }}")
+        # Edited between planning the page and rendering it
+        source.write_text("# New\n\nNEW text\n")
+        generate_page(source, template, self.root / "new.html", "/", self.cache, source_hash=old_hash)
+        self.assertFalse(self.cache.path_for(old_hash).exists())
+        # Reverted, the page is not rendered from the blocks of the newer markdown
+        source.write_bytes(b"---\r\ntitle: Old\r\n---\r\n\r\n# Old\r\n\r\nOLD text\r\n")
+        generate_page(source, template, self.root / "old.html", "/", self.cache, source_hash=old_hash)
+        self.assertTrue(self.cache.path_for(old_hash).is_file())
+        generate_page(source, template, self.root / "hit.html", "/", self.cache, source_hash=old_hash)
+        self.assertIn("OLD text", (self.root / "hit.html").read_text())
+
+    def test_build_hashes_each_page_once(self):
+        content = self.root / "content"
+        content.mkdir()
+        for name in ("a.md", "b.md"):
+            (content / name).write_text(MARKDOWN)
+        template = self.root / "template.html"
+        template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        docs = self.root / "docs"
+        builder = SiteBuild(content, self.root, template, docs, "/", BuildManifest(None), parse_cache=self.cache)
+        with mock.patch.object(extractor, "hash_file", wraps=extractor.hash_file) as hashed:
+            builder.generate_pages()
+        self.assertEqual(sorted(call.args[0].name for call in hashed.call_args_list), ["a.md", "b.md"])
+        self.assertTrue(self.cache.path_for(hash_file(content / "a.md")).is_file())
+
+    def test_cache_command(self):
+        self.render(self.cache.document("aa" * 32, self.stream()))
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            cache_command(["stats", "--cache-dir", str(self.root / "cache")])
+            cache_command(["clear", "--cache-dir", str(self.root / "cache")])
+        self.assertIn('"entries": 1', out.getvalue())
+        self.assertIn("Removed 1 parse cache entries", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
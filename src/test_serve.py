@@ -0,0 +1,199 @@
+# Tests for the development server
+# python imports
+import asyncio
+import gzip
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# application imports
+from build import SiteBuild
+from manifest import BuildManifest
+from serve import DevServer, PageCache, RenderedPage, accepts_gzip, etag_matches
+
+
+class TestHelpers(unittest.TestCase):
+    def test_accepts_gzip(self):
+        self.assertTrue(accepts_gzip("gzip, deflate, br"))
+        self.assertTrue(accepts_gzip("br;q=1.0, *;q=0.5"))
+        self.assertFalse(accepts_gzip("gzip;q=0, *"))
+        self.assertFalse(accepts_gzip("identity"))
+        self.assertFalse(accepts_gzip(None))
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"a", "b"', '"b"'))
+        self.assertTrue(etag_matches('W/"b"', '"b"'))
+        self.assertTrue(etag_matches("*", '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+
+    def test_page_cache_evicts_least_recently_used(self):
+        pages = PageCache(max_bytes=2500)
+        for key in "abc":
+            # Random bytes have no smaller gzip variant, each page is 1024 bytes
+            pages.put(key, RenderedPage(os.urandom(1024)))
+            pages.get("a")
+        self.assertEqual((("a" in pages), ("b" in pages), ("c" in pages)), (True, False, True))
+        self.assertEqual(pages.bytes, 2048)
+
+
+class TestDevServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.content = self.root / "content"
+        self.static = self.root / "static"
+        (self.content / "blog").mkdir(parents=True)
+        self.static.mkdir()
+        (self.content / "index.md").write_text("# Home\n\n" + "Some **bold** text. " * 30)
+        (self.content / "blog" / "post.md").write_text("# Post\n\nA [link](/blog)")
+        (self.static / "index.css").write_text("body { margin: 0 }\n" * 40)
+        self.template = self.root / "template.html"
+        self.template.write_text('<title>{{ Title }}</title><link href="/index.css">{{ Content }}')
+        self.builder = SiteBuild(
+            self.content, self.static, self.template, self.root / "docs", "/base/", BuildManifest(self.root / "m")
+        )
+        self.server = DevServer(self.builder, port=0, watch=False)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self._tmp.cleanup()
+
+    async def get(self, path, method="GET", **headers):
+        reader, writer = await asyncio.open_connection(self.server.host, self.server.port)
+        lines = [f"{method} {path} HTTP/1.1", "Host: test", "Connection: close"]
+        lines.extend(f"{name.replace('_', '-')}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        status_line, *header_lines = head.decode().split("\r\n")
+        response_headers = dict(line.split(": ", 1) for line in header_lines)
+        return int(status_line.split()[1]), response_headers, body
+
+    async def test_page_rendered_on_request_without_build(self):
+        status, headers, body = await self.get("/base/")
+        self.assertEqual(status, 200)
+        self.assertIn(b"<title>Home</title>", body)
+        # The basepath is applied like in a build
+        self.assertIn(b'href="/base/index.css"', body)
+        self.assertEqual(int(headers["Content-Length"]), len(body))
+        self.assertFalse((self.root / "docs").exists())
+        status, _, body = await self.get("/base/blog/post.html")
+        self.assertEqual((status, b"<title>Post</title>" in body), (200, True))
+
+    async def test_etag_and_not_modified(self):
+        _, headers, _ = await self.get("/base/index.html")
+        status, not_modified, body = await self.get("/base/index.html", If_None_Match=headers["ETag"])
+        self.assertEqual((status, body, not_modified["ETag"]), (304, b"", headers["ETag"]))
+
+    async def test_gzip_negotiation(self):
+        _, plain_headers, plain = await self.get("/base/")
+        status, headers, body = await self.get("/base/", Accept_Encoding="gzip, br")
+        self.assertEqual((status, headers["Content-Encoding"], headers["Vary"]), (200, "gzip", "Accept-Encoding"))
+        self.assertEqual(gzip.decompress(body), plain)
+        self.assertNotEqual(headers["ETag"], plain_headers["ETag"])
+        _, headers, _ = await self.get("/base/", Accept_Encoding="gzip;q=0")
+        self.assertNotIn("Content-Encoding", headers)
+
+    async def test_cached_until_invalidated(self):
+        await self.get("/base/blog/post.html")
+        source = self.content / "blog" / "post.md"
+        self.assertIn(source, self.server.pages)
+        source.write_text("# Changed\n")
+        _, _, body = await self.get("/base/blog/post.html")
+        self.assertIn(b"<title>Post</title>", body)
+        self.server.invalidate([source])
+        _, _, body = await self.get("/base/blog/post.html")
+        self.assertIn(b"<title>Changed</title>", body)
+        # A template change drops every page
+        self.server.invalidate([self.template])
+        self.assertEqual(len(self.server.pages), 0)
+
+    async def test_listings(self):
+        self.assertEqual((await self.get("/base/tags/"))[0], 404)
+        self.builder.listings = True
+        (self.content / "blog" / "draft.md").write_text("---\ndraft: true\ntags: [lotr]\n---\n# Draft\n")
+        status, _, body = await self.get("/base/blog/")
+        self.assertEqual(status, 200)
+        self.assertIn(b'<a href="/base/blog/post.html">Post</a>', body)
+        self.assertIn(b'<a href="/base/blog/draft.html">Draft</a>', body)
+        status, _, body = await self.get("/base/tags/lotr/")
+        self.assertEqual((status, b"Draft" in body, b"Post<" in body), (200, True, False))
+        # A changed post drops the listings, not the other pages
+        await self.get("/base/")
+        source = self.content / "blog" / "new.md"
+        source.write_text("# New\n")
+        self.server.invalidate([source])
+        self.assertEqual(len(self.server.pages), 1)
+        _, _, body = await self.get("/base/blog/")
+        self.assertIn(b"New", body)
+        # A page of content/ takes the place of a listing
+        (self.content / "blog" / "index.md").write_text("# My own blog index")
+        _, _, body = await self.get("/base/blog/")
+        self.assertIn(b"My own blog index", body)
+
+    async def test_concurrent_requests_share_one_render(self):
+        renders = []
+        render = self.server._render
+        self.server._render = lambda source: renders.append(source) or render(source)
+        results = await asyncio.gather(*(self.get("/base/") for _ in range(5)))
+        self.assertEqual({status for status, _, _ in results}, {200})
+        self.assertEqual(len(renders), 1)
+
+    async def test_static_file(self):
+        status, headers, body = await self.get("/base/index.css")
+        self.assertEqual((status, headers["Content-Type"]), (200, "text/css"))
+        self.assertEqual(body, (self.static / "index.css").read_bytes())
+        status, _, _ = await self.get("/base/index.css", If_None_Match=headers["ETag"])
+        self.assertEqual(status, 304)
+        status, headers, body = await self.get("/base/index.css", method="HEAD")
+        self.assertEqual((status, body, headers["Content-Length"]), (200, b"", str(len("body { margin: 0 }\n" * 40))))
+
+    async def test_static_gzip_sibling(self):
+        css = (self.static / "index.css").read_bytes()
+        (self.static / "index.css.gz").write_bytes(gzip.compress(css))
+        _, headers, body = await self.get("/base/index.css", Accept_Encoding="gzip")
+        self.assertEqual((headers["Content-Encoding"], gzip.decompress(body)), ("gzip", css))
+
+    async def test_not_found_and_redirects(self):
+        self.assertEqual((await self.get("/base/missing.html"))[0], 404)
+        self.assertEqual((await self.get("/elsewhere/"))[0], 404)
+        self.assertEqual((await self.get("/base/../template.html"))[0], 404)
+        (self.content / ".ssgignore").write_text("blog/\n")
+        self.assertEqual((await self.get("/base/blog/post.html"))[0], 404)
+        status, headers, _ = await self.get("/base/blog")
+        self.assertEqual((status, headers["Location"]), (301, "/base/blog/"))
+        self.assertEqual((await self.get("/base"))[2], b"")
+        self.assertEqual((await self.get("/base/", method="POST"))[0], 405)
+
+    async def test_nothing_outside_the_site(self):
+        (self.root / "secret.txt").write_text("secret")
+        (self.root / "secret.md").write_text("# Secret")
+        # %2F unquotes to a second slash, which would make the path absolute
+        for path in (self.root / "secret.txt", self.root / "secret.html"):
+            self.assertIsNone(self.server.resolve("/base//" + str(path).lstrip("/")))
+            self.assertEqual((await self.get("/base/%2F" + str(path).lstrip("/")))[0], 404)
+        self.assertIsNone(self.server.resolve("/base/blog//post.html"))
+        (self.static / "link.txt").symlink_to(self.root / "secret.txt")
+        self.assertEqual((await self.get("/base/link.txt"))[0], 404)
+
+    async def test_render_error(self):
+        (self.content / "broken.md").write_text("no title")
+        status, _, body = await self.get("/base/broken.html")
+        self.assertEqual(status, 500)
+        self.assertIn(b"Title symbol not found", body)
+
+    async def test_keep_alive(self):
+        reader, writer = await asyncio.open_connection(self.server.host, self.server.port)
+        for _ in range(2):
+            writer.write(b"GET /base/blog/post.html HTTP/1.1\r\nHost: test\r\n\r\n")
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+            self.assertIn(b"<title>Post</title>", await reader.readexactly(length))
+        writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# Tests for sharded builds and merging them
+# python imports
+import contextlib
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+# application imports
+from main import main
+from manifest import BuildManifest
+from output import DirectorySink
+from shard import SHARD_MANIFEST, Shard, ShardMergeError, merge_shards, shard_of
+
+
+class TestShard(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(Shard.parse("2/4"), Shard(2, 4))
+        self.assertEqual(Shard.parse("2/4").name, "2-of-4")
+        for spec in ("0/4", "5/4", "1/0", "2", "a/b", "-1/4"):
+            with self.assertRaises(ValueError):
+                Shard.parse(spec)
+
+    def test_stable_assignment(self):
+        # The same on every machine and run, builds on different runners must agree on it
+        self.assertEqual([shard_of(p, 4) for p in ("index.md", "blog/tom/index.md", "images/tom.png")], [3, 0, 1])
+        paths = [f"blog/post{i}/index.md" for i in range(400)]
+        owners = [[shard.index for shard in (Shard(1, 3), Shard(2, 3), Shard(3, 3)) if shard.owns(p)] for p in paths]
+        self.assertTrue(all(len(owner) == 1 for owner in owners))
+        # Spread evenly enough that no runner gets much more than its share
+        for index in (1, 2, 3):
+            self.assertGreater(sum(owner == [index] for owner in owners), 100)
+
+
+class TestShardedBuild(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self._cwd = contextlib.chdir(self.root)
+        self._cwd.__enter__()
+        for i in range(12):
+            page = Path("content") / "blog" / f"post{i}" / "index.md"
+            page.parent.mkdir(parents=True)
+            page.write_text(f"# Post {i}\n\n[home](/)")
+        Path("content/index.md").write_text("# Home")
+        Path("static/images").mkdir(parents=True)
+        for i in range(6):
+            Path(f"static/images/{i}.png").write_bytes(b"png %d" % i)
+        Path("template.html").write_text("<title>{{ Title }}</title>{{ Content }}")
+
+    def tearDown(self):
+        self._cwd.__exit__(None, None, None)
+        self._tmp.cleanup()
+
+    def site(self, directory="docs"):
+        root = Path(directory)
+        return {path.relative_to(root).as_posix(): path.read_bytes() for path in root.rglob("*") if path.is_file()}
+
+    def build_shards(self, count=3, basepath="/base/"):
+        for index in range(1, count + 1):
+            main(["--shard", f"{index}/{count}", "--no-cache", basepath])
+
+    def test_merged_shards_match_a_full_build(self):
+        main(["--no-cache", "/base/"])
+        expected = self.site()
+        for path in Path("docs").rglob("*.html"):
+            path.unlink()
+        self.build_shards()
+        outputs = [set(self.site(f"shards/{i}-of-3/docs")) for i in (1, 2, 3)]
+        self.assertEqual(sum(map(len, outputs)), len(expected))
+        self.assertTrue(all(outputs))
+        main(["merge"])
+        self.assertEqual(self.site(), expected)
+
+    def test_merge_removes_outputs_gone_from_the_shards(self):
+        self.build_shards()
+        main(["merge"])
+        Path("content/blog/post3/index.md").unlink()
+        self.build_shards()
+        main(["merge"])
+        self.assertNotIn("blog/post3/index.html", self.site())
+        self.assertEqual(len(self.site()), 12 + 6)
+
+    def test_missing_and_mixed_shards(self):
+        self.build_shards()
+        main(["--shard", "1/2", "--no-cache", "/base/"])
+        with self.assertRaises(ShardMergeError) as context:
+            merge_shards(
+                [Path("shards/1-of-3"), Path("shards/3-of-3"), Path("shards/1-of-2"), Path("shards/9-of-9")],
+                DirectorySink(Path("docs")),
+                BuildManifest(None),
+            )
+        problems = "\n".join(context.exception.problems)
+        self.assertIn("9-of-9: no readable shard.json", problems)
+        self.assertIn("split 2 and 3 ways", problems)
+        self.assertFalse(Path("docs").exists())
+        with self.assertRaises(SystemExit):
+            main(["merge", "shards/1-of-3", "shards/3-of-3"])
+        with self.assertRaises(ShardMergeError) as context:
+            merge_shards(
+                [Path("shards/1-of-3"), Path("shards/3-of-3")], DirectorySink(Path("docs")), BuildManifest(None)
+            )
+        self.assertEqual(context.exception.problems, ["Missing shard(s) 2 of 3"])
+
+    def test_collision(self):
+        self.build_shards(count=2)
+        # A page claimed by both shards, like shards built from different commits
+        manifest_path = Path("shards/2-of-2") / SHARD_MANIFEST
+        data = json.loads(manifest_path.read_text())
+        taken = next(iter(json.loads(Path("shards/1-of-2", SHARD_MANIFEST).read_text())["files"]))
+        data["files"][taken] = None
+        manifest_path.write_text(json.dumps(data))
+        with self.assertRaises(ShardMergeError) as context:
+            merge_shards(
+                [Path("shards/1-of-2"), Path("shards/2-of-2")], DirectorySink(Path("docs")), BuildManifest(None)
+            )
+        self.assertEqual(len(context.exception.problems), 1)
+        self.assertIn(f"Collision on {taken}", context.exception.problems[0])
+
+    def test_shard_cannot_watch(self):
+        with self.assertRaises(SystemExit):
+            main(["--shard", "1/2", "--watch"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,12 @@
 # Tests for splitmarkdown logic
 # python imports
+import io
 import unittest
 
 
 # application imports
-from splitblocks import markdown_to_blocks, block_to_block_type, markdown_to_html_node
+from splitblocks import markdown_to_blocks, block_to_block_type, markdown_to_html_node, scan_blocks
+from splitblocks import MarkdownStream, read_markdown_lines
 from splitblocks import BlockType
 
 
@@ -213,3 +215,95 @@ the **same** even with inline stuff
             "<div><pre><code>This is text that _should_ remain\n"
             "the **same** even with inline stuff\n</code></pre></div>",
         )
+
+    # <------ Test cases for the scan_blocks function ------>
+    def test_scan_blocks_classifies(self):
+        md = "# Title\n\n> quote\n\n- item\n\n1. first\n\n```\ncode\n```\n\ntext"
+        self.assertEqual(
+            [block_type for _, block_type in scan_blocks(md.split("\n"))],
+            [
+                BlockType.HEADING,
+                BlockType.QUOTE,
+                BlockType.UNORDERED_LIST,
+                BlockType.ORDERED_LIST,
+                BlockType.CODE,
+                BlockType.PARAGRAPH,
+            ],
+        )
+
+    def test_scan_blocks_whitespace_lines_do_not_split(self):
+        md = "first line\n   \nsecond line\n\n\n\n  \t\n\nlast"
+        self.assertEqual(markdown_to_blocks(md), ["first line\n   \nsecond line", "last"])
+
+    def test_block_to_block_type_not_quite(self):
+        self.assertEqual(block_to_block_type("####### seven"), BlockType.PARAGRAPH)
+        self.assertEqual(block_to_block_type("```\nunclosed"), BlockType.PARAGRAPH)
+        self.assertEqual(block_to_block_type("1.no space"), BlockType.PARAGRAPH)
+        self.assertEqual(block_to_block_type("```\n\n```"), BlockType.CODE)
+
+    def test_code_with_blank_lines(self):
+        md = """
+Before
+
+```
+def hello():
+
+    return "_world_"
+
+
+print(hello())
+```
+
+After
+"""
+        self.assertEqual(
+            markdown_to_blocks(md),
+            ["Before", '```\ndef hello():\n\n    return "_world_"\n\n\nprint(hello())\n```', "After"],
+        )
+        html = markdown_to_html_node(md).to_html()
+        self.assertEqual(
+            html,
+            '<div><p>Before</p><pre><code>def hello():\n\n    return "_world_"\n\n\nprint(hello())\n'
+            "</code></pre><p>After</p></div>",
+        )
+
+    def test_unclosed_fence_ends_at_blank_line(self):
+        md = "```\nnot closed\n\n# Heading\n\ntext"
+        self.assertEqual(
+            [block for block in scan_blocks(md.split("\n"))],
+            [
+                ("```\nnot closed", BlockType.PARAGRAPH),
+                ("# Heading", BlockType.HEADING),
+                ("text", BlockType.PARAGRAPH),
+            ],
+        )
+
+    # <------ Test cases for streaming a document from a file ------>
+    def test_read_markdown_lines(self):
+        # Like markdown.split("\n"), without the empty string after a final newline
+        cases = {"": [], "one": ["one"], "one\n": ["one"], "one\n\ntwo\n\n": ["one", "", "two", ""], "\n": [""]}
+        for md, lines in cases.items():
+            with self.subTest(md=md):
+                self.assertEqual(list(read_markdown_lines(io.StringIO(md))), lines)
+
+    def test_stream_matches_tree(self):
+        md = "# Title\n\n```\ncode\n\nmore code\n```\n\n- a\n- b\n\n> quote\n\n1. one\n\nlast **bold**\n"
+        stream = MarkdownStream(read_markdown_lines(io.StringIO(md)))
+        out = io.StringIO()
+        stream.write_html(out)
+        self.assertEqual(out.getvalue(), markdown_to_html_node(md).to_html())
+        self.assertIn("<p>last <b>bold</b></p>", out.getvalue())
+
+    def test_stream_renders_blocks_as_they_are_read(self):
+        read = []
+
+        def lines():
+            for line in ("# One", "", "two", "", "three"):
+                read.append(line)
+                yield line
+
+        chunks = MarkdownStream(lines()).iter_html()
+        self.assertEqual(next(chunks), "<div>")
+        self.assertEqual(next(chunks), "<h1>")
+        # Only the first block and the blank line that ends it have been read
+        self.assertEqual(read, ["# One", ""])
@@ -360,5 +360,68 @@ class TestSplitNode(unittest.TestCase):
         self.assertEqual(nodes, text_to_textnodes(text))
 
 
+def five_pass_text_to_textnodes(text):
+    nodes = [TextNode(text, TextType.NORMAL)]
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    return nodes
+
+
+class TestSinglePassTokenizer(unittest.TestCase):
+    CASES = [
+        "",
+        "plain text",
+        "**bold** and _italic_ and `code`",
+        "**bold with _italic_ inside**",
+        "****",
+        "[link with _underscores_](https://a.com/b_c)",
+        "![image **alt**](/img_1.png) and **bold**",
+        "![a](b)[c](d)![e](f)",
+        "wow![not a link](/x)",
+        "[t](u![x)](y) after",
+        "**a** [l](u) _b_ ![i](j) `c`",
+        "text\nwith **new\nlines**",
+    ]
+    ERRORS = [
+        ("_a **b** c_", "missing closing _"),
+        ("`a_b`", "missing closing _"),
+        ("`code with ** inside`", "missing closing **"),
+        ("open _italic [l](u) and **bold", "missing closing **"),
+        ("**a** `b", "missing closing `"),
+    ]
+
+    def test_matches_five_passes(self):
+        for text in self.CASES:
+            with self.subTest(text=text):
+                self.assertEqual(text_to_textnodes(text), five_pass_text_to_textnodes(text))
+
+    def test_same_errors_as_five_passes(self):
+        for text, message in self.ERRORS:
+            with self.subTest(text=text):
+                with self.assertRaises(Exception) as old:
+                    five_pass_text_to_textnodes(text)
+                with self.assertRaises(Exception) as new:
+                    text_to_textnodes(text)
+                self.assertEqual(str(new.exception), str(old.exception))
+                self.assertIn(message, str(new.exception))
+
+    def test_dense_paragraph(self):
+        text = " ".join(f"w{i} [l{i}](/u/{i}) **b{i}** _i{i}_ ![m{i}](/m/{i}.png) `c{i}`" for i in range(2000))
+        nodes = text_to_textnodes(text)
+        self.assertEqual(nodes, five_pass_text_to_textnodes(text))
+        self.assertEqual(len(nodes), 2000 * 10)
+        self.assertEqual(nodes[-1], TextNode(f"c{1999}", TextType.CODE))
+
+    def test_split_link_does_not_cut_into_image_with_same_text(self):
+        node = TextNode("![a](b) and [a](b)", TextType.NORMAL)
+        self.assertEqual(
+            split_nodes_link([node]),
+            [TextNode("![a](b) and ", TextType.NORMAL), TextNode("a", TextType.LINK, "b")],
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,143 @@
+# Tests for the compiled template engine
+# python imports
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# application imports
+from htmlnode import LeafNode, ParentNode
+from template import Template, Slot, load_template, clear_template_cache, select_layout
+
+
+class TestTemplate(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        clear_template_cache()
+
+    def tearDown(self):
+        clear_template_cache()
+        self._tmp.cleanup()
+
+    def test_compile_into_pieces(self):
+        template = Template.from_string("<title>{{ Title }}</title><main>{{Content}}</main>")
+        self.assertEqual(
+            template.pieces,
+            ["<title>", Slot("Title", "{{ Title }}"), "</title><main>", Slot("Content", "{{Content}}"), "</main>"],
+        )
+        self.assertEqual(template.slots(), ["Title", "Content"])
+
+    def test_render(self):
+        template = Template.from_string("<title>{{ Title }}</title><main>{{ Content }}</main>")
+        html = template.render({"Title": "Home", "Content": "<p>Hi</p>"})
+        self.assertEqual(html, "<title>Home</title><main><p>Hi</p></main>")
+
+    def test_render_values_are_not_rescanned(self):
+        template = Template.from_string("{{ Title }}|{{ Content }}")
+        self.assertEqual(template.render({"Title": "{{ Content }}", "Content": "x"}), "{{ Content }}|x")
+
+    def test_unknown_slot_left_untouched(self):
+        template = Template.from_string("<p>{{ Author }}</p>{{ Title }}")
+        self.assertEqual(template.render({"Title": "T"}), "<p>{{ Author }}</p>T")
+
+    def test_write_matches_render(self):
+        template = Template.from_string("<title>{{ Title }}</title>{{ Content }}")
+        values = {"Title": "Home", "Content": "<p>Hi</p>"}
+        sink = io.StringIO()
+        template.write(sink, values)
+        self.assertEqual(sink.getvalue(), template.render(values))
+
+    def test_render_streams_nodes(self):
+        template = Template.from_string("<title>{{ Title }}</title><main>{{ Content }}</main>")
+        node = ParentNode("div", [LeafNode("p", "Hi")])
+        chunks = list(template.iter_render({"Title": "Home", "Content": node}))
+        self.assertIn("<div>", chunks)
+        self.assertEqual("".join(chunks), "<title>Home</title><main><div><p>Hi</p></div></main>")
+
+    def test_render_with_basepath(self):
+        template = Template.from_string(
+            '<link href="/index.css"><script src="//cdn.example.com/x.js"></script>'
+            '<a data-href="/x" href="https://boot.dev">{{ Title }}</a>{{ Content }}'
+        )
+        node = ParentNode("div", [LeafNode("a", "Home", {"href": "/"}), LeafNode("code", 'src="/x"')])
+        html = template.render({"Title": 'href="/title"', "Content": node}, "/site/")
+        self.assertEqual(
+            html,
+            '<link href="/site/index.css"><script src="//cdn.example.com/x.js"></script>'
+            '<a data-href="/x" href="https://boot.dev">href="/title"</a>'
+            '<div><a href="/site/">Home</a><code>src="/x"</code></div>',
+        )
+        # The rewritten template is kept for the next page
+        self.assertIn("/site/", template._rebased)
+        self.assertEqual(
+            template.render({"Title": "T", "Content": node}, "/"), template.render({"Title": "T", "Content": node})
+        )
+
+    def test_include_partials(self):
+        (self.root / "partials").mkdir()
+        (self.root / "partials" / "head.html").write_text("<head><title>{{ Title }}</title></head>")
+        (self.root / "page.html").write_text(
+            '<html>{{ include "partials/head.html" }}<body>{{ Content }}</body></html>'
+        )
+        template = Template.from_file(self.root / "page.html")
+        self.assertEqual(
+            template.render({"Title": "T", "Content": "C"}),
+            "<html><head><title>T</title></head><body>C</body></html>",
+        )
+        self.assertEqual(len(template.dependencies), 2)
+
+    def test_include_loop(self):
+        (self.root / "a.html").write_text("{{ include b.html }}")
+        (self.root / "b.html").write_text("{{ include a.html }}")
+        with self.assertRaises(ValueError):
+            Template.from_file(self.root / "a.html")
+
+    def test_load_template_is_cached(self):
+        path = self.root / "page.html"
+        path.write_text("{{ Content }}")
+        self.assertIs(load_template(path), load_template(path))
+
+    def test_load_template_recompiles_on_change(self):
+        (self.root / "part.html").write_text("one")
+        path = self.root / "page.html"
+        path.write_text("{{ include part.html }}{{ Content }}")
+        first = load_template(path)
+        (self.root / "part.html").write_text("two")
+        # Make sure the mtime moves even on coarse timestamp filesystems
+        stat = os.stat(self.root / "part.html")
+        os.utime(self.root / "part.html", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        second = load_template(path)
+        self.assertIsNot(first, second)
+        self.assertNotEqual(first.digest, second.digest)
+        self.assertEqual(second.render({"Content": "!"}), "two!")
+
+    def test_select_layout(self):
+        template_path = self.root / "template.html"
+        layouts = self.root / "layouts"
+        (layouts / "blog").mkdir(parents=True)
+        (layouts / "blog.html").write_text("")
+        (layouts / "blog" / "tom.html").write_text("")
+        self.assertEqual(select_layout(Path("blog/tom/index.md"), template_path), layouts / "blog" / "tom.html")
+        self.assertEqual(select_layout(Path("blog/majesty/index.md"), template_path), layouts / "blog.html")
+        self.assertEqual(select_layout(Path("contact/index.md"), template_path), template_path)
+        self.assertEqual(select_layout(Path("index.md"), template_path), template_path)
+
+    def test_named_layout_stays_in_layouts(self):
+        template_path = self.root / "template.html"
+        (self.root / "layouts").mkdir()
+        (self.root / "layouts" / "post.html").write_text("")
+        (self.root / "outside.html").write_text("")
+        self.assertEqual(select_layout(Path("a.md"), template_path, name="post"), self.root / "layouts" / "post.html")
+        for name in (str(self.root / "outside"), "../outside", "missing"):
+            with self.assertRaises(FileNotFoundError):
+                select_layout(Path("a.md"), template_path, name=name)
+
+    def test_select_layout_without_layouts_dir(self):
+        template_path = self.root / "template.html"
+        self.assertEqual(select_layout(Path("blog/tom/index.md"), template_path), template_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
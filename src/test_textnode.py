@@ -22,6 +22,10 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("This is a text node", TextType.BOLD)
         self.assertNotEqual(node, node2)
 
+    def test_no_instance_dict(self):
+        node = TextNode("slotted", TextType.NORMAL)
+        self.assertFalse(hasattr(node, "__dict__"))
+
     # Test url parameter default
     def test_url_is_none(self):
         node = TextNode("Url is missing", TextType.ITALIC)
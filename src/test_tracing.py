@@ -0,0 +1,121 @@
+# Tests for build tracing
+# python imports
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# application imports
+import tracing
+from extractor import find_markdown_pages, generate_page, render_pages
+from parsecache import ParseCache
+
+
+class TestPageClock(unittest.TestCase):
+    def setUp(self):
+        self.tracer = tracing.Tracer()
+
+    def test_time_goes_to_innermost_stage(self):
+        clock = tracing.PageClock(self.tracer)
+
+        def slow(stage_seconds):
+            for _ in range(2):
+                time.sleep(stage_seconds)
+                yield "chunk"
+
+        outer = clock.timed(("".join(clock.timed(slow(0.01), "parse")) for _ in range(1)), "render")
+        clock.switch("write")
+        self.assertEqual(list(outer), ["chunkchunk"])
+        clock.finish("page.md")
+        totals = clock.totals
+        self.assertGreaterEqual(totals["parse"], 20_000_000)
+        # The sleeps are charged to parse only, not to the render iterator pulling from it
+        self.assertLess(totals["render"], totals["parse"])
+        self.assertEqual(sum(totals.values()), clock.mark - clock.start)
+
+    def test_page_events(self):
+        clock = tracing.PageClock(self.tracer)
+        clock.switch("write")
+        clock.finish("page.md", dest="page.html")
+        page, *stages = [event for event in self.tracer.events if event["ph"] == "X"]
+        self.assertEqual((page["name"], page["cat"], page["args"]), ("page.md", "page", {"dest": "page.html"}))
+        self.assertEqual([event["cat"] for event in stages], ["stage"] * len(stages))
+        self.assertEqual(page["pid"], os.getpid())
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.content = self.root / "content"
+        self.template = self.root / "template.html"
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        for i in range(4):
+            page = self.content / f"post{i}" / "index.md"
+            page.parent.mkdir(parents=True)
+            page.write_text(f"# Post {i}\n\nSome **bold** and a [link](/post{i})\n\n- a\n- b\n")
+
+    def tearDown(self):
+        tracing.stop_tracing()
+        self._tmp.cleanup()
+
+    def pages(self, tracer):
+        return sorted(event["name"] for event in tracer.events if event.get("cat") == "page")
+
+    def test_off_by_default(self):
+        self.assertIsNone(tracing.current_tracer())
+        self.assertIsNone(tracing.page_clock())
+        self.assertIs(tracing.span("static"), tracing.span("plan"))
+
+    def test_traced_page_has_every_stage(self):
+        tracer = tracing.start_tracing()
+        source = self.content / "post0" / "index.md"
+        generate_page(source, self.template, self.root / "post0.html", "/")
+        self.assertEqual(self.pages(tracer), [str(source)])
+        stages = [event["name"] for event in tracer.events if event.get("cat") == "stage"]
+        self.assertEqual(stages, ["read", "parse", "render", "template", "write"])
+
+    def test_traced_output_is_unchanged(self):
+        source = self.content / "post1" / "index.md"
+        generate_page(source, self.template, self.root / "plain.html", "/base/")
+        cache = ParseCache(self.root / "cache")
+        tracing.start_tracing()
+        generate_page(source, self.template, self.root / "miss.html", "/base/", cache)
+        generate_page(source, self.template, self.root / "hit.html", "/base/", cache)
+        plain = (self.root / "plain.html").read_text()
+        self.assertEqual((self.root / "miss.html").read_text(), plain)
+        self.assertEqual((self.root / "hit.html").read_text(), plain)
+
+    def test_worker_events_are_collected(self):
+        tracer = tracing.start_tracing()
+        pages = find_markdown_pages(self.content, self.root / "docs")
+        with mock.patch("extractor.RENDER_BATCH_SIZE", 1):
+            render_pages(pages, self.template, "/", jobs=2)
+        tracer.save(self.root / "trace.json")
+        self.assertEqual(self.pages(tracer), sorted(str(source) for source, _ in pages))
+        self.assertNotIn(os.getpid(), {event["pid"] for event in tracer.events if event.get("cat") == "page"})
+        # The spool of the workers is gone once collected
+        self.assertIsNone(tracer.spool_dir)
+        trace = json.loads((self.root / "trace.json").read_text())
+        names = {event["args"]["name"] for event in trace["traceEvents"] if event["ph"] == "M"}
+        self.assertIn("build", names)
+        self.assertTrue(any(name.startswith("worker") for name in names))
+
+    def test_summary(self):
+        tracer = tracing.start_tracing()
+        with tracing.span("render"):
+            for source, dest in find_markdown_pages(self.content, self.root / "docs"):
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                generate_page(source, self.template, dest, "/")
+        summary = tracer.summary(slowest=2)
+        self.assertIn("Traced 4 pages on 1 process(es)", summary)
+        self.assertIn("Slowest 2 pages:", summary)
+        for name in ("render", "parse", "template", "write"):
+            self.assertIn(f"  {name} ", summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+# Tests for watch mode
+# python imports
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# application imports
+from extractor import BuildCancelled
+from watch import PollingWatcher, InotifyWatcher, watch
+
+
+class FakeWatcher:
+    """Hands out prepared batches of changes, one per wait call."""
+
+    def __init__(self, batches, stop):
+        self.batches = list(batches)
+        self.stop = stop
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        if self.batches:
+            return self.batches.pop(0)
+        return set()
+
+    def close(self):
+        pass
+
+
+class RecordingBuilder:
+    def __init__(self, block_first=False):
+        self.calls = []
+        self.block_first = block_first
+        self.done = threading.Event()
+
+    def watch_paths(self):
+        return []
+
+    def rebuild_paths(self, changes, cancel=None):
+        self.calls.append(set(changes))
+        if self.block_first and len(self.calls) == 1:
+            # Stay busy until cancelled, like a long rebuild
+            cancel.wait(5)
+            raise BuildCancelled("cancelled")
+        self.done.set()
+        return list(changes)
+
+
+class TestWatchers(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        (self.root / "content").mkdir()
+        (self.root / "template.html").write_text("{{ Content }}")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def check_watcher(self, watcher):
+        try:
+            (self.root / "content" / "new.md").write_text("# New")
+            self.assertIn(self.root / "content" / "new.md", watcher.wait(2))
+            (self.root / "template.html").write_text("{{ Title }}")
+            self.assertIn(self.root / "template.html", watcher.wait(2))
+            (self.root / "other.txt").write_text("not watched")
+            self.assertEqual(watcher.wait(0.2), set())
+        finally:
+            watcher.close()
+
+    def test_polling_watcher(self):
+        watcher = PollingWatcher([self.root / "content", self.root / "template.html"], interval=0.05)
+        self.check_watcher(watcher)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_inotify_watcher(self):
+        self.check_watcher(InotifyWatcher([self.root / "content", self.root / "template.html"]))
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_inotify_watches_new_directories(self):
+        watcher = InotifyWatcher([self.root / "content"])
+        try:
+            (self.root / "content" / "blog").mkdir()
+            self.assertIn(self.root / "content" / "blog", watcher.wait(2))
+            (self.root / "content" / "blog" / "post.md").write_text("# Post")
+            self.assertIn(self.root / "content" / "blog" / "post.md", watcher.wait(2))
+        finally:
+            watcher.close()
+
+
+class TestWatchLoop(unittest.TestCase):
+    def run_watch(self, builder, batches):
+        stop = threading.Event()
+        thread = threading.Thread(target=watch, args=(builder, 0.05, FakeWatcher(batches, stop), stop))
+        thread.start()
+        builder.done.wait(5)
+        stop.set()
+        thread.join(5)
+
+    def test_burst_is_debounced_into_one_rebuild(self):
+        builder = RecordingBuilder()
+        self.run_watch(builder, [{Path("a.md")}, {Path("b.md")}])
+        self.assertEqual(builder.calls, [{Path("a.md"), Path("b.md")}])
+
+    def test_newer_change_cancels_running_rebuild(self):
+        builder = RecordingBuilder(block_first=True)
+        # a.md starts a rebuild, b.md arrives while it runs after enough idle polls
+        self.run_watch(builder, [{Path("a.md")}, set(), set(), set(), {Path("b.md")}])
+        self.assertEqual(builder.calls[0], {Path("a.md")})
+        self.assertEqual(builder.calls[-1], {Path("a.md"), Path("b.md")})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,6 +15,9 @@ class TextType(Enum):
 
 
 class TextNode:
+    # Slots instead of a per-instance __dict__, parsing a page creates lots of these
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
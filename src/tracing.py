@@ -0,0 +1,261 @@
+# python imports
+import contextlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Stages a page is split into, in the order they start, see PageClock
+PAGE_STAGES = ("read", "parse", "render", "template", "write")
+
+# The Tracer of this process while a build is traced, None otherwise. Everything in this module
+# checks it first, so a build without --trace only pays for that check (once per page or phase)
+_tracer = None
+# Shared no-op context manager returned by span() when nothing is traced
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """
+    Collects spans in the Chrome Trace Event format (chrome://tracing, https://ui.perfetto.dev):
+    one complete ("X") event per build phase and per page, with the process and thread ids, so
+    pages rendered on worker processes show up on a track of their own.
+
+    Worker processes spool their events to files in spool_dir, which the tracer of the main
+    process merges with collect().
+    """
+
+    def __init__(self, spool_dir=None, process_name="build"):
+        self.events = []
+        self.pid = os.getpid()
+        self.spool_dir = Path(spool_dir) if spool_dir is not None else None
+        self.events.append(
+            {"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": process_name}}
+        )
+
+    def complete(self, name, category, start_ns, end_ns, args=None) -> None:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self.pid,
+            "tid": threading.get_native_id(),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name, category="build", **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.complete(name, category, start, time.perf_counter_ns(), args)
+
+    def page(self, name, start_ns, end_ns, totals, args) -> None:
+        """
+        Record a page and the time it spent in each stage. Streaming interleaves the stages, so
+        they are drawn one after the other inside the page span, each as long as its total.
+        """
+        self.complete(name, "page", start_ns, end_ns, args)
+        offset = start_ns
+        for stage in PAGE_STAGES:
+            duration = totals.get(stage, 0)
+            if duration:
+                self.complete(stage, "stage", offset, offset + duration)
+                offset += duration
+
+    def worker_spool(self) -> Path:
+        """A directory for worker processes to spool their events in, see collect()."""
+        if self.spool_dir is None:
+            self.spool_dir = Path(tempfile.mkdtemp(prefix="ssg-trace-"))
+        return self.spool_dir
+
+    def flush(self) -> None:
+        """In a worker, append the events recorded so far to the spool of this process."""
+        if self.spool_dir is None or not self.events:
+            return
+        with open(self.spool_dir / f"{self.pid}.jsonl", "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(event) + "\n" for event in self.events)
+        self.events.clear()
+
+    def collect(self) -> None:
+        """In the main process, take in the events spooled by the workers."""
+        if self.spool_dir is None:
+            return
+        for path in sorted(self.spool_dir.glob("*.jsonl")):
+            with open(path, encoding="utf-8") as f:
+                self.events.extend(json.loads(line) for line in f)
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+        self.spool_dir = None
+
+    def save(self, path) -> None:
+        self.collect()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        logger.info(f"Wrote {len(self.events)} trace events to {path}")
+
+    def summary(self, slowest=10) -> str:
+        """The slowest pages and the time spent in each stage and build phase, as text."""
+        pages = [event for event in self.events if event.get("cat") == "page"]
+        stages, phases = {}, {}
+        for event in self.events:
+            if event.get("cat") == "stage":
+                stages[event["name"]] = stages.get(event["name"], 0) + event["dur"]
+            elif event.get("cat") == "build":
+                phases[event["name"]] = phases.get(event["name"], 0) + event["dur"]
+        lines = [f"Traced {len(pages)} pages on {len({event['pid'] for event in pages})} process(es)"]
+        if phases:
+            lines.append("Build phases:")
+            lines.extend(f"  {name:<16} {us / 1000:>10.1f} ms" for name, us in phases.items())
+        if stages:
+            total = sum(stages.values())
+            lines.append("Page stages (summed over pages and processes):")
+            for stage in PAGE_STAGES:
+                if stage in stages:
+                    lines.append(f"  {stage:<16} {stages[stage] / 1000:>10.1f} ms {stages[stage] / total:>6.1%}")
+        if pages:
+            lines.append(f"Slowest {min(slowest, len(pages))} pages:")
+            pages.sort(key=lambda event: event["dur"], reverse=True)
+            lines.extend(f"  {event['dur'] / 1000:>10.1f} ms  {event['name']}" for event in pages[:slowest])
+        return "\n".join(lines)
+
+
+class PageClock:
+    """
+    Splits the time of one page between its stages. Parsing, rendering, the template and the
+    writes take turns a chunk at a time, so the clock charges every interval to the stage
+    running at the time: the innermost iterator being pulled (see timed), else the current one.
+    """
+
+    __slots__ = ("tracer", "start", "mark", "stack", "totals")
+
+    def __init__(self, tracer, stage="read"):
+        self.tracer = tracer
+        self.start = self.mark = time.perf_counter_ns()
+        self.stack = [stage]
+        self.totals = {}
+
+    def _charge(self) -> None:
+        now = time.perf_counter_ns()
+        stage = self.stack[-1]
+        self.totals[stage] = self.totals.get(stage, 0) + now - self.mark
+        self.mark = now
+
+    def switch(self, stage) -> None:
+        """Charge what follows to stage."""
+        self._charge()
+        self.stack[-1] = stage
+
+    def timed(self, iterable, stage):
+        """Yield from iterable, charging the time spent producing each item to stage."""
+        iterator = iter(iterable)
+        while True:
+            self._charge()
+            self.stack.append(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._charge()
+                self.stack.pop()
+            yield item
+
+    def stream(self, stream):
+        """Charge building the nodes of a MarkdownStream to parse."""
+        return _TracedStream(stream, self)
+
+    def document(self, document):
+        """Charge turning a document into HTML to render (parse is charged on its own)."""
+        return _TracedDocument(document, self)
+
+    def finish(self, name, **args) -> None:
+        self._charge()
+        self.tracer.page(str(name), self.start, self.mark, self.totals, args)
+
+
+class _TracedStream:
+    __slots__ = ("stream", "clock")
+
+    def __init__(self, stream, clock):
+        self.stream = stream
+        self.clock = clock
+
+    def iter_nodes(self):
+        return self.clock.timed(self.stream.iter_nodes(), "parse")
+
+    def iter_html(self, basepath=None):
+        # As MarkdownStream.iter_html, over the timed nodes
+        yield "<div>"
+        for node in self.iter_nodes():
+            yield from node.iter_html(basepath)
+        yield "</div>"
+
+
+class _TracedDocument:
+    __slots__ = ("document", "clock")
+
+    def __init__(self, document, clock):
+        self.document = document
+        self.clock = clock
+
+    def iter_html(self, basepath=None):
+        return self.clock.timed(self.document.iter_html(basepath), "render")
+
+
+def start_tracing(spool_dir=None, process_name="build") -> Tracer:
+    """Trace everything this process does from now on, see stop_tracing."""
+    global _tracer
+    _tracer = Tracer(spool_dir, process_name)
+    return _tracer
+
+
+def stop_tracing() -> Tracer | None:
+    """Stop tracing, returning the tracer with what was recorded."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def current_tracer() -> Tracer | None:
+    return _tracer
+
+
+def span(name, category="build", **args):
+    """
+    A context manager recording a build phase (or, with another category, any other span),
+    a shared no-op when nothing is traced.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.span(name, category, **args)
+
+
+def page_clock() -> PageClock | None:
+    """A clock for the page about to be generated, None when nothing is traced."""
+    if _tracer is None:
+        return None
+    return PageClock(_tracer)
+
+
+def flush() -> None:
+    """Hand the events of a worker process to the main process, a no-op anywhere else."""
+    if _tracer is not None:
+        _tracer.flush()
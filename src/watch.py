@@ -0,0 +1,266 @@
+# python imports
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+# application imports
+from log_config import setup_logging
+from extractor import BuildCancelled, PageGenerationError
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Quiet period after the last event before a rebuild starts, editors save in bursts
+DEBOUNCE_SECONDS = 0.2
+POLL_INTERVAL_SECONDS = 0.5
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+)
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """
+    Portable watcher that compares (mtime, size) snapshots of the watched files.
+    """
+
+    def __init__(self, paths, interval=POLL_INTERVAL_SECONDS):
+        self.paths = [Path(path) for path in paths]
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict:
+        snapshot = {}
+        for root in self.paths:
+            if root.is_file():
+                candidates = [root]
+            else:
+                candidates = [Path(dirpath) / name for dirpath, _, names in os.walk(root) for name in names]
+            for path in candidates:
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout) -> set[Path]:
+        """
+        Wait up to timeout seconds for changes.
+        Returns:
+            set[Path]: The files that were added, modified or deleted.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            old = self._snapshot
+            self._snapshot = snapshot
+            changed = {path for path in snapshot.keys() | old.keys() if snapshot.get(path) != old.get(path)}
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Linux watcher on top of inotify through ctypes, so no third party package is needed.
+    Directories are watched recursively (new subdirectories are added as they appear). Single
+    files are watched through their parent directory, which also catches editors that save by
+    writing a new file and renaming it over the old one.
+    """
+
+    def __init__(self, paths):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = [Path(path) for path in paths]
+        self._dirs = {}  # watch descriptor -> directory
+        self._recursive = set()  # directories whose subdirectories are watched too
+        self._files = {}  # directory -> names of single files watched in it
+        for path in self.paths:
+            if path.is_dir():
+                self._watch_tree(path)
+            else:
+                self._files.setdefault(path.parent, set()).add(path.name)
+                self._watch_dir(path.parent)
+
+    def _watch_dir(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), IN_WATCH_MASK)
+        if wd < 0:
+            logger.warning(f"Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._dirs[wd] = directory
+
+    def _watch_tree(self, root: Path) -> None:
+        for dirpath, _, _ in os.walk(root):
+            self._recursive.add(Path(dirpath))
+            self._watch_dir(Path(dirpath))
+
+    def wait(self, timeout) -> set[Path]:
+        """
+        Wait up to timeout seconds for changes.
+        Returns:
+            set[Path]: The files or directories that changed.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            changed |= self._parse(data)
+        return changed
+
+    def _parse(self, data: bytes) -> set[Path]:
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + INOTIFY_EVENT.size : offset + INOTIFY_EVENT.size + length].rstrip(b"\0"))
+            offset += INOTIFY_EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, report the roots so everything gets rescanned
+                logger.warning("inotify queue overflowed, rescanning everything")
+                changed.update(self.paths)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._dirs[wd]
+                continue
+            if not name:
+                continue
+            if directory in self._files and directory not in self._recursive:
+                if name not in self._files[directory]:
+                    continue
+            path = directory / name
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and directory in self._recursive:
+                self._watch_tree(path)
+            changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(paths):
+    """
+    Use inotify where it is available and fall back to polling everywhere else.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(paths)
+
+
+class _Rebuild(threading.Thread):
+    """One rebuild on a background thread so the watcher can keep collecting events."""
+
+    def __init__(self, builder, changes):
+        super().__init__(daemon=True)
+        self.builder = builder
+        self.changes = changes
+        self.cancel = threading.Event()
+        self.cancelled = False
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            written = self.builder.rebuild_paths(self.changes, self.cancel)
+        except BuildCancelled:
+            self.cancelled = True
+            logger.info("Rebuild cancelled, a newer change came in")
+            return
+        except PageGenerationError as e:
+            logger.error(str(e))
+            return
+        except Exception:
+            # Keep watching after an unexpected error, the next save may fix it
+            logger.exception("Rebuild failed")
+            return
+        logger.info(
+            f"Rebuilt {len(written)} outputs for {len(self.changes)} changes in {time.perf_counter() - start:.3f}s"
+        )
+
+
+def watch(builder, debounce=DEBOUNCE_SECONDS, watcher=None, stop=None) -> None:
+    """
+    Watch the inputs of a SiteBuild and rebuild what changed until stopped (or Ctrl-C).
+    Events are collected until nothing happened for debounce seconds, then the affected
+    outputs are rebuilt on a background thread. If a new change arrives while that rebuild
+    is running it is cancelled and its changes are merged into the next one.
+    Args:
+        builder (SiteBuild): The build to keep up to date.
+        debounce (float): Seconds without events before a rebuild starts.
+        watcher: Something with wait(timeout) and close(), defaults to create_watcher.
+        stop (threading.Event): Stop watching once set.
+    """
+    watcher = watcher if watcher is not None else create_watcher(builder.watch_paths())
+    stop = stop if stop is not None else threading.Event()
+    logger.info(f"Watching {', '.join(str(path) for path in builder.watch_paths())} with {type(watcher).__name__}")
+
+    pending = set()
+    last_event = 0.0
+    rebuild = None
+    try:
+        while not stop.is_set():
+            changes = watcher.wait(debounce / 2)
+            if changes:
+                pending |= changes
+                last_event = time.monotonic()
+                if rebuild is not None and rebuild.is_alive():
+                    rebuild.cancel.set()
+
+            if rebuild is not None and not rebuild.is_alive():
+                if rebuild.cancelled:
+                    # Redo the interrupted work together with the new changes
+                    pending |= rebuild.changes
+                rebuild = None
+
+            if pending and rebuild is None and time.monotonic() - last_event >= debounce:
+                rebuild = _Rebuild(builder, pending)
+                pending = set()
+                rebuild.start()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+    finally:
+        if rebuild is not None:
+            rebuild.cancel.set()
+            rebuild.join()
+        watcher.close()